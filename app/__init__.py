@@ -1,3 +1,5 @@
+import json
+
 import click
 from flask import Flask
 
@@ -37,17 +39,23 @@ from app.blueprints.documents_blueprint import documents_bp
 from app.blueprints.events_blueprint import events_bp
 from app.blueprints.home_blueprint import home_bp
 from app.blueprints.locations_blueprint import locations_bp
+from app.blueprints.logs_blueprint import logs_bp
 from app.blueprints.users_blueprint import users_bp
 
+from app.calendar import calendar_hook
+from app.catalog import catalog
 from app.errors import (
     forbidden,
     handle_error,
     internal_error,
     page_not_found,
     request_conflict,
+    service_unavailable,
     unauthorized,
 )
-from app.logging import create_log
+from app.logging import audit_log, create_log
+from app.reference import reference
+from app.versions import versions
 
 from app.models import (
     Course,
@@ -78,6 +86,11 @@ def create_app(config=Config):
     db.init_app(app)
     lm.init_app(app)
     migrate.init_app(app, db, render_as_batch=True)
+    calendar_hook.init_app(app)
+    catalog.init_app(app)
+    reference.init_app(app)
+    versions.init_app(app)
+    audit_log.init_app(app)
 
     partials.register_extensions(app)
 
@@ -88,6 +101,7 @@ def create_app(config=Config):
     app.register_blueprint(events_bp)
     app.register_blueprint(home_bp)
     app.register_blueprint(locations_bp)
+    app.register_blueprint(logs_bp)
     app.register_blueprint(users_bp)
 
     app.register_error_handler(400, handle_error)
@@ -97,6 +111,7 @@ def create_app(config=Config):
     app.register_error_handler(409, request_conflict)
     app.register_error_handler(422, handle_error)
     app.register_error_handler(500, internal_error)
+    app.register_error_handler(503, service_unavailable)
 
     # Logging
     @app.before_request
@@ -227,6 +242,105 @@ def create_app(config=Config):
         print("Added users successfully.")
         sys.exit()
 
+    @app.cli.command("calendar-worker")
+    @click.option("--once", is_flag=True, help="Drain one batch and exit.")
+    @click.option("--stats", is_flag=True, help="Print outbox lag and failures.")
+    @click.option("--interval", default=2.0, help="Seconds to wait when idle.")
+    def calendar_worker(once, stats, interval):
+        # Deliver queued calendar webhook calls. Run this as its own process
+        # next to the gunicorn workers.
+        from app.outbox import CalendarWorker, outbox_stats
+
+        if stats:
+            print(json.dumps(outbox_stats()))
+            return
+
+        worker = CalendarWorker.from_config(app.config)
+
+        if once:
+            print("Processed {} calendar updates.".format(worker.drain()))
+            return
+
+        print("Calendar worker started.")
+        worker.run(interval)
+
+    @app.cli.command("backfill-log-targets")
+    @click.option("--batch-size", default=5000, help="Rows updated per commit.")
+    def backfill_log_targets(batch_size):
+        # Fill course_id and target_user_id on logs written before they existed
+        from app.logging import backfill_log_targets
+
+        updated = backfill_log_targets(app.url_map, batch_size)
+        print("Updated {} log rows.".format(updated))
+
+    @app.cli.command("backfill-registration-daily")
+    @click.option("--batch-size", default=500, help="Events counted per commit.")
+    def backfill_registration_daily(batch_size):
+        # Rebuild the daily registration rollup from the registration rows
+        from app.rollups import backfill_registration_daily
+
+        counted = backfill_registration_daily(batch_size)
+        print("Counted registrations for {} events.".format(counted))
+
+    @app.cli.command("backfill-name-tokens")
+    @click.option("--batch-size", default=1000, help="Users indexed per commit.")
+    def backfill_name_tokens(batch_size):
+        # Index the later words of every user's name for the user search
+        from app.models import backfill_name_tokens
+
+        indexed = backfill_name_tokens(batch_size)
+        print("Indexed names for {} users.".format(indexed))
+
+    @app.cli.command("archive-logs")
+    @click.option("--older-than", default="90d", help="Age like 90d, 12w or 36h.")
+    @click.option("--directory", default=None, help="Defaults to LOG_ARCHIVE_DIR.")
+    @click.option("--chunk-size", default=10000, help="Rows per archive file.")
+    @click.option("--delete-batch", default=1000, help="Rows per DELETE.")
+    @click.option("--pause", default=0.0, help="Seconds to sleep between deletes.")
+    @click.option("--keep", is_flag=True, help="Write archives but keep the rows.")
+    def archive_logs(older_than, directory, chunk_size, delete_batch, pause, keep):
+        # Move old request logs into gzipped JSONL files
+        from app.archive import archive_logs, parse_age
+
+        try:
+            age = parse_age(older_than)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--older-than")
+
+        totals = archive_logs(
+            directory or app.config.get("LOG_ARCHIVE_DIR", "log-archive"),
+            age,
+            chunk_size=chunk_size,
+            delete_batch=delete_batch,
+            pause=pause,
+            delete=not keep,
+        )
+        print("Archived {rows} log rows into {files} files.".format(**totals))
+
+    @app.cli.command("read-logs")
+    @click.option("--directory", default=None, help="Defaults to LOG_ARCHIVE_DIR.")
+    @click.option("--user-id", type=int)
+    @click.option("--course-id", type=int)
+    @click.option("--method")
+    @click.option("--since", type=click.DateTime(), help="Logged on or after.")
+    @click.option("--until", type=click.DateTime(), help="Logged before.")
+    @click.option("--grep", "pattern", help="Regular expression to match.")
+    def read_logs(directory, user_id, course_id, method, since, until, pattern):
+        # Print matching archived log records as JSON lines
+        from app.archive import read_archive
+
+        records = read_archive(
+            directory or app.config.get("LOG_ARCHIVE_DIR", "log-archive"),
+            user_id=user_id,
+            course_id=course_id,
+            method=method,
+            since=since,
+            until=until,
+            pattern=pattern,
+        )
+        for record in records:
+            click.echo(json.dumps(record))
+
     @app.cli.command("fix-registrations")
     @click.argument("filename")
     def fix_registrations(filename):
@@ -278,10 +392,3 @@ course_linktype_view = CourseLinkTypeAPI.as_view("course_linktype_api")
 @lm.user_loader
 def load_user(id):
     return User.query.get(id)
-
-
-# # Request all logs for an event
-# @app.route("/logs/<int:course_id>", methods=["GET"])
-# def get_logs(course_id):
-#     query = Log.query.filter(Log.endpoint.like(f"/courses/{course_id}/%")).all()
-#     return jsonify(LogSchema(many=True).dump(query))
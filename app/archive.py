@@ -0,0 +1,269 @@
+# Move old request logs out of the database.
+#
+# `flask archive-logs` walks the log table in id order, writes each chunk of
+# rows older than the cutoff to its own gzipped JSONL file and only then
+# deletes those rows, a small batch at a time. manifest.json in the archive
+# directory lists every file with its id and date range so the reader can skip
+# files that can't match.
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import Log
+
+MANIFEST = "manifest.json"
+
+AGE_UNITS = {"h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_age(value):
+    """Turn an age like `90d`, `12w` or `36h` into a timedelta."""
+    match = re.fullmatch(r"(\d+)([hdw])", value.strip())
+    if match is None:
+        raise ValueError(f"Expected an age like 90d, 12w or 36h, not {value!r}")
+
+    return timedelta(**{AGE_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"files": []}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(directory, manifest):
+    # Write a temp file and swap it in so a crash never leaves half a manifest.
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def serialize(row):
+    record = dict(row._mapping)
+    record["occurred"] = record["occurred"].isoformat() if record["occurred"] else None
+    return record
+
+
+def write_chunk(directory, rows):
+    """Write one chunk of rows to a gzipped JSONL file.
+
+    Returns:
+        dict: the manifest entry for the file
+    """
+    name = f"log-{rows[0].id:010d}-{rows[-1].id:010d}.jsonl.gz"
+    path = os.path.join(directory, name)
+    digest = hashlib.sha256()
+
+    with open(path + ".tmp", "wb") as raw:
+        with gzip.GzipFile(filename=name[:-3], mode="wb", fileobj=raw) as f:
+            for row in rows:
+                line = json.dumps(serialize(row), separators=(",", ":")) + "\n"
+                f.write(line.encode())
+                digest.update(line.encode())
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(path + ".tmp", path)
+
+    dates = [row.occurred for row in rows if row.occurred is not None]
+    return {
+        "file": name,
+        "rows": len(rows),
+        "first_id": rows[0].id,
+        "last_id": rows[-1].id,
+        "first_occurred": min(dates).isoformat() if dates else None,
+        "last_occurred": max(dates).isoformat() if dates else None,
+        "sha256": digest.hexdigest(),
+        "archived_at": datetime.utcnow().isoformat(),
+        "deleted": False,
+    }
+
+
+def delete_chunk(entry, batch_size, pause):
+    """Delete the rows of an archived chunk in small transactions.
+
+    The chunk is exactly the rows in its id range logged before its cutoff, so
+    rows newer than the cutoff that share the range are left alone.
+    """
+    table = Log.__table__
+    cutoff = datetime.fromisoformat(entry["cutoff"])
+
+    while True:
+        ids = (
+            db.session.execute(
+                select(table.c.id)
+                .where(
+                    table.c.id.between(entry["first_id"], entry["last_id"]),
+                    table.c.occurred < cutoff,
+                )
+                .order_by(table.c.id)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not ids:
+            return
+
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        if pause:
+            time.sleep(pause)
+
+
+def archive_logs(
+    directory,
+    older_than,
+    chunk_size=10000,
+    delete_batch=1000,
+    pause=0.0,
+    delete=True,
+):
+    """Archive log rows older than a cutoff and remove them from the table.
+
+    A chunk is only deleted after its file is written and recorded in the
+    manifest, so an interrupted run can be started again safely. The next run
+    finishes any deletes that were cut short, then archives every old row left
+    in the table. With `delete=False` it carries on after the last archived id.
+
+    Args:
+        directory (str): where archive files and the manifest live
+        older_than (timedelta): archive rows logged before now minus this
+        chunk_size (int): rows per archive file
+        delete_batch (int): rows removed per DELETE statement
+        pause (float): seconds to sleep between deletes to let replicas catch up
+        delete (bool): False to write archives without removing rows
+
+    Returns:
+        dict: number of rows and files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    cutoff = datetime.utcnow() - older_than
+    table = Log.__table__
+    manifest = load_manifest(directory)
+    last_id = max((entry["last_id"] for entry in manifest["files"]), default=0)
+    totals = {"rows": 0, "files": 0}
+
+    if delete:
+        for entry in manifest["files"]:
+            if not entry["deleted"]:
+                delete_chunk(entry, delete_batch, pause)
+                entry["deleted"] = True
+                save_manifest(directory, manifest)
+
+    if delete:
+        # Every old row still in the table is one that hasn't been archived.
+        # Rows are stamped at request time but get their ids when the flusher
+        # writes them, so an old row can have a lower id than rows a previous
+        # run already archived. Selecting on `occurred` alone picks those up.
+        query = select(table).where(table.c.occurred < cutoff)
+    else:
+        # Kept rows stay in the table, so walk on from the last archived id.
+        # Stop at the newest old row instead of scanning to the end of the
+        # table for rows that can't qualify.
+        max_id = db.session.execute(
+            select(func.max(table.c.id)).where(table.c.occurred < cutoff)
+        ).scalar()
+        if max_id is None or max_id <= last_id:
+            return totals
+
+        query = select(table).where(
+            table.c.occurred < cutoff,
+            table.c.id > last_id,
+            table.c.id <= max_id,
+        )
+
+    while True:
+        rows = db.session.execute(query.order_by(table.c.id).limit(chunk_size)).all()
+        # Release the read before writing files and deleting
+        db.session.commit()
+
+        if not rows:
+            return totals
+
+        entry = write_chunk(directory, rows)
+        entry["cutoff"] = cutoff.isoformat()
+        manifest["files"].append(entry)
+        save_manifest(directory, manifest)
+
+        if delete:
+            delete_chunk(entry, delete_batch, pause)
+            entry["deleted"] = True
+            save_manifest(directory, manifest)
+        else:
+            query = query.where(table.c.id > rows[-1].id)
+
+        totals["rows"] += len(rows)
+        totals["files"] += 1
+
+
+def read_archive(
+    directory,
+    user_id=None,
+    course_id=None,
+    method=None,
+    since=None,
+    until=None,
+    pattern=None,
+):
+    """Stream archived log records that match every filter given.
+
+    Files are read line by line, so memory use doesn't depend on archive size.
+    Files whose date range misses `since`/`until` are skipped without opening.
+
+    Args:
+        directory (str): archive directory with a manifest
+        user_id (int) optional: requests made by this user
+        course_id (int) optional: requests about this event
+        method (str) optional: HTTP method
+        since (datetime) optional: logged at or after
+        until (datetime) optional: logged before
+        pattern (str) optional: regular expression matched against the raw line
+
+    Yields:
+        dict: one log record
+    """
+    regex = re.compile(pattern) if pattern else None
+    filters = {"user_id": user_id, "course_id": course_id, "method": method}
+    filters = {key: value for key, value in filters.items() if value is not None}
+
+    for entry in load_manifest(directory)["files"]:
+        if (
+            since
+            and entry["last_occurred"]
+            and entry["last_occurred"] < since.isoformat()
+        ):
+            continue
+        if (
+            until
+            and entry["first_occurred"]
+            and entry["first_occurred"] >= until.isoformat()
+        ):
+            continue
+
+        with gzip.open(os.path.join(directory, entry["file"]), "rt") as f:
+            for line in f:
+                if regex and not regex.search(line):
+                    continue
+
+                record = json.loads(line)
+                if any(record.get(key) != value for key, value in filters.items()):
+                    continue
+                if since and (record["occurred"] or "") < since.isoformat():
+                    continue
+                if until and (record["occurred"] or "") >= until.isoformat():
+                    continue
+
+                yield record
@@ -1,4 +1,3 @@
-import csv
 import datetime as dt
 import html
 import pytz
@@ -6,9 +5,16 @@ import pytz
 # Set all time zones to Eastern for reporting
 EST = pytz.timezone("US/Eastern")
 
-from flask import abort, Blueprint, render_template, request, stream_with_context
+from flask import (
+    abort,
+    Blueprint,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+    stream_with_context,
+)
 from flask_login import current_user
-from io import StringIO
 from sqlalchemy import func
 from webargs import fields
 from webargs.flaskparser import parser
@@ -16,25 +22,27 @@ from werkzeug.wrappers import Response
 
 from app.charts import Chart
 from app.extensions import cache, db
-from app.wrappers import restricted
+from app.reference import course_types, link_types, locations
+from app.rollups import registration_trend
+from app.rosters import roster_csv, rosters_zip
+from app.stats import event_stats
+from app.wrappers import admin_only, restricted
 from app.models import (
     Course,
     CourseLink,
     CourseUserAttended,
-    Location,
-    User,
-    CourseLinkType,
-    CourseType,
+    course_presenters,
 )
+from app.pagination import Cursor, keyset
 from app.schemas import (
     CourseSchema,
     CourseDetailSchema,
     CourseLinkTypeSchema,
     TinyCourseSchema,
-    UserSchema,
 )
 from app.static.assets.icons import attended, close, left_arrow
-from app.utils import get_user_navigation, object_to_select
+from app.utils import get_user_navigation
+from app.versions import versions
 
 from app.resources.courses import CourseAPI
 
@@ -45,12 +53,54 @@ admin_bp = Blueprint("admin_bp", __name__, url_prefix="/admin")
 admin_bp.add_url_rule("/events/<int:course_id>", view_func=course_view, methods=["PUT"])
 
 
-@cache.memoize(60)
 def get_event(event_id):
-    event = Course.query.get(event_id)
-    event.available = event.available_size()
+    """The serialized event, cached under its "course:<id>" stamp.
+
+    Any commit that changes the event, its links, presenters or registrations
+    bumps the stamp, so every worker stops using the old entry at once.
+    """
+    version = versions.get(f"course:{event_id}")
+    key = f"event/{event_id}/{version}"
 
-    return CourseSchema().dump(event)
+    event = cache.get(key)
+    if event is None:
+        course = Course.query.get(event_id)
+        course.available = course.available_size()
+        event = CourseSchema().dump(course)
+        timeout = current_app.config.get("EVENT_CACHE_TIMEOUT", 86400)
+        cache.set(key, event, timeout=timeout)
+
+    return event
+
+
+def managed_events():
+    """Events the current user can manage, with their registration counts.
+
+    Only the columns the event list shows are selected, and the counts come
+    from the same query.
+
+    Returns:
+        Query: rows of (id, title, starts, reg_length)
+    """
+    query = (
+        db.session.query(
+            Course.id,
+            Course.title,
+            Course.starts,
+            func.count(CourseUserAttended.user_id).label("reg_length"),
+        )
+        .outerjoin(CourseUserAttended, CourseUserAttended.course_id == Course.id)
+        .group_by(Course.id, Course.title, Course.starts)
+    )
+
+    if current_user.usertype_id == 1:
+        return query
+    elif current_user.usertype_id == 2:
+        return query.join(
+            course_presenters, course_presenters.c.course_id == Course.id
+        ).filter(course_presenters.c.user_id == current_user.id)
+
+    abort(403)
 
 
 @admin_bp.get("/events")
@@ -68,71 +118,35 @@ def index():
             template = "admin/event-detail.html"
         schema = CourseDetailSchema()
         result = Course.query.get(args["event_id"])
+        stats = event_stats(result.id)
 
-        result.available = result.available_size()
+        result.available = result.course_size - stats.registrations
         result.description = html.escape(result.description)
 
-        # Create a sparkline for the registration trends.
-        # This gathers all the registrations in a list and then finds missing dates to
-        # display as 0 in the chart.
-
-        # BUG: func.DATE returns datetime.datetime as 'YYYY-MM-DD' strings, so they need
-        # to be converted to datetime.date() objects before sorting on line 92
-        dates = (
-            db.session.query(CourseUserAttended.created_at, func.count())
-            .group_by(func.DATE(CourseUserAttended.created_at))
-            .filter(CourseUserAttended.course_id == args["event_id"])
-            .all()
-        )
-
-        # Find the range of dates between when the course was created and today
-        # If the event is in the past, stop at the event start date instead
-        today = dt.datetime.today().date()
-        created_at = result.created_at.date()
-
-        if today > result.starts.date():
-            last = result.starts.date()
-        else:
-            last = today
-
-        # date_set = set(created_at + dt.timedelta(x) for x in range((last - created_at).days))
-
-        # # Turn the dates_only list into set of datetime.date objects for comparison
-        # dates_only = set(date[0].date() for date in dates)
-        # missing = sorted(date_set - dates_only)
-
-        # # Finally, push the results back into the original list
-        # for item in missing:
-        #     dates.append((dt.datetime.combine(item, dt.datetime.min.time()), 0))
-
-        # chart = Chart(sorted(dates, key=lambda x: x[0]))
-        # image = chart.sparkline()
+        # Chart registrations per day from when the event was created until
+        # today, or until it started if it is in the past. Rollup days are UTC.
+        first = result.created_at.date()
+        last = min(dt.datetime.utcnow().date(), result.starts.date())
 
         # Add some calculated stats about the event
         data = [
-            {
-                "type": "text",
-                "label": "Registrations",
-                "value": len(result.registrations.all()),
-            }
+            {"type": "text", "label": "Registrations", "value": stats.registrations}
         ]
 
         # Only create a chart if there are registrations to report
-        if len(result.registrations.all()) > 0:
-            confirmed = result.registrations.filter(
-                CourseUserAttended.attended == True
-            ).all()
-
-            attendance = [
-                len(confirmed),
-                (len(result.registrations.all()) - len(confirmed)),
-            ]
-
-            chart = Chart(attendance, ["attended", "not attended"])
+        if stats.registrations > 0:
+            chart = Chart(
+                [stats.attended, stats.not_attended], ["attended", "not attended"]
+            )
             image = chart.pie()
 
             data.append({"type": "image", "label": "Attendance", "value": image})
 
+            trend = Chart(registration_trend(result.id, first, last))
+            data.append(
+                {"type": "image", "label": "Registrations", "value": trend.sparkline()}
+            )
+
         content = {
             "event": schema.dump(result),
             "data": data,
@@ -148,47 +162,46 @@ def index():
         else:
             template = "admin/index.html"
 
-        if current_user.usertype_id == 1:
-            upcoming = (
-                Course.query.filter(Course.starts > today).order_by(Course.starts).all()
-            )
-            past = (
-                Course.query.filter(Course.starts < today).order_by(Course.starts).all()
-            )
-        elif current_user.usertype_id == 2:
-            upcoming = (
-                current_user.presenting.filter(Course.starts > today)
-                .order_by(Course.starts)
-                .all()
-            )
-            past = (
-                current_user.presenting.filter(Course.starts < today)
-                .order_by(Course.starts)
-                .all()
-            )
-        else:
-            abort(403)
-
-        # Find the number of registrations before serializing
-        for result in upcoming:
-            result.reg_length = len(result.registrations.all())
-
-        for result in past:
-            result.reg_length = len(result.registrations.all())
+        upcoming = (
+            managed_events()
+            .filter(Course.starts > today)
+            .order_by(Course.starts, Course.id)
+            .all()
+        )
 
         content = {
-            "past": schema.dump(past),
             "upcoming": schema.dump(upcoming),
         }
 
     return render_template(template, **content)
 
 
+@admin_bp.get("/events/past")
+@restricted
+def past_events():
+    """One page of past events, newest first. The next page loads on scroll."""
+    args = parser.parse({"cursor": Cursor()}, location="querystring")
+
+    past, next_cursor = keyset(
+        managed_events().filter(Course.starts < dt.date.today()),
+        Course.starts,
+        Course.id,
+        cursor=args.get("cursor"),
+        descending=True,
+        limit=current_app.config.get("ADMIN_PAGE_SIZE", 50),
+    )
+
+    return render_template(
+        "admin/partials/past-events.html",
+        past=TinyCourseSchema(many=True).dump(past),
+        first_page=args.get("cursor") is None,
+        next_cursor=next_cursor,
+    )
+
+
 @admin_bp.get("/events/<int:event_id>/edit")
 @restricted
 def edit_event(event_id):
-    locations = object_to_select(Location.query.all())
-    types = object_to_select(CourseType.query.all())
     event = get_event(event_id)
 
     if event is None:
@@ -199,8 +212,8 @@ def edit_event(event_id):
     content = {
         "event": event,
         "data": {
-            "locations": locations,
-            "types": types,
+            "locations": locations.options(),
+            "types": course_types.options(),
             "location_selected": location_selected,
             "type_selected": event["type"]["id"],
         },
@@ -229,65 +242,57 @@ def copy_event(event_id):
 @restricted
 def get_roster(event_id):
 
-    course = Course.query.get(event_id)
-    if not course:
+    if Course.query.get(event_id) is None:
         abort(404)
 
-    @stream_with_context
-    def generate():
-        data = StringIO()
-        w = csv.writer(data)
-
-        w.writerow(("Name", "Email", "Location", "Attended", "Created At"))
-        yield data.getvalue()
-        data.seek(0)
-        data.truncate(0)
-
-        for reg in course.registrations.all():
-
-            if not reg.user.location:
-                location = "Not specified"
-            else:
-                location = reg.user.location.name
-
-            w.writerow(
-                (
-                    reg.user.name,
-                    reg.user.email,
-                    location,
-                    reg.attended,
-                    reg.created_at.isoformat(),
-                )
-            )
-            yield data.getvalue()
-            data.seek(0)
-            data.truncate(0)
+    generate = stream_with_context(roster_csv(event_id))
 
-    response = Response(generate(), mimetype="text/csv")
+    response = Response(generate, mimetype="text/csv")
     response.headers["Content-Disposition"] = "attachment; filename=registrations.csv"
 
     return response
 
 
-@admin_bp.get("/events/<int:event_id>/presenters/edit")
+@admin_bp.get("/events/registrations/save")
 @restricted
-def edit_event_presenters(event_id):
-    from app.schemas import CoursePresenterSchema
+def get_rosters():
+    """Download a ZIP of the rosters for events starting in a date range."""
+    args = parser.parse(
+        {"start": fields.Date(required=True), "end": fields.Date(required=True)},
+        location="querystring",
+    )
 
-    event = get_event(event_id)
+    courses = (
+        managed_events()
+        .filter(
+            Course.starts >= args["start"],
+            Course.starts < args["end"] + dt.timedelta(days=1),
+        )
+        .order_by(Course.starts, Course.id)
+        .all()
+    )
 
-    # Get a list of all available presenters
-    presenters = User.query.filter(User.usertype_id == 2).all()
+    response = Response(
+        stream_with_context(rosters_zip(courses)), mimetype="application/zip"
+    )
+    filename = "registrations-{}-{}.zip".format(args["start"], args["end"])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
 
-    # Map to a dict structure to pass to the select partial
-    prepared = [{"value": user.id, "text": user.name} for user in presenters]
+    return response
 
-    content = {"event": event, "data": prepared}
+
+@admin_bp.get("/events/<int:event_id>/presenters/edit")
+@restricted
+def edit_event_presenters(event_id):
+    event = get_event(event_id)
+
+    # Presenters to add are looked up as the admin types
+    content = {"event": event}
 
     return render_template(
         "shared/partials/sidebar.html",
         partial="admin/forms/edit-presenters.html",
-        **content
+        **content,
     )
 
 
@@ -296,10 +301,7 @@ def edit_event_presenters(event_id):
 def edit_event_links(event_id):
     event = get_event(event_id)
 
-    linktypes = CourseLinkType.query.all()
-    prepared = [{"value": linktype.id, "text": linktype.name} for linktype in linktypes]
-
-    content = {"event": event, "data": prepared}
+    content = {"event": event, "data": link_types.options()}
 
     return render_template(
         "shared/partials/sidebar.html", partial="admin/forms/edit-links.html", **content
@@ -312,19 +314,41 @@ def edit_event_regisrations(event_id):
     # Add a user to the event manually
     event = get_event(event_id)
 
-    # Return a list of users to register for the event
-    query = User.query.order_by(User.name.asc()).all()
-
-    content = {
-        "event": {"title": event["title"], "id": event["id"]},
-        "data": UserSchema(many=True).dump(query),
-    }
+    # Users to register are looked up as the admin types
+    content = {"event": {"title": event["title"], "id": event["id"]}}
 
     return render_template(
         "shared/partials/sidebar.html", partial="admin/forms/edit-users.html", **content
     )
 
 
+@admin_bp.get("/calendar/status")
+@admin_only
+def calendar_status():
+    """Report how far behind calendar webhook delivery is."""
+    from app.outbox import outbox_stats
+
+    return jsonify(outbox_stats())
+
+
+@admin_bp.get("/metrics")
+@admin_only
+def metrics_report():
+    """Latency histograms and counters for this worker process."""
+    from app.calendar import calendar_hook
+    from app.metrics import metrics
+
+    return jsonify(
+        {
+            "calendar_hook": {
+                "circuit": calendar_hook.breaker.state,
+                "failures": calendar_hook.breaker.failures,
+            },
+            "metrics": metrics.snapshot(),
+        }
+    )
+
+
 @admin_bp.get("/events/<int:event_id>/delete")
 @restricted
 def delete_event(event_id):
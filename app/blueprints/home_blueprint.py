@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from threading import currentThread
 from typing import List
@@ -8,6 +9,7 @@ from flask import Blueprint, current_app, jsonify, render_template, request
 from flask_login import current_user
 
 from app.extensions import cache
+from app.feeds import RevalidatingFeed, serve_feed
 from app.wrappers import restricted
 
 home_bp = Blueprint("home_bp", __name__)
@@ -27,7 +29,7 @@ def index():
 @home_bp.get("/create")
 @restricted
 def create():
-    from app.models import CourseType, Location
+    from app.reference import course_types, locations
     from app.schemas import CourseTypeSchema, LocationSchema
 
     if request.headers.get("HX-Request"):
@@ -35,97 +37,109 @@ def create():
     else:
         template = "admin/forms/create-form-full.html"
 
-    course_types = CourseType.query.all()
-    locations = sorted(Location.query.all())
-
     content = {
-        "course_types": CourseTypeSchema(many=True).dump(course_types),
-        "locations": LocationSchema(many=True).dump(locations),
+        "course_types": CourseTypeSchema(many=True).dump(course_types.all()),
+        "locations": LocationSchema(many=True).dump(
+            sorted(locations.all(), key=lambda location: location.name)
+        ),
     }
 
     return render_template(template, **content)
 
 
 @home_bp.route("/resource-query")
-@cache.cached(timeout=3600)
 def update():
-    today = datetime.now()
-
-    # Get the blog post and youtube video
-    blog_post = get_blog_post()
-    youtube_video = get_youtube_video()
-
-    # This is kind of a mess, but it helps handle all cases. It can probably be done better.
-    # Both calls come back successfully
-    if not isinstance(blog_post, Exception) and not isinstance(
-        youtube_video, Exception
-    ):
-        if (today - blog_post["published_at"]) < (
-            today - youtube_video["published_at"]
-        ):
-            resource = blog_post
-        else:
-            resource = youtube_video
-    else:
-        if isinstance(blog_post, Exception) and isinstance(youtube_video, Exception):
-            resource = {"message": "Something has gone terribly wrong"}
-        elif not isinstance(blog_post, Exception) and isinstance(
-            youtube_video, Exception
-        ):
-            resource = blog_post
-        elif isinstance(blog_post, Exception) and not isinstance(
-            youtube_video, Exception
-        ):
-            resource = youtube_video
+    feed = resource_feed.get()
+    if feed is None:
+        # Nothing good has been fetched yet. Don't store this answer.
+        return jsonify(message="Something has gone terribly wrong")
+
+    return serve_feed("resource-query", feed)
+
+
+# Blog and video lookups run side by side instead of one after the other
+fetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="resource")
+
+
+def latest_resource():
+    """The newest of the last blog post and video, or None if both are unknown.
+
+    A source that fails falls back to its last good answer, which is kept for
+    RESOURCE_FEED_MAX_STALE seconds. Failures themselves are never cached.
+    """
+    timeout = current_app.config.get("RESOURCE_FETCH_TIMEOUT", (3.05, 10))
+    sources = {
+        "blog": fetcher.submit(
+            get_blog_post, current_app.config["BLOG_AUTH_TOKEN"], timeout
+        ),
+        "youtube": fetcher.submit(
+            get_youtube_video, current_app.config["YOUTUBE_AUTH_TOKEN"], timeout
+        ),
+    }
+
+    resources = []
+    for name, future in sources.items():
+        try:
+            resource = future.result()
+        except Exception as e:
+            current_app.logger.warning("Fetching the latest %s failed: %s", name, e)
+            resource = cache.get(f"resource/{name}")
         else:
-            resource = {"message": "You should not have reached this spot."}
+            cache.set(
+                f"resource/{name}",
+                resource,
+                timeout=current_app.config.get("RESOURCE_FEED_MAX_STALE", 86400),
+            )
 
-    return jsonify(**resource)
+        if resource is not None:
+            resources.append(resource)
 
+    if not resources:
+        return None
 
-@cache.cached(timeout=3600, key_prefix="last_blog")
-def get_blog_post():
-    headers = {"Authorization": "Bearer " + current_app.config["BLOG_AUTH_TOKEN"]}
+    return max(resources, key=lambda resource: resource["published_at"])
 
-    try:
-        response = requests.get(
-            "https://blog.elkhart.k12.in.us/wp-json/wp/v2/posts?per_page=1&order=desc&_embed",
-            headers=headers,
-        ).json()[0]
 
-        result = {
-            "published_at": datetime.strptime(response["date"], "%Y-%m-%dT%H:%M:%S"),
-            "link": f"{response['link']}?utm_source=chrome_extension",
-            "thumbnail": response["_embedded"]["wp:featuredmedia"][0]["source_url"],
-            "title": response["title"]["rendered"],
-        }
-    except Exception as e:
-        result = e
+resource_feed = RevalidatingFeed(
+    "resource-query",
+    latest_resource,
+    fresh_for="RESOURCE_FEED_TIMEOUT",
+    keep_for="RESOURCE_FEED_MAX_STALE",
+)
 
-    return result
 
+def get_blog_post(token, timeout):
+    headers = {"Authorization": "Bearer " + token}
+    response = requests.get(
+        "https://blog.elkhart.k12.in.us/wp-json/wp/v2/posts?per_page=1&order=desc&_embed",
+        headers=headers,
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    post = response.json()[0]
+
+    return {
+        "published_at": datetime.strptime(post["date"], "%Y-%m-%dT%H:%M:%S"),
+        "link": f"{post['link']}?utm_source=chrome_extension",
+        "thumbnail": post["_embedded"]["wp:featuredmedia"][0]["source_url"],
+        "title": post["title"]["rendered"],
+    }
 
-@cache.cached(timeout=3600, key_prefix="last_youtube")
-def get_youtube_video():
 
-    token = current_app.config["YOUTUBE_AUTH_TOKEN"]
+def get_youtube_video(token, timeout):
     # Set the referrer header
     headers = {"Referer": "https://events.elkhart.k12.in.us"}
-    yt_request = requests.get(
+    response = requests.get(
         f"https://youtube.googleapis.com/youtube/v3/playlistItems?part=snippet&playlistId=UUgwJ38NKsSVTBW_yzw8n1eQ&sort=desc&maxResults=1&key={token}",  # noqa
         headers=headers,
+        timeout=timeout,
     )
-    try:
-        response = yt_request.json()["items"][0]["snippet"]
-        result = {
-            "published_at": datetime.strptime(
-                response["publishedAt"], "%Y-%m-%dT%H:%M:%SZ"
-            ),
-            "link": f"https://youtube.com/watch?v={response['resourceId']['videoId']}/?utm_source=chrome_extension",
-            "thumbnail": response["thumbnails"]["standard"]["url"],
-            "title": response["title"],
-        }
-    except Exception as e:
-        result = e
-
-    return result
+    response.raise_for_status()
+    video = response.json()["items"][0]["snippet"]
+
+    return {
+        "published_at": datetime.strptime(video["publishedAt"], "%Y-%m-%dT%H:%M:%SZ"),
+        "link": f"https://youtube.com/watch?v={video['resourceId']['videoId']}/?utm_source=chrome_extension",
+        "thumbnail": video["thumbnails"]["standard"]["url"],
+        "title": video["title"],
+    }
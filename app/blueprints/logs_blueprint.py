@@ -0,0 +1,9 @@
+from flask import Blueprint
+
+from app.resources.logs import LogListAPI
+
+logs_bp = Blueprint("logs_bp", __name__)
+
+logs_view = LogListAPI.as_view("logs_api")
+
+logs_bp.add_url_rule("/logs", view_func=logs_view, methods=["GET"])
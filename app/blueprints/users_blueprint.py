@@ -1,12 +1,13 @@
-from flask import abort, Blueprint, render_template, request
+from flask import abort, Blueprint, current_app, render_template, request
 from flask_login import current_user
 from app.extensions import db
-from app.models import UserType, User
+from app.models import User
+from app.reference import user_types
 
-from webargs import fields
+from webargs import fields, validate
 from webargs.flaskparser import parser
 
-from app.wrappers import admin_only
+from app.wrappers import admin_only, restricted
 from app.utils import get_user_navigation
 
 from app.resources.users import (
@@ -42,8 +43,7 @@ def index():
         {"usertype_id": fields.Int(load_default=None)}, location="querystring"
     )
 
-    usertypes = UserType.query.all()
-    options = [{"value": usertype.id, "text": usertype.name} for usertype in usertypes]
+    options = user_types.options()
 
     # If a usertype id is in the request query, return users for that role.
     # Otherwise, return only the select field to filter down.
@@ -80,6 +80,38 @@ def index():
     return render_template(template, **content)
 
 
+@users_bp.get("/users/search")
+@restricted
+def search():
+    """Typeahead matches for the admin sidebars as <option>s or checkboxes.
+
+    Only the top matches are sent, so the response stays small however many
+    users there are.
+    """
+    args = parser.parse(
+        {
+            "q": fields.Str(load_default=""),
+            "usertype_id": fields.Int(load_default=None),
+            "location_id": fields.Int(load_default=None),
+            "field": fields.Str(
+                load_default="option", validate=validate.OneOf(["option", "checkbox"])
+            ),
+        },
+        location="querystring",
+    )
+
+    users = User.search(
+        args["q"],
+        usertype_id=args["usertype_id"],
+        location_id=args["location_id"],
+        limit=current_app.config.get("USER_SEARCH_LIMIT", 20),
+    )
+
+    return render_template(
+        "users/partials/search-results.html", users=users, field=args["field"]
+    )
+
+
 users_bp.add_url_rule(
     "/users/<int:user_id>", view_func=user_view, methods=["GET", "PUT", "DELETE"]
 )
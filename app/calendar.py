@@ -6,9 +6,17 @@
 
 # init an oauth client
 import os
+import time
 from datetime import datetime
+from threading import Lock
+
+import requests
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.metrics import metrics
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 path = os.path.join(basedir, "token.json")
@@ -28,3 +36,211 @@ class CalendarService:
 
     def convertToISO(self, date):
         return date.isoformat()
+
+
+class CalendarHookError(Exception):
+    """The calendar webhook call failed or returned an error."""
+
+
+class CalendarUnavailableError(CalendarHookError):
+    """The webhook couldn't be reached, timed out or answered with a 5xx."""
+
+
+class CircuitOpenError(CalendarUnavailableError):
+    """The webhook has been failing and calls are being rejected without trying."""
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail immediately. Once `reset_timeout` seconds pass, one trial call is let
+    through. Success closes the breaker again, failure re-opens it.
+
+    Args:
+        failure_threshold (int): consecutive failures before opening
+        reset_timeout (float): seconds to stay open before a trial call
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def allow(self):
+        """Check whether a call may go out right now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+def unavailable(error):
+    # Transport failures and server errors say nothing about the request itself
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+class CalendarHookClient:
+    """Shared client for the Google Apps Script calendar webhook.
+
+    Connections are kept alive in a pool instead of opening a new TLS session
+    for every call. Each webhook method gets its own connect/read timeout, and a
+    circuit breaker rejects calls while the hook is failing so workers aren't
+    tied up waiting on it. Call latency is recorded per method in
+    `calendar_hook.<method>.latency_ms`.
+
+    Configure with `init_app` using CALENDAR_HOOK_URL, CALENDAR_HOOK_TOKEN and
+    GOOGLE_CALENDAR_ID.
+    """
+
+    # (connect, read) seconds. Creating an event with a Meet is the slowest call.
+    TIMEOUTS = {
+        "post": (3.05, 30),
+        "put": (3.05, 20),
+        "delete": (3.05, 20),
+        "patch": (3.05, 20),
+        "pop": (3.05, 20),
+    }
+
+    def __init__(self, url=None, token=None, calendar_id=None, breaker=None):
+        self.url = url
+        self.token = token
+        self.calendar_id = calendar_id
+        self.timeouts = dict(self.TIMEOUTS)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self._mount(pool_size=10)
+
+    def init_app(self, app):
+        self.url = app.config.get("CALENDAR_HOOK_URL")
+        self.token = app.config.get("CALENDAR_HOOK_TOKEN")
+        self.calendar_id = app.config.get("GOOGLE_CALENDAR_ID")
+        self.timeouts.update(app.config.get("CALENDAR_HOOK_TIMEOUTS", {}))
+        self.breaker = CircuitBreaker(
+            failure_threshold=app.config.get("CALENDAR_HOOK_FAILURE_THRESHOLD", 5),
+            reset_timeout=app.config.get("CALENDAR_HOOK_RESET_TIMEOUT", 30),
+        )
+        self._mount(pool_size=app.config.get("CALENDAR_HOOK_POOL_SIZE", 10))
+
+    def _mount(self, pool_size):
+        # Only connection failures are retried. Once a POST reaches Apps Script
+        # it may have changed the calendar, so it is never sent twice.
+        retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retries
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def call(self, method, **params):
+        """Send a request to the webhook.
+
+        Args:
+            method (str): webhook method: post, put, delete, patch or pop
+            **params: payload fields such as eventId, userIds or body. calendarId
+                defaults to the configured calendar.
+
+        Raises:
+            CircuitOpenError: the hook has been failing and the call was not sent
+            CalendarUnavailableError: the hook couldn't be reached or timed out
+            CalendarHookError: the call failed or the hook reported an error
+
+        Returns:
+            dict: decoded webhook response
+        """
+        if not self.breaker.allow():
+            metrics.counter(f"calendar_hook.{method}.rejected").inc()
+            raise CircuitOpenError(f"Calendar webhook circuit is open ({method})")
+
+        payload = {
+            "method": method,
+            "token": self.token,
+            "calendarId": self.calendar_id,
+        }
+        payload.update(params)
+
+        started = time.perf_counter()
+        # Every call that got past allow() settles the breaker exactly once,
+        # whatever goes wrong, so a half-open trial can't be left hanging.
+        healthy = False
+        try:
+            response = self.session.post(
+                self.url,
+                json=payload,
+                timeout=self.timeouts.get(method, self.TIMEOUTS["put"]),
+            )
+            response.raise_for_status()
+            # deleteEvent in webhook.js has nothing to return.
+            text = response.text.strip()
+            result = {} if text in ("", "undefined", "null") else response.json()
+
+            # Apps Script always answers 200 and reports errors in the body.
+            status = 200
+            if isinstance(result, dict):
+                status = int(result.get("statusCode", 200))
+
+            if status >= 400:
+                # A rejected token is our problem, not the hook's, so it
+                # doesn't count toward opening the breaker.
+                healthy = status < 500
+                metrics.counter(f"calendar_hook.{method}.errors").inc()
+                raise CalendarHookError(
+                    result.get("message") or result.get("status") or str(status)
+                )
+
+            healthy = True
+            return result
+        except (OSError, ValueError, TypeError) as e:
+            # requests exceptions are OSErrors too. A statusCode that isn't a
+            # number is a broken response.
+            metrics.counter(f"calendar_hook.{method}.errors").inc()
+            if unavailable(e):
+                raise CalendarUnavailableError(str(e)) from e
+            raise CalendarHookError(str(e)) from e
+        finally:
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            metrics.histogram(f"calendar_hook.{method}.latency_ms").observe(
+                (time.perf_counter() - started) * 1000
+            )
+
+
+calendar_hook = CalendarHookClient()
@@ -0,0 +1,266 @@
+# Shared snapshot of the upcoming event catalog.
+#
+# Everything on the events page except the registered/attended badge is the
+# same for every viewer, so each worker builds the list once per change and
+# serves every request from it. A request only adds the viewer's own
+# registrations on top.
+#
+# Smaller "upcoming" lists are kept in the shared cache with `cached_upcoming`
+# until the next event starts or ends.
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.extensions import cache, db
+from app.metrics import metrics
+from app.models import Course, on_courses_changed
+from app.pagination import encode_cursor
+from app.schemas import SmallCourseSchema
+from app.static.assets.icons import attended, registered
+from app.versions import versions
+
+# `event` is the serialized card without the viewer's state
+Entry = namedtuple("Entry", ["starts", "id", "ends", "student_allowed", "event"])
+
+
+class Snapshot:
+    def __init__(self, version, entries, stamps):
+        self.version = version
+        self.entries = entries
+        self.positions = [(entry.starts, entry.id) for entry in entries]
+        # "course:<id>" stamps matching the entries, empty if unknown
+        self.stamps = stamps
+
+
+class CatalogSnapshot:
+    """Upcoming events ordered by (starts, id) with seat counts filled in.
+
+    A commit that changes an event or a registration bumps the "catalog"
+    version stamp, and the next request in any worker builds a new snapshot.
+    The same commit bumps the event's "course:<id>" stamp, so the snapshot
+    keeps those too and a page of cards needs no further stamp reads.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._generation = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.invalidate()
+
+    def current_version(self):
+        return (self._generation, versions.get("catalog"))
+
+    def build(self):
+        now = datetime.now()
+        courses = (
+            Course.query.filter(Course.active == True, Course.ends >= now)
+            .order_by(Course.starts, Course.id)
+            .all()
+        )
+        counts = Course.registration_counts([course.id for course in courses])
+
+        schema = SmallCourseSchema()
+        entries = []
+        for course in courses:
+            course.available = course.course_size - counts.get(course.id, 0)
+            entries.append(
+                Entry(
+                    course.starts,
+                    course.id,
+                    course.ends,
+                    course.student_allowed,
+                    schema.dump(course),
+                )
+            )
+
+        return entries
+
+    def course_stamps(self, version, entries):
+        # Read with "catalog" in one statement. If a commit landed since the
+        # request read its catalog stamp, the entries may not match these, so
+        # the page reads its own instead.
+        names = [f"course:{entry.id}" for entry in entries]
+        stamps = versions.read(["catalog", *names])
+        if stamps.pop("catalog") != version:
+            return {}
+        return stamps
+
+    def snapshot(self):
+        version = self.current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            metrics.counter("catalog_snapshot.hits").inc()
+            return snapshot
+
+        # One request rebuilds while the others wait for its result
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                metrics.counter("catalog_snapshot.builds").inc()
+                entries = self.build()
+                stamps = self.course_stamps(version[1], entries)
+                snapshot = Snapshot(version, entries, stamps)
+                self._snapshot = snapshot
+
+        return snapshot
+
+    def page(self, student=False, cursor=None, limit=24):
+        """One page of upcoming events from the snapshot.
+
+        Args:
+            student (bool): only events open to students
+            cursor (tuple) optional: (starts, id) of the last event already shown
+            limit (int): events per page
+
+        Returns:
+            tuple: (serialized events, cursor for the next page or None)
+        """
+        snapshot = self.snapshot()
+        start = bisect_right(snapshot.positions, cursor) if cursor else 0
+        now = datetime.now()
+
+        # Events that ended since the snapshot was built are skipped here
+        # instead of forcing a rebuild.
+        rows = []
+        for entry in snapshot.entries[start:]:
+            if entry.ends < now or (student and not entry.student_allowed):
+                continue
+            rows.append(entry)
+            if len(rows) > limit:
+                break
+
+        page = rows[:limit]
+        versions.remember(
+            {
+                name: snapshot.stamps[name]
+                for name in (f"course:{entry.id}" for entry in page)
+                if name in snapshot.stamps
+            }
+        )
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1].starts, page[-1].id)
+
+        return [entry.event for entry in page], next_cursor
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+
+def user_state(course_id, states):
+    """The viewer's registration state for an event and the icon that shows it.
+
+    Args:
+        course_id (int): event ID
+        states (dict): {course_id: attended} from User.registration_states
+
+    Returns:
+        tuple: (state, icon). The icon is None for an "available" event.
+    """
+    if course_id not in states:
+        return "available", None
+    if states[course_id]:
+        return "attended", attended
+    return "registered", registered
+
+
+def with_user_state(events, states):
+    """Copy serialized events with the viewer's registration state added.
+
+    Args:
+        events (list): events from `CatalogSnapshot.page`
+        states (dict): {course_id: attended} from User.registration_states
+
+    Returns:
+        list: new event dicts, the snapshot itself is left untouched
+    """
+    overlaid = []
+    for event in events:
+        event = dict(event)
+        event["state"], icon = user_state(event["id"], states)
+        if icon is not None:
+            event["icon"] = icon
+        overlaid.append(event)
+
+    return overlaid
+
+
+def next_boundary(now):
+    """When the next active event starts or ends after `now`.
+
+    Lists filtered on `starts >= now` or `ends >= now` can only change at that
+    moment or on a write. Both minimums come from one statement that reads the
+    first entry of the (active, starts) and (active, ends) indexes.
+
+    Returns:
+        datetime: the next boundary, or None when no event is still to come
+    """
+    first_start = (
+        select(func.min(Course.starts))
+        .where(Course.active == True, Course.starts > now)
+        .scalar_subquery()
+    )
+    first_end = (
+        select(func.min(Course.ends))
+        .where(Course.active == True, Course.ends > now)
+        .scalar_subquery()
+    )
+    boundaries = db.session.execute(select(first_start, first_end)).one()
+
+    return min((value for value in boundaries if value is not None), default=None)
+
+
+def cached_upcoming(name, build):
+    """Cache a list of upcoming events until it can next change.
+
+    The result expires at the next event start or end and is dropped early when
+    a commit changes an event or registration.
+
+    Args:
+        name (str): cache key for this list
+        build (callable): `build(now)` returns the list to cache
+
+    Returns:
+        the cached or freshly built value
+    """
+    key = f"upcoming/{name}/{versions.get('catalog')}"
+    value = cache.get(key)
+    if value is not None:
+        metrics.counter("upcoming_cache.hits").inc()
+        return value
+
+    metrics.counter("upcoming_cache.misses").inc()
+    now = datetime.now()
+    value = build(now)
+
+    longest = current_app.config.get("UPCOMING_CACHE_MAX_TIMEOUT", 86400)
+    boundary = next_boundary(now)
+    if boundary is None:
+        timeout = longest
+    else:
+        # Round down so the entry never outlives the boundary. A timeout of 0
+        # means "never expire", so anything under a second isn't cached.
+        timeout = min(int((boundary - now).total_seconds()), longest)
+
+    if timeout >= 1:
+        cache.set(key, value, timeout=timeout)
+
+    return value
+
+
+catalog = CatalogSnapshot()
+versions.preload("catalog")
+
+
+@on_courses_changed
+def invalidate_catalog(course_ids):
+    catalog.invalidate()
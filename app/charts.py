@@ -1,42 +1,125 @@
-import base64
-from io import BytesIO
+# Small inline SVG charts for the admin dashboard.
+#
+# Charts are built as plain SVG strings, so rendering one is a little string
+# formatting instead of a trip through a plotting library. Coordinates are
+# rounded to fixed precision, which makes the markup identical for identical
+# data, and the rendered markup is memoized on the series.
+import math
+from functools import lru_cache
 
-# matplotlib has to be opened without the GUI event loop connection to run on the server.
-# see https://stackoverflow.com/questions/51188461/using-pyplot-close-crashes-the-flask-app
-import matplotlib
+from markupsafe import Markup, escape
 
-matplotlib.use("agg")
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib.figure import Figure
+COLORS = ("#32c192", "#e9164f", "#f2b134", "#4a90d9")
 
 
-class Chart:
-    def __init__(self, series, labels=None):
-        # Accept a series as list of tuples with the (x, y) defined
-        self.series = series
-        self.labels = labels
+def _num(value):
+    # Fixed precision keeps the output stable and short
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+@lru_cache(maxsize=512)
+def pie_svg(values, labels, size=120):
+    """Render a pie chart with a legend.
+
+    Args:
+        values (tuple): slice sizes
+        labels (tuple): slice names, same length as `values` or empty
+        size (int): diameter of the pie in px
+
+    Returns:
+        str: SVG markup
+    """
+    total = sum(values)
+    radius = size / 2
+    legend_height = 16 * len(labels)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" class="chart chart--pie" '
+        f'width="{size}" height="{size + legend_height}" '
+        f'viewBox="0 0 {size} {size + legend_height}" role="img">'
+    ]
+
+    angle = 0.0
+    for index, value in enumerate(values):
+        if not value:
+            continue
+
+        color = COLORS[index % len(COLORS)]
+        label = labels[index] if labels else ""
+        title = f"<title>{escape(label)}: {value}</title>" if label else ""
+
+        if value == total:
+            parts.append(
+                f'<circle cx="{_num(radius)}" cy="{_num(radius)}" '
+                f'r="{_num(radius)}" fill="{color}">{title}</circle>'
+            )
+            break
 
-    def create_pie_figure(self):
-        fig = Figure(figsize=(4.0, 3.0))
-        labels = self.labels
-        sizes = self.series
+        # Start at 12 o'clock and go clockwise
+        sweep = 2 * math.pi * value / total
+        start_x = radius + radius * math.sin(angle)
+        start_y = radius - radius * math.cos(angle)
+        angle += sweep
+        end_x = radius + radius * math.sin(angle)
+        end_y = radius - radius * math.cos(angle)
+        large_arc = 1 if sweep > math.pi else 0
 
-        colors = ["#32c192", "#e9164f"]
+        parts.append(
+            f'<path d="M{_num(radius)},{_num(radius)} '
+            f"L{_num(start_x)},{_num(start_y)} "
+            f"A{_num(radius)},{_num(radius)} 0 {large_arc} 1 "
+            f'{_num(end_x)},{_num(end_y)}Z" fill="{color}">{title}</path>'
+        )
 
-        px = 1 / plt.rcParams["figure.dpi"]
+    for index, label in enumerate(labels):
+        color = COLORS[index % len(COLORS)]
+        y = size + 16 * index
+        parts.append(
+            f'<rect x="0" y="{y + 4}" width="10" height="10" fill="{color}"/>'
+            f'<text x="14" y="{y + 13}" font-size="12">'
+            f"{escape(label)} ({values[index]})</text>"
+        )
 
-        ax1 = fig.subplots()
-        ax1.pie(sizes, labels=labels, colors=colors, startangle=90)
-        ax1.axis("equal")
+    parts.append("</svg>")
+    return "".join(parts)
 
-        return fig
+
+@lru_cache(maxsize=512)
+def sparkline_svg(values, width=120, height=24):
+    """Render a line of counts with no axes.
+
+    Args:
+        values (tuple): counts in order, one per point
+        width (int): px
+        height (int): px
+
+    Returns:
+        str: SVG markup
+    """
+    top = max(values, default=0) or 1
+    step = width / (len(values) - 1) if len(values) > 1 else 0
+    points = " ".join(
+        f"{_num(index * step)},{_num(height - 1 - (height - 2) * value / top)}"
+        for index, value in enumerate(values)
+    )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" class="chart chart--sparkline" '
+        f'width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+        f'role="img"><polyline points="{points}" fill="none" '
+        f'stroke="{COLORS[0]}" stroke-width="1.5"/></svg>'
+    )
+
+
+class Chart:
+    def __init__(self, series, labels=None):
+        # Accept a series as list of tuples with the (x, y) defined
+        self.series = series
+        self.labels = labels
 
     def pie(self):
-        fig = self.create_pie_figure()
-        output = BytesIO()
-        fig.savefig(output, format="png")
-        output.seek(0)
-        data = base64.b64encode(output.getbuffer()).decode("ascii")
-        FigureCanvas(fig).print_png(output)
-        return data
+        """The series as a pie chart, ready to drop into a template."""
+        return Markup(pie_svg(tuple(self.series), tuple(self.labels or ())))
+
+    def sparkline(self):
+        """The y values of the series as a sparkline."""
+        return Markup(sparkline_svg(tuple(y for x, y in self.series)))
@@ -48,3 +48,16 @@ def internal_error(e):
     )
     response.content_type = "applicaton/json"
     return response
+
+
+def service_unavailable(e):
+    response = e.get_response()
+    response.data = json.dumps(
+        {
+            "code": e.code,
+            "name": e.name,
+            "description": "Google Calendar isn't responding right now. Please try again in a few minutes.",
+        }
+    )
+    response.content_type = "application/json"
+    return response
@@ -0,0 +1,164 @@
+# Pre-built JSON feeds polled by the Chrome extension.
+#
+# Every install polls the same two feeds, so each is serialized and gzipped
+# once, stored in the shared cache with a strong ETag, and handed back as-is.
+# Clients that send the ETag back in If-None-Match get an empty 304.
+#
+# Feeds built from slow outside services use `RevalidatingFeed`, which keeps
+# serving the last good build while a single background job fetches a new one.
+import gzip
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from threading import Lock
+
+from flask import Response, current_app, request
+
+from app.extensions import cache
+from app.metrics import metrics
+
+
+def build_feed(data):
+    """Serialize a feed once in both encodings.
+
+    Returns:
+        dict: `body` and `gzip` bytes and the `etag` of the JSON
+    """
+    body = (current_app.json.dumps(data) + "\n").encode()
+    return {
+        "body": body,
+        # mtime=0 keeps the compressed bytes identical between rebuilds
+        "gzip": gzip.compress(body, mtime=0),
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+    }
+
+
+def serve_feed(name, feed):
+    """Answer a poll with a 304 or the pre-built body.
+
+    The gzipped body is a different representation, so it carries its own
+    strong ETag. Either one sent back in If-None-Match counts as current.
+    """
+    etags = {"gzip": feed["etag"] + "-gz", "identity": feed["etag"]}
+
+    if any(request.if_none_match.contains(etag) for etag in etags.values()):
+        metrics.counter(f"feed.{name}.not_modified").inc()
+        response = Response(status=304)
+        encoding = "gzip" if request.accept_encodings["gzip"] else "identity"
+        response.set_etag(etags[encoding])
+    elif request.accept_encodings["gzip"]:
+        metrics.counter(f"feed.{name}.sent").inc()
+        response = Response(feed["gzip"], mimetype="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(etags["gzip"])
+    else:
+        metrics.counter(f"feed.{name}.sent").inc()
+        response = Response(feed["body"], mimetype="application/json")
+        response.set_etag(etags["identity"])
+
+    response.vary.add("Accept-Encoding")
+    # Let clients keep the body but ask again on every poll
+    response.cache_control.no_cache = True
+    return response
+
+
+class RevalidatingFeed:
+    """A feed rebuilt in the background once it goes stale.
+
+    Requests for a stale feed get the last good build straight away and start
+    a refresh. Only one refresh runs at a time: a lock in the shared cache
+    keeps other workers out and a future keeps other threads in this worker
+    from starting their own. A build that fails is never stored, so the last
+    good one stays in use until it is older than `keep_for`.
+
+    Args:
+        name (str): cache key for the feed
+        build (callable): returns the feed data, or None when it couldn't be
+            fetched. Runs on a pool thread inside an app context.
+        fresh_for (str): config key, seconds before a build goes stale
+        keep_for (str): config key, seconds a stale build may still be served
+    """
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="feed")
+
+    def __init__(self, name, build, fresh_for, keep_for):
+        self.name = name
+        self.build = build
+        self.fresh_for = fresh_for
+        self.keep_for = keep_for
+        self._future = None
+        self._lock = Lock()
+
+    @property
+    def key(self):
+        return f"feed/{self.name}"
+
+    @property
+    def lock_key(self):
+        return f"feed-lock/{self.name}"
+
+    def get(self, wait=10):
+        """The current feed, or None when there is none to serve yet.
+
+        Args:
+            wait (float): seconds to wait for a first build
+        """
+        entry = cache.get(self.key)
+        if entry is not None:
+            if entry["fresh_until"] <= time.time():
+                metrics.counter(f"feed.{self.name}.stale").inc()
+                self.refresh()
+            return entry["feed"]
+
+        future = self.refresh()
+        if future is None:
+            # Another worker is building it
+            return None
+
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeout:
+            return None
+
+    def refresh(self):
+        """Start a rebuild unless one is already running.
+
+        Returns:
+            Future: the running rebuild, or None if another worker has it
+        """
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return self._future
+
+            # Long enough for a slow build, short enough to recover from a
+            # worker that died holding it
+            if not cache.add(self.lock_key, 1, timeout=60):
+                return None
+
+            app = current_app._get_current_object()
+            self._future = self.executor.submit(self._rebuild, app)
+            return self._future
+
+    def _rebuild(self, app):
+        with app.app_context():
+            try:
+                data = self.build()
+                if data is None:
+                    metrics.counter(f"feed.{self.name}.failed").inc()
+                    return None
+
+                feed = build_feed(data)
+                entry = {
+                    "feed": feed,
+                    "fresh_until": time.time() + app.config.get(self.fresh_for, 3600),
+                }
+                cache.set(self.key, entry, timeout=app.config.get(self.keep_for, 86400))
+                metrics.counter(f"feed.{self.name}.rebuilt").inc()
+                return feed
+            except Exception:
+                app.logger.exception("Rebuilding the %s feed failed", self.name)
+                metrics.counter(f"feed.{self.name}.failed").inc()
+                return None
+            finally:
+                cache.delete(self.lock_key)
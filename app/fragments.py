@@ -0,0 +1,69 @@
+# Rendered event cards kept in the shared cache.
+#
+# A card only changes when its event is edited or the viewer's registration
+# changes, so the HTML is cached per (course_id, course_version, user_state).
+# The version is the event's "course:<id>" stamp. A commit that touches the
+# event or its registrations bumps it, which orphans every card rendered
+# before; they age out of the cache on their own.
+from flask import current_app, render_template
+from markupsafe import Markup
+
+from app.extensions import cache
+from app.metrics import metrics
+from app.versions import versions
+
+CARD_TEMPLATE = "events/partials/event-card.html"
+
+
+class EventCardCache:
+    def card_key(self, course_id, version, state):
+        return f"event-card/{course_id}/{version}/{state}"
+
+    @property
+    def timeout(self):
+        return current_app.config.get("EVENT_CARD_CACHE_TIMEOUT", 3600)
+
+    def versions(self, course_ids):
+        """Current version stamp of each event.
+
+        Returns:
+            dict: {course_id: version}
+        """
+        stamps = versions.get_many([f"course:{course_id}" for course_id in course_ids])
+        return {course_id: stamps[f"course:{course_id}"] for course_id in course_ids}
+
+    def render(self, events):
+        """Render event cards, reusing cached HTML where it is current.
+
+        Args:
+            events (list): serialized events with the viewer's `state` set
+
+        Returns:
+            list: card HTML in the order of `events`
+        """
+        if not events:
+            return []
+
+        versions = self.versions([event["id"] for event in events])
+        keys = [
+            self.card_key(event["id"], versions[event["id"]], event["state"])
+            for event in events
+        ]
+        cards = cache.get_many(*keys)
+
+        rendered = {}
+        for index, event in enumerate(events):
+            if cards[index] is None:
+                cards[index] = render_template(CARD_TEMPLATE, event=event)
+                rendered[keys[index]] = cards[index]
+
+        if rendered:
+            cache.set_many(rendered, timeout=self.timeout)
+
+        metrics.counter("event_card_cache.hits").inc(len(events) - len(rendered))
+        metrics.counter("event_card_cache.misses").inc(len(rendered))
+
+        return [Markup(card) for card in cards]
+
+
+event_cards = EventCardCache()
@@ -1,10 +1,270 @@
+import atexit
 import json
-from flask import request
+import os
+import time
+from datetime import datetime
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+
+from flask import current_app, request
 from flask_migrate import current
+from sqlalchemy import insert
 from app import db
+from app.metrics import metrics
 from app.models import Log
 from flask_login import current_user, AnonymousUserMixin
 
+DROP = "drop"
+BLOCK = "block"
+
+# URL arguments that say which event or user a request acted on. Admin pages
+# call the event `event_id`.
+TARGET_ARGS = {
+    "course_id": "course_id",
+    "event_id": "course_id",
+    "user_id": "target_user_id",
+}
+
+
+def log_targets(view_args):
+    """Pick the event and user a request touched out of its URL arguments.
+
+    Args:
+        view_args (dict): matched URL rule arguments, `request.view_args`
+
+    Returns:
+        dict: `course_id` and `target_user_id`, None when not in the URL
+    """
+    targets = {"course_id": None, "target_user_id": None}
+    for arg, column in TARGET_ARGS.items():
+        if (view_args or {}).get(arg) is not None:
+            targets[column] = view_args[arg]
+
+    return targets
+
+
+def backfill_log_targets(url_map, batch_size=5000):
+    """Fill `course_id` and `target_user_id` on rows logged before they existed.
+
+    Each endpoint is matched against the app's URL rules, the same way it would
+    be at request time. Rows are walked by id in batches.
+
+    Returns:
+        int: number of rows updated
+    """
+    adapter = url_map.bind("")
+    last_id = 0
+    updated = 0
+
+    while True:
+        rows = (
+            db.session.query(Log.id, Log.endpoint, Log.method)
+            .filter(Log.id > last_id)
+            .order_by(Log.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+
+        changes = []
+        for row in rows:
+            try:
+                _, view_args = adapter.match(row.endpoint, method=row.method)
+            except Exception:
+                # Routes that no longer exist or never matched
+                continue
+
+            targets = log_targets(view_args)
+            if any(targets.values()):
+                changes.append(dict(targets, id=row.id))
+
+        if changes:
+            db.session.bulk_update_mappings(Log, changes)
+        db.session.commit()
+
+        updated += len(changes)
+        last_id = rows[-1].id
+
+
+class AuditLogBuffer:
+    """Write request logs in batches from a background thread.
+
+    Requests only put a row on a bounded queue. A flusher thread inserts
+    whatever has queued up every `flush_interval` seconds, or sooner once
+    `batch_size` rows are waiting, and drains the queue when the process exits.
+
+    When the queue is full the `when_full` policy decides what happens:
+    `drop` discards the row and counts it in `audit_log.dropped`, `block` makes
+    the request wait up to `block_timeout` seconds for room before dropping.
+
+    With `threaded` off (the default when TESTING) rows are written as soon as
+    they are recorded.
+
+    Args:
+        queue_size (int): rows held in memory before the full policy applies
+        batch_size (int): most rows inserted at once
+        flush_interval (float): seconds between flushes
+        when_full (str): `drop` or `block`
+        block_timeout (float): seconds to wait for room with the `block` policy
+        threaded (bool): write from a background thread
+    """
+
+    def __init__(
+        self,
+        queue_size=10000,
+        batch_size=200,
+        flush_interval=0.5,
+        when_full=DROP,
+        block_timeout=0.05,
+        threaded=True,
+    ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.when_full = when_full
+        self.block_timeout = block_timeout
+        self.threaded = threaded
+        self.app = None
+        self.queue = Queue(maxsize=queue_size)
+        self._stop = Event()
+        self._thread = None
+        self._pid = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.queue_size = app.config.get("AUDIT_LOG_QUEUE_SIZE", 10000)
+        self.batch_size = app.config.get("AUDIT_LOG_BATCH_SIZE", 200)
+        self.flush_interval = app.config.get("AUDIT_LOG_FLUSH_INTERVAL", 500) / 1000
+        self.when_full = app.config.get("AUDIT_LOG_WHEN_FULL", DROP)
+        self.block_timeout = app.config.get("AUDIT_LOG_BLOCK_TIMEOUT", 50) / 1000
+        self.threaded = app.config.get("AUDIT_LOG_THREADED", not app.testing)
+        self.queue = Queue(maxsize=self.queue_size)
+
+    def record(self, row):
+        """Queue one log row.
+
+        Returns:
+            bool: False if the row was dropped because the buffer was full
+        """
+        if not self.threaded:
+            self.write([row])
+            return True
+
+        self._ensure_started()
+
+        try:
+            if self.when_full == BLOCK:
+                self.queue.put(row, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(row)
+        except Full:
+            metrics.counter("audit_log.dropped").inc()
+            return False
+
+        return True
+
+    def write(self, rows):
+        """Insert a batch of rows in one statement.
+
+        If the batch fails, the rows are retried one at a time so a single bad
+        row only loses itself.
+        """
+        started = time.perf_counter()
+        try:
+            db.session.execute(insert(Log), rows)
+            db.session.commit()
+            written = len(rows)
+        except Exception:
+            db.session.rollback()
+            if len(rows) == 1:
+                written = 0
+                self._failed(rows)
+            else:
+                written = sum(self._write_one(row) for row in rows)
+
+        metrics.counter("audit_log.written").inc(written)
+        metrics.histogram("audit_log.flush_ms").observe(
+            (time.perf_counter() - started) * 1000
+        )
+
+    def _write_one(self, row):
+        try:
+            db.session.execute(insert(Log), [row])
+            db.session.commit()
+            return 1
+        except Exception:
+            db.session.rollback()
+            self._failed([row])
+            return 0
+
+    def _failed(self, rows):
+        metrics.counter("audit_log.failed").inc(len(rows))
+        current_app.logger.exception("Could not write %s audit log rows", len(rows))
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while True:
+            batch = self._collect(timeout=0)
+            if not batch:
+                return
+            with self.app.app_context():
+                self.write(batch)
+
+    def stop(self, timeout=5):
+        """Stop the flusher after it drains the queue."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _ensure_started(self):
+        # Threads don't survive gunicorn forking its workers, so each process
+        # starts its own flusher the first time it logs something.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+
+            self._stop.clear()
+            self._thread = Thread(
+                target=self._run, name="audit-log-flusher", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _collect(self, timeout):
+        """Take up to `batch_size` rows, waiting at most `timeout` seconds."""
+        batch = []
+        deadline = time.monotonic() + timeout
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect(self.flush_interval)
+            if batch:
+                with self.app.app_context():
+                    self.write(batch)
+
+        self.flush()
+
+
+audit_log = AuditLogBuffer()
+atexit.register(audit_log.stop)
+
 
 def create_log():
     data = None
@@ -22,15 +282,21 @@ def create_log():
         elif request.json is not None:
             data = json.dumps(request.json)
 
+    # Strict databases reject an over-long value instead of cutting it
+    if data is not None:
+        data = data[: Log.json_data.type.length]
+
     user_id = current_user.id
 
-    log = Log(
-        user_id=user_id,
-        source_uri=source_uri,
-        endpoint=endpoint,
-        method=method,
-        json_data=data,
-    )
+    # The row is written later by the flusher, so stamp the time now.
+    row = {
+        "user_id": user_id,
+        "source_uri": source_uri,
+        "endpoint": endpoint,
+        "method": method,
+        "json_data": data,
+        "occurred": datetime.utcnow(),
+    }
+    row.update(log_targets(request.view_args))
 
-    db.session.add(log)
-    db.session.commit()
+    audit_log.record(row)
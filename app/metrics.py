@@ -0,0 +1,89 @@
+# In-process counters and latency histograms.
+#
+# Each gunicorn worker keeps its own numbers. They are cheap enough to update
+# on every request and are reported as JSON at /admin/metrics.
+from bisect import bisect_left
+from threading import Lock
+
+# Upper bounds in milliseconds for latency buckets
+DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Count observations into fixed buckets.
+
+    Args:
+        buckets (tuple): sorted upper bounds. Anything larger lands in `+Inf`.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class Registry:
+    """Named metrics shared by the whole process."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS):
+        return self._get(name, lambda: Histogram(buckets))
+
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+metrics = Registry()
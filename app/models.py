@@ -1,7 +1,13 @@
+import random
+import re
+import time
 from datetime import datetime
 
 from app.extensions import db, lm
+from flask import has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event, exists, func, insert, inspect, literal, select, union
+from sqlalchemy.exc import IntegrityError, OperationalError
 
 
 class Manager(object):
@@ -126,6 +132,17 @@ class UserType(Manager, db.Model):
 
 
 class Course(Manager, db.Model):
+    # The catalog, the extension feed and the admin lists all filter on
+    # active/student_allowed and a date range, then sort by date.
+    __table_args__ = (
+        db.Index("ix_course_active_starts", "active", "starts"),
+        db.Index("ix_course_active_ends", "active", "ends"),
+        db.Index(
+            "ix_course_student_allowed_active_ends", "student_allowed", "active", "ends"
+        ),
+        db.Index("ix_course_starts", "starts"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     coursetype_id = db.Column(db.Integer, db.ForeignKey(CourseType.id))
@@ -166,6 +183,27 @@ class Course(Manager, db.Model):
     def available_size(self):
         return self.course_size - len(self.registrations.all())
 
+    @staticmethod
+    def registration_counts(course_ids):
+        """Count registrations for a group of events in one grouped query.
+
+        Args:
+            course_ids (list): event IDs to count
+
+        Returns:
+            dict: {course_id: registrations}. Events without registrations are omitted.
+        """
+        if not course_ids:
+            return {}
+
+        rows = (
+            db.session.query(CourseUserAttended.course_id, func.count())
+            .filter(CourseUserAttended.course_id.in_(course_ids))
+            .group_by(CourseUserAttended.course_id)
+            .all()
+        )
+        return dict(rows)
+
     def __eq__(self, other):
         return self.starts == other.starts
 
@@ -191,10 +229,10 @@ class CourseLink(Manager, db.Model):
 
 class User(Manager, UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100))
+    name = db.Column(db.String(100), index=True)
     email = db.Column(db.String(100), unique=True)
     location_id = db.Column(db.Integer, db.ForeignKey("location.id"))
-    usertype_id = db.Column(db.Integer, db.ForeignKey("user_type.id"))
+    usertype_id = db.Column(db.Integer, db.ForeignKey("user_type.id"), index=True)
     is_student = db.Column(db.Boolean)
 
     role = db.relationship("UserType", backref="users")
@@ -218,6 +256,67 @@ class User(Manager, UserMixin, db.Model):
             .attended
         )
 
+    def registration_states(self, course_ids=None):
+        """Fetch the user's registrations in a single query.
+
+        Args:
+            course_ids (list) optional: limit the lookup to these event IDs
+
+        Returns:
+            dict: {course_id: attended} for every event the user is registered for.
+        """
+        query = db.session.query(
+            CourseUserAttended.course_id, CourseUserAttended.attended
+        ).filter(CourseUserAttended.user_id == self.id)
+
+        if course_ids is not None:
+            if not course_ids:
+                return {}
+            query = query.filter(CourseUserAttended.course_id.in_(course_ids))
+
+        return dict(query.all())
+
+    @staticmethod
+    def search(text, usertype_id=None, location_id=None, limit=20):
+        """Find users for a typeahead.
+
+        Every word typed has to start the user's name, a later word in the
+        name or their email. Each word is a union of prefix lookups on
+        ix_user_name, the email index and the user_name_token index, so no
+        branch scans the user table.
+
+        Args:
+            text (str): what the user typed
+            usertype_id (int) optional: only users with this role
+            location_id (int) optional: only users at this location
+            limit (int): most matches to return
+
+        Returns:
+            list: (id, name, email) rows in name order
+        """
+        tokens = text.split()
+        if not tokens:
+            return []
+
+        query = db.session.query(User.id, User.name, User.email)
+        for index, token in enumerate(tokens):
+            pattern = re.sub(r"([\\%_])", r"\\\1", token) + "%"
+            matches = union(
+                select(User.id).where(User.name.like(pattern, escape="\\")),
+                select(User.id).where(User.email.like(pattern, escape="\\")),
+                select(UserNameToken.user_id.label("id")).where(
+                    UserNameToken.token.like(pattern.lower(), escape="\\")
+                ),
+            ).subquery(f"match_{index}")
+            query = query.join(matches, matches.c.id == User.id)
+
+        if usertype_id is not None:
+            query = query.filter(User.usertype_id == usertype_id)
+        if location_id is not None:
+            query = query.filter(User.location_id == location_id)
+
+        return query.order_by(User.name, User.id).limit(limit).all()
+
     def __eq__(self, other):
         return self.name.split(" ")[::-1][0] == other.name.split(" ")[::-1][0]
 
@@ -225,20 +324,107 @@ class User(Manager, UserMixin, db.Model):
         return self.name.split(" ")[::-1][0] < other.name.split(" ")[::-1][0]
 
 
+class UserNameToken(db.Model):
+    """Words of a user's name after the first, lower-cased.
+
+    Lets the user search find a surname with an indexed prefix lookup. Kept in
+    step by mapper hooks on User. Fill it for existing users with
+    `flask backfill-name-tokens`.
+    """
+
+    __tablename__ = "user_name_token"
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    token = db.Column(db.String(100), primary_key=True, index=True)
+
+
+def name_tokens(name):
+    """The words of a name stored in user_name_token."""
+    return sorted({word.lower()[:100] for word in (name or "").split()[1:]})
+
+
+def index_name_tokens(connection, user_id, name):
+    """Replace a user's rows in user_name_token.
+
+    Args:
+        connection (Connection): connection whose transaction the write joins
+        user_id (int): valid user ID
+        name (str): the user's current name
+    """
+    table = UserNameToken.__table__
+    connection.execute(table.delete().where(table.c.user_id == user_id))
+    rows = [{"user_id": user_id, "token": token} for token in name_tokens(name)]
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+def backfill_name_tokens(batch_size=1000):
+    """Rebuild user_name_token for every user, one commit per batch.
+
+    Returns:
+        int: number of users indexed
+    """
+    last_id = 0
+    indexed = 0
+
+    while True:
+        users = (
+            db.session.query(User.id, User.name)
+            .filter(User.id > last_id)
+            .order_by(User.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not users:
+            return indexed
+
+        connection = db.session.connection()
+        for user_id, name in users:
+            index_name_tokens(connection, user_id, name)
+        db.session.commit()
+
+        indexed += len(users)
+        last_id = users[-1].id
+
+
 class Log(db.Model):
+    # Activity is read newest first per event, actor or target user, so each
+    # filter has an index that ends in `occurred` for keyset paging.
+    __table_args__ = (
+        db.Index("ix_log_user_id_occurred", "user_id", "occurred"),
+        db.Index("ix_log_course_id_occurred", "course_id", "occurred"),
+        db.Index("ix_log_target_user_id_occurred", "target_user_id", "occurred"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey(User.id))
     source_uri = db.Column(db.String(255))
     endpoint = db.Column(db.String(255))
     method = db.Column(db.String(64))
     json_data = db.Column(db.String(2500))
-    occurred = db.Column(db.DateTime, default=datetime.utcnow)
+    occurred = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Pulled from the URL when the request is logged. Not foreign keys so the
+    # history outlives deleted events and users.
+    course_id = db.Column(db.Integer)
+    target_user_id = db.Column(db.Integer)
 
     user = db.relationship("User", backref="actions")
 
 
 class CourseUserAttended(Manager, db.Model):
     __tablename__ = "course_user_attended"
+    # The primary key only helps lookups by course. A user's registrations and
+    # registrations in signup order need their own indexes.
+    __table_args__ = (
+        db.Index("ix_course_user_attended_user_id_created_at", "user_id", "created_at"),
+        db.Index(
+            "ix_course_user_attended_course_id_created_at", "course_id", "created_at"
+        ),
+    )
+
     course_id = db.Column(
         db.Integer,
         db.ForeignKey("course.id", onupdate="CASCADE", ondelete="CASCADE"),
@@ -251,3 +437,310 @@ class CourseUserAttended(Manager, db.Model):
     )
     attended = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def reserve(cls, course_id, user_id, retries=3, backoff=0.05):
+        """Claim a seat in an event with a single guarded INSERT.
+
+        The seat check and the insert run as one statement, so concurrent requests
+        can't both see the last open seat and oversell the event. The caller is
+        responsible for committing the session.
+
+        On InnoDB the INSERT ... SELECT takes shared next-key locks over the
+        event's registrations, and two requests holding them deadlock as soon as
+        both insert. The event row is locked first with SELECT ... FOR UPDATE,
+        so registrations for one event queue there and take their turn instead.
+        SQLite locks the whole database on write and ignores FOR UPDATE.
+
+        Args:
+            course_id (int): valid event ID
+            user_id (int): valid user ID
+            retries (int) optional: attempts made when the database picks this
+                statement as a deadlock victim or the write lock times out
+            backoff (float) optional: upper bound in seconds of the random wait
+                before the first retry, doubled for each one after
+
+        Returns:
+            bool: True if the seat was claimed, False if the event is full or the
+                user is already registered.
+        """
+        lock = select(Course.id).where(Course.id == course_id).with_for_update()
+
+        taken = (
+            select(func.count())
+            .select_from(cls)
+            .where(cls.course_id == course_id)
+            .scalar_subquery()
+        )
+        size = (
+            select(Course.course_size).where(Course.id == course_id).scalar_subquery()
+        )
+        registered = exists().where(cls.course_id == course_id, cls.user_id == user_id)
+
+        guarded = select(
+            literal(course_id),
+            literal(user_id),
+            literal(False),
+            literal(datetime.utcnow()),
+        ).where(taken < size, ~registered)
+
+        statement = insert(cls).from_select(
+            ["course_id", "user_id", "attended", "created_at"], guarded
+        )
+
+        for attempt in range(retries):
+            try:
+                db.session.execute(lock)
+                claimed = db.session.execute(statement).rowcount == 1
+                if claimed:
+                    # Core inserts skip the flush hooks
+                    mark_course_changed(course_id)
+                    count_registration(course_id, datetime.utcnow().date())
+                return claimed
+            except IntegrityError:
+                # Another request registered the same user first.
+                db.session.rollback()
+                return False
+            except OperationalError:
+                db.session.rollback()
+                if attempt == retries - 1:
+                    raise
+                # Spread the retries out so the requests that collided don't
+                # all come back at the same moment.
+                time.sleep(random.uniform(0, backoff * 2**attempt))
+
+        return False
+
+
+class CalendarOutbox(db.Model):
+    """Calendar webhook calls waiting to be delivered by `flask calendar-worker`.
+
+    Rows are written in the same transaction as the registration change that
+    caused them so the calendar never drifts from the database.
+    """
+
+    __tablename__ = "calendar_outbox"
+    __table_args__ = (
+        db.Index("ix_calendar_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    method = db.Column(db.String(16))
+    calendar_id = db.Column(db.String(255))
+    event_id = db.Column(db.String(255))
+    payload = db.Column(db.Text)
+    status = db.Column(db.String(16), default="pending")
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    batch_id = db.Column(db.String(32))
+
+
+class CacheVersion(db.Model):
+    """Version stamps shared by every worker's caches.
+
+    A stamp is bumped in the same transaction as the write that makes cached
+    copies stale, and workers compare it before trusting what they hold.
+    """
+
+    __tablename__ = "cache_version"
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RegistrationDaily(db.Model):
+    """Registrations and cancellations per event per day.
+
+    Kept up to date in the same transaction as the registration change, so
+    trend charts read a few rows instead of grouping every registration.
+    Rebuild the registration counts with `flask backfill-registration-daily`.
+    """
+
+    __tablename__ = "registration_daily"
+
+    course_id = db.Column(
+        db.Integer,
+        db.ForeignKey("course.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = db.Column(db.Date, primary_key=True)
+    registrations = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+
+
+def upsert_counts(session, table, keys, rows):
+    """Insert counter rows, or add their amounts to the rows already there.
+
+    Args:
+        session (Session): session whose transaction the write joins
+        table (Table): counter table
+        keys (list): primary key column names
+        rows (list): dicts of the keys and the amounts to add. Sort them the
+            same way every time so concurrent commits can't deadlock.
+    """
+    counts = [name for name in rows[0] if name not in keys]
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as upsert
+
+        statement = upsert(table).values(rows)
+        statement = statement.on_duplicate_key_update(
+            {name: table.c[name] + statement.inserted[name] for name in counts}
+        )
+    else:
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+
+        statement = upsert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in counts},
+        )
+
+    session.execute(statement)
+
+
+# Functions called with the changed event IDs after each commit that edits
+# events or registrations. Caches of event data register here.
+course_change_listeners = []
+
+
+def on_courses_changed(fn):
+    """Register `fn(course_ids)` to run after commits that change events."""
+    course_change_listeners.append(fn)
+    return fn
+
+
+def mark_course_changed(course_id):
+    """Note that an event's cached output is stale once the session commits.
+
+    The ids collect in `db.session.info["changed_courses"]` and are handed to
+    the change listeners after commit, so a rolled back change never clears a
+    cache.
+
+    Args:
+        course_id (int): valid event ID
+    """
+    db.session.info.setdefault("changed_courses", set()).add(course_id)
+
+
+def count_registration(course_id, day, column="registrations"):
+    """Add one to an event's daily rollup when the session commits.
+
+    Args:
+        course_id (int): valid event ID
+        day (date): day the registration was made or cancelled
+        column (str) optional: "registrations" or "cancellations"
+    """
+    counts = db.session.info.setdefault("registration_counts", {})
+    counts[(course_id, day, column)] = counts.get((course_id, day, column), 0) + 1
+
+
+@event.listens_for(db.session, "after_flush")
+def track_changed_courses(session, flush_context):
+    # Edits to an event, its links or its registrations all change what is
+    # shown for it
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Course):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            ids = [obj.id]
+        elif isinstance(obj, (CourseUserAttended, CourseLink)):
+            history = inspect(obj).attrs.course_id.history
+            ids = history.sum()
+        else:
+            continue
+
+        changed = session.info.setdefault("changed_courses", set())
+        changed.update(course_id for course_id in ids if course_id is not None)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_changed_courses(session, previous_transaction):
+    session.info.pop("changed_courses", None)
+
+
+@event.listens_for(db.session, "after_commit")
+def notify_changed_courses(session):
+    changed = session.info.pop("changed_courses", None)
+    if changed and has_app_context():
+        for listener in course_change_listeners:
+            listener(sorted(changed))
+
+
+# Mapper events also see registrations deleted as orphans during the flush
+@event.listens_for(CourseUserAttended, "after_insert")
+def count_inserted_registration(mapper, connection, target):
+    created_at = target.created_at or datetime.utcnow()
+    count_registration(target.course_id, created_at.date())
+
+
+@event.listens_for(CourseUserAttended, "after_delete")
+def count_deleted_registration(mapper, connection, target):
+    count_registration(target.course_id, datetime.utcnow().date(), "cancellations")
+
+
+@event.listens_for(Course, "after_delete")
+def forget_deleted_course_counts(mapper, connection, target):
+    db.session.info.setdefault("deleted_courses", set()).add(target.id)
+
+
+@event.listens_for(db.session, "before_commit")
+def write_registration_counts(session):
+    # Pending changes are only flushed after this hook
+    session.flush()
+
+    counts = session.info.pop("registration_counts", None)
+    deleted_courses = session.info.pop("deleted_courses", set())
+    if not counts:
+        return
+
+    # One row per event and day, or the upsert would touch a row twice
+    rows = {}
+    for (course_id, day, column), amount in counts.items():
+        # The rollup rows go with the event
+        if course_id in deleted_courses:
+            continue
+        row = rows.setdefault(
+            (course_id, day),
+            {
+                "course_id": course_id,
+                "day": day,
+                "registrations": 0,
+                "cancellations": 0,
+            },
+        )
+        row[column] += amount
+
+    if rows:
+        table = RegistrationDaily.__table__
+        ordered = [rows[key] for key in sorted(rows)]
+        upsert_counts(session, table, ["course_id", "day"], ordered)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_registration_counts(session, previous_transaction):
+    session.info.pop("registration_counts", None)
+    session.info.pop("deleted_courses", None)
+
+
+@event.listens_for(User, "after_insert")
+def index_inserted_user(mapper, connection, target):
+    index_name_tokens(connection, target.id, target.name)
+
+
+@event.listens_for(User, "after_update")
+def index_renamed_user(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        index_name_tokens(connection, target.id, target.name)
+
+
+@event.listens_for(User, "before_delete")
+def forget_deleted_user(mapper, connection, target):
+    index_name_tokens(connection, target.id, None)
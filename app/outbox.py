@@ -0,0 +1,354 @@
+# Calendar webhook outbox.
+#
+# Registration changes don't call the Apps Script webhook during the request.
+# Each `patch`/`pop` is written to the calendar_outbox table in the same
+# transaction as the registration, and `flask calendar-worker` delivers them
+# in the background with retries and exponential backoff. Calls that keep
+# failing are marked dead so they can be inspected instead of retried forever.
+#
+# Changes for the same calendar event are coalesced into a single `userIds`
+# call per method, so a registration rush costs a handful of Apps Script runs
+# instead of one per user.
+import json
+import time
+from uuid import uuid4
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from app.calendar import CircuitOpenError, calendar_hook
+from app.extensions import db
+from app.models import CalendarOutbox
+
+PENDING = "pending"
+SENT = "sent"
+DEAD = "dead"
+
+
+def enqueue(method, event_id, emails, calendar_id=None):
+    """Queue a calendar attendee change in the current transaction.
+
+    The row is only added to the session. It is committed (or rolled back) with
+    the registration change that caused it.
+
+    Args:
+        method (str): webhook method, `patch` to add attendees or `pop` to remove them
+        event_id (str): Google Calendar event ID
+        emails (list): attendee email addresses
+        calendar_id (str) optional: defaults to GOOGLE_CALENDAR_ID
+
+    Returns:
+        CalendarOutbox: the pending outbox row
+    """
+    user_ids = [{"email": email, "responseStatus": "needsAction"} for email in emails]
+
+    item = CalendarOutbox(
+        method=method,
+        calendar_id=calendar_id or current_app.config["GOOGLE_CALENDAR_ID"],
+        event_id=event_id,
+        payload=json.dumps({"userIds": user_ids}),
+        status=PENDING,
+        attempts=0,
+        created_at=datetime.utcnow(),
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(item)
+
+    return item
+
+
+def outbox_stats():
+    """Summarize how far behind calendar sync is.
+
+    Returns:
+        dict: pending, failing and dead row counts, plus the age in seconds of
+            the oldest undelivered call.
+    """
+    pending, oldest = (
+        db.session.query(
+            func.count(CalendarOutbox.id), func.min(CalendarOutbox.created_at)
+        )
+        .filter(CalendarOutbox.status == PENDING)
+        .one()
+    )
+    failing = CalendarOutbox.query.filter(
+        CalendarOutbox.status == PENDING, CalendarOutbox.attempts > 0
+    ).count()
+    dead = CalendarOutbox.query.filter(CalendarOutbox.status == DEAD).count()
+
+    # Every delivered row shares a batch_id with the rows it was merged with.
+    # Rows cancelled out before sending have no batch_id.
+    delivered, calls = (
+        db.session.query(
+            func.count(CalendarOutbox.id),
+            func.count(func.distinct(CalendarOutbox.batch_id)),
+        )
+        .filter(CalendarOutbox.status == SENT)
+        .one()
+    )
+
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+
+    return {
+        "pending": pending,
+        "failing": failing,
+        "dead": dead,
+        "lag_seconds": round(lag, 1),
+        "delivered": delivered,
+        "calls": calls,
+        "calls_saved": delivered - calls,
+    }
+
+
+class Coalescer:
+    """Merge queued attendee changes for one calendar event.
+
+    Rows are buffered per (calendarId, eventId) until the oldest has waited
+    `window` seconds or the group touches `max_users` attendees, then flushed as
+    at most one `patch` and one `pop` call. A user added and removed inside the
+    same window cancels out and isn't sent at all.
+
+    Args:
+        window (float): seconds to hold a group open for more changes
+        max_users (int): flush a group early once it touches this many attendees
+    """
+
+    def __init__(self, window=0, max_users=50):
+        self.window = timedelta(seconds=window)
+        self.max_users = max_users
+
+    def net_changes(self, items):
+        """Collapse a group of rows into the attendees to add and remove.
+
+        Args:
+            items (list): CalendarOutbox rows for one event, oldest first
+
+        Returns:
+            tuple: (emails to patch, emails to pop)
+        """
+        net = {}
+        for item in items:
+            step = 1 if item.method == "patch" else -1
+            for user in json.loads(item.payload)["userIds"]:
+                net[user["email"]] = net.get(user["email"], 0) + step
+
+        adds = [email for email, count in net.items() if count > 0]
+        removes = [email for email, count in net.items() if count < 0]
+
+        return adds, removes
+
+    def ready(self, items, now):
+        if now - min(item.created_at for item in items) >= self.window:
+            return True
+
+        emails = set()
+        for item in items:
+            emails.update(user["email"] for user in json.loads(item.payload)["userIds"])
+
+        return len(emails) >= self.max_users
+
+    def batches(self, items, now, blocked=()):
+        """Group rows by event and yield the groups that should be flushed.
+
+        Args:
+            items (list): claimed CalendarOutbox rows, oldest first
+            now (datetime): current UTC time
+            blocked (set) optional: (calendar_id, event_id) keys with an older row
+                waiting out a retry. Their newer rows are held so changes reach the
+                calendar in order.
+
+        Yields:
+            tuple: ((calendar_id, event_id), [rows])
+        """
+        groups = {}
+        for item in items:
+            groups.setdefault((item.calendar_id, item.event_id), []).append(item)
+
+        for key, group in groups.items():
+            if key not in blocked and self.ready(group, now):
+                yield key, group
+
+
+class CalendarWorker:
+    """Deliver queued calendar webhook calls.
+
+    Args:
+        batch_size (int): rows claimed per pass
+        max_attempts (int): deliveries tried before a row is dead-lettered
+        base_delay (float): seconds before the first retry. Doubles on every failure.
+        max_delay (float): ceiling for the retry delay in seconds
+        coalescer (Coalescer) optional: merges rows for the same event
+    """
+
+    def __init__(
+        self,
+        batch_size=50,
+        max_attempts=8,
+        base_delay=5,
+        max_delay=3600,
+        coalescer=None,
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalescer = coalescer or Coalescer()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            batch_size=config.get("CALENDAR_OUTBOX_BATCH_SIZE", 50),
+            max_attempts=config.get("CALENDAR_OUTBOX_MAX_ATTEMPTS", 8),
+            base_delay=config.get("CALENDAR_OUTBOX_BASE_DELAY", 5),
+            max_delay=config.get("CALENDAR_OUTBOX_MAX_DELAY", 3600),
+            coalescer=Coalescer(
+                window=config.get("CALENDAR_COALESCE_WINDOW", 2),
+                max_users=config.get("CALENDAR_COALESCE_MAX_USERS", 50),
+            ),
+        )
+
+    def backoff(self, attempts):
+        """Delay before the next delivery after `attempts` failures."""
+        return timedelta(
+            seconds=min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        )
+
+    def claim(self, now):
+        """Lock the next batch of due rows.
+
+        SKIP LOCKED lets several workers drain the table without delivering the
+        same call twice. SQLite ignores the lock and serializes writers instead.
+        """
+        return (
+            CalendarOutbox.query.filter(
+                CalendarOutbox.status == PENDING,
+                CalendarOutbox.next_attempt_at <= now,
+            )
+            .order_by(CalendarOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    def backing_off(self, now):
+        """Events with a failed row waiting for its next attempt."""
+        rows = (
+            db.session.query(CalendarOutbox.calendar_id, CalendarOutbox.event_id)
+            .filter(
+                CalendarOutbox.status == PENDING,
+                CalendarOutbox.next_attempt_at > now,
+            )
+            .distinct()
+            .all()
+        )
+        return set(rows)
+
+    def send(self, method, calendar_id, event_id, emails):
+        """Send one attendee change through the shared webhook client.
+
+        Raises:
+            CalendarHookError: the call failed and should be retried.
+        """
+        calendar_hook.call(
+            method,
+            calendarId=calendar_id,
+            eventId=event_id,
+            userIds=[
+                {"email": email, "responseStatus": "needsAction"} for email in emails
+            ],
+        )
+
+    def flush(self, calendar_id, event_id, items):
+        """Send the merged changes for one event and record the outcome.
+
+        The rows only make sense together: a `pop` can cancel a `patch` from
+        another row. If any call for the group fails, every row stays pending so
+        the retry nets them out again. The call that did go through is sent
+        again then. That is harmless because webhook.js skips attendees who are
+        already invited and removing an attendee twice changes nothing.
+        """
+        adds, removes = self.coalescer.net_changes(items)
+        batch_ids = {}
+        error = None
+
+        for method, emails in (("patch", adds), ("pop", removes)):
+            if not emails:
+                # Everything for this method cancelled out.
+                batch_ids[method] = None
+                continue
+
+            try:
+                self.send(method, calendar_id, event_id, emails)
+                batch_ids[method] = uuid4().hex
+            except CircuitOpenError:
+                # Not a delivery attempt. drain() leaves the rows as they are.
+                raise
+            except Exception as e:
+                error = str(e)[:500] or type(e).__name__
+
+        now = datetime.utcnow()
+        for item in items:
+            item.attempts += 1
+
+            if error is None:
+                item.status = SENT
+                item.sent_at = now
+                item.batch_id = batch_ids[item.method]
+                item.last_error = None
+            elif item.attempts >= self.max_attempts:
+                item.status = DEAD
+                item.last_error = error
+                current_app.logger.error(
+                    "Calendar outbox %s dead after %s attempts: %s",
+                    item.id,
+                    item.attempts,
+                    error,
+                )
+            else:
+                item.last_error = error
+                item.next_attempt_at = now + self.backoff(item.attempts)
+
+    def drain(self):
+        """Deliver every event group that is ready to flush.
+
+        Returns:
+            int: number of rows processed
+        """
+        # Leave rows alone while the hook is down instead of burning their
+        # attempts on calls the breaker would reject anyway.
+        if calendar_hook.breaker.is_open:
+            return 0
+
+        now = datetime.utcnow()
+        items = self.claim(now)
+        blocked = self.backing_off(now)
+        processed = 0
+
+        for (calendar_id, event_id), group in self.coalescer.batches(
+            items, now, blocked
+        ):
+            try:
+                self.flush(calendar_id, event_id, group)
+            except CircuitOpenError:
+                # The breaker opened partway through this pass. Stop here so
+                # the remaining rows keep their attempts.
+                break
+            processed += len(group)
+
+        db.session.commit()
+
+        return processed
+
+    def run(self, interval=2.0):
+        """Drain the outbox until interrupted, sleeping when it is empty."""
+        while True:
+            try:
+                processed = self.drain()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Calendar worker pass failed")
+                processed = 0
+
+            if processed < self.batch_size:
+                time.sleep(interval)
@@ -0,0 +1,82 @@
+# Keyset pagination helpers.
+#
+# Lists are paged on a (sort column, id) pair instead of an OFFSET, so a page
+# deep in the history costs the same index range scan as the first one. The
+# position of the last row on a page is handed back to the client as an opaque
+# cursor string.
+import base64
+from datetime import datetime
+
+from marshmallow import ValidationError
+from sqlalchemy import and_, or_
+from webargs import fields
+
+
+def encode_cursor(value, row_id):
+    """Opaque position of the last row on a page.
+
+    Args:
+        value (datetime): sort column value of the row
+        row_id (int): primary key of the row
+
+    Returns:
+        str: url-safe cursor
+    """
+    text = f"{value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+class Cursor(fields.Field):
+    """Query argument holding a cursor from `encode_cursor`."""
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            text = base64.urlsafe_b64decode(value.encode()).decode()
+            position, row_id = text.split("|")
+            return datetime.fromisoformat(position), int(row_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValidationError("Invalid cursor.")
+
+
+def keyset(query, column, id_column, cursor=None, descending=False, limit=50):
+    """Fetch one page of a query ordered by (column, id).
+
+    Args:
+        query (Query): filtered query to page through
+        column (Column): sort column
+        id_column (Column): primary key, breaks ties in `column`
+        cursor (tuple) optional: (value, id) of the last row already shown
+        descending (bool): newest first
+        limit (int): rows per page
+
+    Returns:
+        tuple: (rows on this page, cursor for the next page or None)
+    """
+    if cursor is not None:
+        value, row_id = cursor
+        if descending:
+            query = query.filter(
+                or_(column < value, and_(column == value, id_column < row_id))
+            )
+        else:
+            query = query.filter(
+                or_(column > value, and_(column == value, id_column > row_id))
+            )
+
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column, id_column)
+
+    # One extra row says whether there is another page.
+    rows = query.limit(limit + 1).all()
+    page = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(
+            getattr(last, column.key), getattr(last, id_column.key)
+        )
+
+    return page, next_cursor
@@ -0,0 +1,124 @@
+# In-process copies of the small lookup tables.
+#
+# Course types, locations, link types and user types are read by nearly every
+# form and change a few times a year. Each worker keeps them as tuples of
+# read-only rows with the <select> options already built. Any commit that
+# writes one of the tables bumps its version stamp, so every worker reloads
+# it on the next request.
+from collections import namedtuple
+from threading import Lock
+from flask import has_app_context
+from sqlalchemy import event, select
+
+from app.extensions import db
+from app.metrics import metrics
+from app.models import CourseLinkType, CourseType, Location, UserType
+from app.versions import versions
+
+
+class Snapshot:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.by_id = {row.id: row for row in rows}
+        self.options = tuple({"value": row.id, "text": row.name} for row in rows)
+
+
+class ReferenceTable:
+    """Read-only copy of one lookup table.
+
+    Args:
+        model (db.Model): table to copy. Rows are kept in primary key order.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = [column.key for column in model.__table__.columns]
+        self.Row = namedtuple(f"{model.__name__}Row", self.columns)
+        self.stamp = f"reference:{model.__tablename__}"
+        self._snapshot = None
+        self._generation = 0
+        self._lock = Lock()
+        versions.preload(self.stamp)
+
+    def current_version(self):
+        return (self._generation, versions.get(self.stamp))
+
+    def snapshot(self):
+        version = self.current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                metrics.counter(f"reference.{self.model.__tablename__}.loads").inc()
+                table = self.model.__table__
+                result = db.session.execute(select(*table.columns).order_by(table.c.id))
+                rows = tuple(self.Row(*row) for row in result)
+                snapshot = Snapshot(version, rows)
+                self._snapshot = snapshot
+
+        return snapshot
+
+    def all(self):
+        """Every row, in table order."""
+        return self.snapshot().rows
+
+    def get(self, row_id):
+        return self.snapshot().by_id.get(row_id)
+
+    def by_name(self, name):
+        return next((row for row in self.all() if row.name == name), None)
+
+    def options(self):
+        """Rows as [{value, text}, ...] for the select partial."""
+        return self.snapshot().options
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+
+class ReferenceData:
+    """All of the cached lookup tables, keyed by model."""
+
+    def __init__(self, *tables):
+        self.tables = {table.model: table for table in tables}
+
+    def init_app(self, app):
+        # Don't carry rows over from another app's database
+        self.invalidate(self.tables)
+
+    def invalidate(self, models):
+        for model in models:
+            self.tables[model].invalidate()
+
+
+course_types = ReferenceTable(CourseType)
+link_types = ReferenceTable(CourseLinkType)
+locations = ReferenceTable(Location)
+user_types = ReferenceTable(UserType)
+
+reference = ReferenceData(course_types, link_types, locations, user_types)
+
+
+@event.listens_for(db.session, "after_flush")
+def track_reference_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj) in reference.tables:
+            session.info.setdefault("changed_reference", set()).add(type(obj))
+
+
+@event.listens_for(db.session, "after_commit")
+def reload_changed_reference(session):
+    changed = session.info.pop("changed_reference", None)
+    if changed and has_app_context():
+        reference.invalidate(changed)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_reference_changes(session, previous_transaction):
+    session.info.pop("changed_reference", None)
@@ -7,6 +7,7 @@ from webargs.flaskparser import parser
 
 from app.extensions import db
 from app.models import CourseLinkType
+from app.reference import link_types
 from app.schemas import CourseLinkTypeSchema, NewCourseLinkTypeSchema
 from app.wrappers import admin_only, restricted
 
@@ -18,8 +19,7 @@ class CourseLinkTypesAPI(MethodView):
         Returns:
             List[CourseLinkType]: List of link types.
         """
-        links = CourseLinkType.query.all()
-        return jsonify(CourseLinkTypeSchema(many=True).dump(links))
+        return jsonify(CourseLinkTypeSchema(many=True).dump(link_types.all()))
 
     @restricted
     def post(self: None) -> CourseLinkType:
@@ -6,17 +6,26 @@ from typing import List
 from flask import abort, current_app, jsonify, make_response, render_template, request
 from flask.views import MethodView
 from flask_login import current_user
-import requests
 from webargs import fields
 from webargs.multidictproxy import MultiDictProxy
 from webargs.flaskparser import parser
 
 from app.extensions import db, cache
 
-from config import Config
-
-from app.calendar import CalendarService
+from app import outbox
+from app.calendar import (
+    CalendarHookError,
+    CalendarService,
+    CalendarUnavailableError,
+    calendar_hook,
+)
+from app.catalog import cached_upcoming, catalog, user_state, with_user_state
+from app.feeds import build_feed, serve_feed
+from app.fragments import event_cards
 from app.models import Course, CourseLink, CourseType, CourseUserAttended, User
+from app.pagination import Cursor, keyset
+from app.reference import course_types, link_types
+from app.stats import event_stats
 from app.schemas import (
     CourseAttendingSchema,
     CourseDetailSchema,
@@ -29,7 +38,6 @@ from app.schemas import (
     UserAttended,
     UserSchema,
 )
-from app.static.assets.icons import registered, attended
 from app.utils import clean_escaped_html
 from app.wrappers import admin_only, admin_or_self, restricted
 
@@ -44,6 +52,39 @@ attended_schema = UserAttended()
 attendee_schema = UserAttended(many=True)
 
 
+def set_user_state(course: Course, states: dict) -> Course:
+    """Attach the current user's registration state and icon to an event.
+
+    Args:
+        course (Course): event to update
+        states (dict): {course_id: attended} from User.registration_states
+
+    Returns:
+        Course: the updated event
+    """
+    course.state, icon = user_state(course.id, states)
+    if icon is not None:
+        course.icon = icon
+
+    return course
+
+
+def extension_feed(now: datetime) -> dict:
+    # The next few events shown by the browser extension
+    events = (
+        Course.query.filter(Course.active == True, Course.starts >= now)
+        .order_by(Course.starts)
+        .limit(5)
+        .all()
+    )
+    return build_feed(TinyCourseSchema(many=True).dump(events))
+
+
+def upcoming(now: datetime) -> list:
+    events = Course.query.filter(Course.active == True, Course.starts >= now).all()
+    return SmallCourseSchema(many=True).dump(events)
+
+
 class CourseListAPI(MethodView):
     # @cache.cached(timeout=50, key_prefix='all_courses')
     def get(self: None) -> List[Course]:
@@ -56,69 +97,63 @@ class CourseListAPI(MethodView):
             {
                 "format": fields.Str(load_default=None),
                 "all": fields.Bool(load_default=False),
+                "cursor": Cursor(),
             },
             location="querystring",
         )
 
         if args["format"] == "json":
-            now = datetime.now()
-            events = (
-                Course.query.filter(Course.active == True, Course.starts >= now)
-                .order_by(Course.starts)
-                .limit(5)
-                .all()
+            return serve_feed(
+                "courses", cached_upcoming("extension-feed", extension_feed)
             )
-            return jsonify(TinyCourseSchema(many=True).dump(events))
         else:
             if current_user.is_anonymous:
                 abort(401)
 
-            from app.static.assets.icons import edit
-
-            now = datetime.now()
-
-            # This filters events down to active, future events.
-            # args = parser.parse({'all': fields.Bool(), 'missing': False}, location='querystring')
+            limit = current_app.config.get("CATALOG_PAGE_SIZE", 24)
 
+            # Events are read a page at a time in start order. The last card on
+            # each page loads the next one when it scrolls into view.
             if args["all"]:
-                courses = Course.query.all()
-            else:
-                courses = Course.query.filter(
-                    Course.active == True, Course.ends >= now
-                ).all()
-
-            if len(courses) > 0:
-                template = "events/index.html"
-                # calculate the remaining number of seats at request time.
+                # Past and inactive events are only listed on request, so they
+                # are read straight from the database.
+                query = Course.query
+                if current_user.is_student:
+                    query = query.filter(Course.student_allowed == True)
+
+                courses, next_cursor = keyset(
+                    query,
+                    Course.starts,
+                    Course.id,
+                    cursor=args.get("cursor"),
+                    limit=limit,
+                )
+                counts = Course.registration_counts([course.id for course in courses])
                 for course in courses:
-                    course.available = course.available_size()
-
-                    # Determine the current state for the user
-                    if current_user.is_enrolled(course) and current_user.is_attended(
-                        course
-                    ):
-                        course.state = "attended"
-                        course.icon = attended
-                    elif current_user.is_enrolled(
-                        course
-                    ) and not current_user.is_attended(course):
-                        course.state = "registered"
-                        course.icon = registered
-                    else:
-                        course.state = "available"
+                    course.available = course.course_size - counts.get(course.id, 0)
 
-                if current_user.is_student:
-                    sorted_courses = [
-                        course for course in sorted(courses) if course.student_allowed
-                    ]
-                    if not len(sorted_courses):
-                        template = "shared/partials/no-upcoming.html"
-                else:
-                    sorted_courses = sorted(courses)
+                events = SmallCourseSchema(many=True).dump(courses)
+            else:
+                # Upcoming events are shared by every viewer
+                events, next_cursor = catalog.page(
+                    student=current_user.is_student,
+                    cursor=args.get("cursor"),
+                    limit=limit,
+                )
+
+            if len(events) > 0:
+                # Only the viewer's own registrations are looked up per request
+                states = current_user.registration_states(
+                    [event["id"] for event in events]
+                )
+                events = with_user_state(events, states)
 
                 return render_template(
-                    template,
-                    events=SmallCourseSchema(many=True).dump(sorted_courses),
+                    "events/index.html",
+                    events=events,
+                    cards=event_cards.render(events),
+                    next_cursor=next_cursor,
+                    show_all=args["all"],
                 )
             else:
                 return render_template(
@@ -173,20 +208,15 @@ class CourseListAPI(MethodView):
             }
 
         # post to a webhook to handle the event creation
-        webhook_url = Config.CALENDAR_HOOK_URL
-
-        payload = {
-            "method": "post",
-            "token": Config.CALENDAR_HOOK_TOKEN,
-            "userId": current_user.email,
-            "calendarId": Config.GOOGLE_CALENDAR_ID,
-            "body": body,
-        }
-
-        response = requests.post(webhook_url, json=payload)
+        try:
+            calendar_event = calendar_hook.call(
+                "post", userId=current_user.email, body=body
+            )
+        except CalendarHookError:
+            abort(503)
 
         # Upate the args object before posting to the database
-        args["ext_calendar"] = response.json()["id"]
+        args["ext_calendar"] = calendar_event["id"]
 
         course = Course().create(Course, args)
         result = Course.query.get(course.id)
@@ -195,20 +225,14 @@ class CourseListAPI(MethodView):
         result.presenters.append(current_user)
 
         # If it's a Google Meet, add the link to th event automatically
-        if "conferenceData" in response.json():
-            from app.models import CourseLinkType
-
-            linktype_id = (
-                CourseLinkType.query.filter(CourseLinkType.name == "Google Meet")
-                .first()
-                .id
-            )
+        if "conferenceData" in calendar_event:
+            linktype_id = link_types.by_name("Google Meet").id
 
             link = {
                 "course_id": result.id,
                 "courselinktype_id": linktype_id,
                 "name": "Join the Meet",
-                "uri": response.json()["conferenceData"]["entryPoints"][0]["uri"],
+                "uri": calendar_event["conferenceData"]["entryPoints"][0]["uri"],
             }
             course_link = CourseLink().create(CourseLink, link)
 
@@ -220,6 +244,7 @@ class CourseListAPI(MethodView):
         # This catches event creation when it's duplicated from another event.
         # Duplication happens on the admin page, so only return events the presenter
         # is responsible for if it's a presenter. If it's an admin, return all events.
+        schema = None
         if request.headers.get("HX-Trigger") == "form--duplicate":
             schema = TinyCourseSchema(many=True)
             if current_user.usertype_id == 1:
@@ -233,15 +258,13 @@ class CourseListAPI(MethodView):
         # If the event is created from the <Create> page, then kick the upcoming events
         # back to the user on the home page.
         else:
-            now = datetime.now()
-            events = Course.query.filter(
-                Course.active == True, Course.starts >= now
-            ).all()
-
-            schema = SmallCourseSchema(many=True)
+            events = cached_upcoming("upcoming", upcoming)
             template = "home/index.html"
 
-        response = make_response(render_template(template, events=schema.dump(events)))
+        if schema is not None:
+            events = schema.dump(events)
+
+        response = make_response(render_template(template, events=events))
         response.headers.set(
             "HX-Trigger",
             json.dumps({"showToast": "Successfully created {}".format(course.title)}),
@@ -269,14 +292,7 @@ class CourseAPI(MethodView):
 
         course.available = course.available_size()
 
-        if current_user.is_enrolled(course) and current_user.is_attended(course):
-            course.state = "attended"
-            course.icon = attended
-        elif current_user.is_enrolled(course) and not current_user.is_attended(course):
-            course.state = "registered"
-            course.icon = registered
-        else:
-            course.state = "available"
+        set_user_state(course, current_user.registration_states([course.id]))
 
         # if current_user.role.name == "SuperAdmin":
         #     return jsonify(CourseSchema().dump(course))
@@ -314,8 +330,6 @@ class CourseAPI(MethodView):
         args = parser.parse(CourseSchema(), location="json")
 
         course = Course.query.get(course_id)
-        calendar_id = Config.GOOGLE_CALENDAR_ID
-        webhook_url = Config.CALENDAR_HOOK_URL
 
         if course is None:
             abort(404)
@@ -355,38 +369,22 @@ class CourseAPI(MethodView):
                         },
                     }
 
-                    payload = {
-                        "method": "put",
-                        "token": Config.CALENDAR_HOOK_TOKEN,
-                        "eventId": course.ext_calendar,
-                        "calendarId": calendar_id,
-                        "body": body,
-                    }
-                    request = requests.post(webhook_url, json=payload)
-
-                ordered_regs = course.registrations.order_by(
-                    CourseUserAttended.created_at
-                ).all()
-                if ordered_regs:
-                    last_reg = course.registrations.order_by(
-                        CourseUserAttended.created_at
-                    )[-1].created_at
-                    formatted_date = last_reg.strftime("%m/%d/%y, %I:%M %p")
-                else:
-                    formatted_date = "-"
-
-                # Add some calculated stats about the event
-                data = [
-                    {
-                        "label": "Registrations",
-                        "value": len(course.registrations.all()),
-                    },
-                    {"label": "Last Registration", "value": formatted_date},
-                ]
+                    # The event is already saved. A calendar outage shouldn't
+                    # fail the edit, so log it and carry on.
+                    try:
+                        calendar_hook.call(
+                            "put", eventId=course.ext_calendar, body=body
+                        )
+                    except CalendarHookError as e:
+                        current_app.logger.warning(
+                            "Could not update calendar event %s: %s",
+                            course.ext_calendar,
+                            e,
+                        )
 
                 content = {
                     "event": CourseDetailSchema().dump(course),
-                    "data": data,
+                    "data": event_stats(course.id).summary(),
                     "icon": left_arrow,
                 }
 
@@ -414,25 +412,24 @@ class CourseAPI(MethodView):
         Returns:
             dict: Status of the removal as an error or success message.
         """
-        webhook_url = Config.CALENDAR_HOOK_URL
-        calendar_id = Config.GOOGLE_CALENDAR_ID
-
         course = Course.query.get(course_id)
         if course is None:
             abort(404)
 
-        payload = {
-            "method": "delete",
-            "token": Config.CALENDAR_HOOK_TOKEN,
-            "calendarId": calendar_id,
-            "eventId": course.ext_calendar,
-        }
-
-        response = requests.post(webhook_url, json=payload)
-
-        # service.events().delete(
-        #     calendarId=calendar_id, eventId=course.ext_calendar, sendUpdates="all"
-        # ).execute()
+        # Keep the event if the calendar can't be reached so it doesn't orphan
+        # the calendar invitation. Any other error won't go away by trying
+        # again: the calendar event is already gone, or the call was refused.
+        if course.ext_calendar:
+            try:
+                calendar_hook.call("delete", eventId=course.ext_calendar)
+            except CalendarUnavailableError:
+                abort(503)
+            except CalendarHookError as e:
+                current_app.logger.warning(
+                    "Could not delete calendar event %s: %s",
+                    course.ext_calendar,
+                    e,
+                )
 
         db.session.delete(course)
         db.session.commit()
@@ -465,8 +462,7 @@ class CourseTypesAPI(MethodView):
         Returns:
             List[CourseType]: List of <CourseType> as JSON
         """
-        course_types = CourseType.query.all()
-        return jsonify(CourseTypeSchema(many=True).dump(course_types))
+        return jsonify(CourseTypeSchema(many=True).dump(course_types.all()))
 
     @restricted
     def post(self: None) -> CourseType:
@@ -479,10 +475,7 @@ class CourseTypesAPI(MethodView):
         args = parser.parse(CourseTypeSchema(), location="form")
         course_type = CourseType().create(CourseType, args)
         try:
-            data = [
-                {"value": coursetype.id, "text": coursetype.name}
-                for coursetype in CourseType.query.all()
-            ]
+            data = course_types.options()
             response = make_response(
                 render_template(
                     "shared/form-fields/select.html",
@@ -587,7 +580,6 @@ class CoursePresentersAPI(MethodView):
         if course is None:
             abort(404)
 
-        webhook_url = Config.CALENDAR_HOOK_URL
         user = User.query.get(args["user_ids"])
         if user is not None:
 
@@ -597,15 +589,7 @@ class CoursePresentersAPI(MethodView):
             course.presenters.append(user)
 
             # Add the presenter to the calendar event automatically.
-            raw = {
-                "method": "patch",
-                "token": Config.CALENDAR_HOOK_TOKEN,
-                "userId": user.email,
-                "calendarId": Config.GOOGLE_CALENDAR_ID,
-                "eventId": course.ext_calendar,
-            }
-
-            response = requests.post(webhook_url, json=raw)
+            outbox.enqueue("patch", course.ext_calendar, [user.email])
 
         db.session.commit()
 
@@ -756,7 +740,6 @@ class CourseAttendeesAPI(MethodView):
         """
         from app.static.assets.icons import left_arrow
 
-        webhook_url = Config.CALENDAR_HOOK_URL
         args = parser.parse(
             {"user_ids": fields.List(fields.Int(), required=True)}, location="form"
         )
@@ -785,49 +768,23 @@ class CourseAttendeesAPI(MethodView):
                     course.registrations.append(
                         CourseUserAttended(course_id=course.id, user_id=user.id)
                     )
-                    users_to_register.append(
-                        {"email": user.email, "responseStatus": "needsAction"}
-                    )
-
-        raw = {
-            "method": "patch",
-            "token": Config.CALENDAR_HOOK_TOKEN,
-            "userIds": users_to_register,
-            "calendarId": Config.GOOGLE_CALENDAR_ID,
-            "eventId": course.ext_calendar,
-        }
+                    users_to_register.append(user.email)
 
-        requests.post(webhook_url, json=raw)
+        if users_to_register:
+            outbox.enqueue("patch", course.ext_calendar, users_to_register)
 
         db.session.commit()
 
         # Collect all the necessary info to repaint the course dashboard
         schema = CourseDetailSchema()
 
-        course.available = course.available_size()
+        stats = event_stats(course.id)
+        course.available = course.course_size - stats.registrations
         course.description = html.escape(course.description)
 
-        # Get the last registration activity
-        ordered_regs = course.registrations.order_by(
-            CourseUserAttended.created_at
-        ).all()
-        if ordered_regs:
-            last_reg = course.registrations.order_by(CourseUserAttended.created_at)[
-                -1
-            ].created_at
-            formatted_date = last_reg.strftime("%m/%d/%y, %I:%M %p")
-        else:
-            formatted_date = "-"
-
-        # Add some calculated stats about the event
-        data = [
-            {"label": "Registrations", "value": len(course.registrations.all())},
-            {"label": "Last Registration", "value": formatted_date},
-        ]
-
         content = {
             "event": schema.dump(course),
-            "data": data,
+            "data": stats.summary(),
             "icon": left_arrow,
         }
         response = make_response(
@@ -863,7 +820,6 @@ class CourseAttendeeAPI(MethodView):
 
         course = Course.query.get(course_id)
         user = User.query.get(current_user.id)
-        webhook_url = Config.CALENDAR_HOOK_URL
 
         # Catch errors if the user or course cannot be found.
         if course is None:
@@ -871,51 +827,32 @@ class CourseAttendeeAPI(MethodView):
         elif user is None:
             abort(404, f"No user with id <{current_user.id}>")
 
-        if course.available_size() > 0:
-            course.registrations.append(
-                CourseUserAttended(course_id=course.id, user_id=user.id)
-            )
-
-            # If the accommodation param is not empty, create a new entry for this course
-            # and insert it.
-            if args["acc_required"]:
-                ua = UserAccommodation(
-                    required=args["acc_required"], note=args["acc_details"]
-                )
-                db.session.add(ua)
-                db.session.commit()
-
-                course.accommodations.append(ua)
-
-            # The service account can't add people directly without Domain-Wide Delegation, which is a major
-            # security concern. POSTing to a private webhook will allow the PD account to manupulate
-            # the Calendar directly to add/remove people.
-            raw = {
-                "method": "patch",
-                "token": Config.CALENDAR_HOOK_TOKEN,
-                "userId": current_user.email,
-                "calendarId": Config.GOOGLE_CALENDAR_ID,
-                "eventId": course.ext_calendar,
-            }
+        # The seat is claimed with one conditional INSERT instead of checking the
+        # remaining seats in Python first, which let concurrent requests oversell.
+        if not CourseUserAttended.reserve(course.id, user.id):
+            abort(409)
 
-            response = requests.post(webhook_url, json=raw)
+        # If the accommodation param is not empty, create a new entry for this course
+        # and insert it.
+        if args["acc_required"]:
+            ua = UserAccommodation(
+                required=args["acc_required"], note=args.get("acc_details")
+            )
+            db.session.add(ua)
+            course.accommodations.append(ua)
 
-            db.session.commit()
+        # The service account can't add people directly without Domain-Wide Delegation, which is a major
+        # security concern. POSTing to a private webhook will allow the PD account to manupulate
+        # the Calendar directly to add/remove people. The call is queued with the
+        # registration and delivered by the calendar worker.
+        outbox.enqueue("patch", course.ext_calendar, [user.email])
 
-        else:
-            abort(409)
+        db.session.commit()
 
         course.available = course.available_size()
 
         # Determine the current state for the user
-        if current_user.is_enrolled(course) and current_user.is_attended(course):
-            course.state = "attended"
-            course.icon = attended
-        elif current_user.is_enrolled(course) and not current_user.is_attended(course):
-            course.state = "registered"
-            course.icon = registered
-        else:
-            course.state = "available"
+        set_user_state(course, current_user.registration_states([course.id]))
 
         response = make_response(
             render_template(
@@ -979,7 +916,6 @@ class CourseAttendeeAPI(MethodView):
         """
         course = Course.query.get(course_id)
         user = course.registrations.filter_by(user_id=current_user.id).first()
-        webhook_url = Config.CALENDAR_HOOK_URL
 
         if user is None:
             abort(
@@ -987,28 +923,12 @@ class CourseAttendeeAPI(MethodView):
                 f"No user with id <{current_user.id}> registered for course with id <{course_id}>",
             )
 
-        raw = {
-            "method": "pop",
-            "token": Config.CALENDAR_HOOK_TOKEN,
-            "userId": current_user.email,
-            "calendarId": Config.GOOGLE_CALENDAR_ID,
-            "eventId": course.ext_calendar,
-        }
-
-        response = requests.post(webhook_url, json=raw)
-
         course.registrations.remove(user)
+        outbox.enqueue("pop", course.ext_calendar, [current_user.email])
         db.session.commit()
 
         # Determine the current state for the user
-        if current_user.is_enrolled(course) and current_user.is_attended(course):
-            course.state = "attended"
-            course.icon = attended
-        elif current_user.is_enrolled(course) and not current_user.is_attended(course):
-            course.state = "registered"
-            course.icon = registered
-        else:
-            course.state = "available"
+        set_user_state(course, current_user.registration_states([course.id]))
 
         response = make_response(
             render_template(
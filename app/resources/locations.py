@@ -6,6 +6,7 @@ from webargs import fields, validate
 from webargs.flaskparser import parser
 
 from app.models import Location
+from app.reference import locations
 from app.schemas import LocationCourseSchema, LocationSchema, LocationUserSchema
 from app.wrappers import restricted
 
@@ -23,12 +24,11 @@ class LocationListAPI(MethodView):
         args = parser.parse(
             {"locationType": fields.Str(required=False)}, location="querystring"
         )
+        rows = locations.all()
         if args and args["locationType"] == "physical":
-            locations = Location.query.filter(Location.address != "").all()
-        else:
-            locations = Location.query.all()
+            rows = [row for row in rows if row.address not in (None, "")]
 
-        return jsonify(LocationSchema(many=True).dump(locations))
+        return jsonify(LocationSchema(many=True).dump(rows))
 
     @restricted
     def post(self: None) -> Location:
@@ -42,10 +42,7 @@ class LocationListAPI(MethodView):
         try:
             location = Location().create(Location, args)
 
-            data = [
-                {"value": location.id, "text": location.name}
-                for location in Location.query.all()
-            ]
+            data = locations.options()
             response = make_response(
                 render_template(
                     "shared/form-fields/select.html",
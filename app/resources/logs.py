@@ -0,0 +1,72 @@
+from flask import jsonify
+from flask.views import MethodView
+from sqlalchemy.orm import joinedload
+from webargs import fields, validate
+from webargs.flaskparser import parser
+
+from app.models import Log, User
+from app.pagination import Cursor, keyset
+from app.schemas import LogSchema
+from app.wrappers import admin_only
+
+
+class LogListAPI(MethodView):
+    @admin_only
+    def get(self: None) -> dict:
+        """Page through request logs, newest first.
+
+        Pages are keyed on (occurred, id) instead of an offset, so every page
+        is an index range scan no matter how deep it is.
+
+        Args:
+            course_id (int) optional: requests for one event
+            user_id (int) optional: requests made by one user
+            target_user_id (int) optional: requests made about one user
+            method (str) optional: HTTP method
+            since (int) optional: timestamp, inclusive
+            until (int) optional: timestamp, exclusive
+            limit (int) optional: page size, defaults to 50
+            cursor (str) optional: `next` from the previous page
+
+        Returns:
+            dict: `logs` on this page and the `next` cursor, null on the last page
+        """
+        args = parser.parse(
+            {
+                "course_id": fields.Int(),
+                "user_id": fields.Int(),
+                "target_user_id": fields.Int(),
+                "method": fields.Str(
+                    validate=validate.OneOf(["GET", "POST", "PUT", "DELETE"])
+                ),
+                "since": fields.DateTime("timestamp"),
+                "until": fields.DateTime("timestamp"),
+                "limit": fields.Int(
+                    load_default=50, validate=validate.Range(min=1, max=500)
+                ),
+                "cursor": Cursor(),
+            },
+            location="querystring",
+        )
+
+        query = Log.query.options(joinedload(Log.user).joinedload(User.role))
+
+        for column in ("course_id", "user_id", "target_user_id", "method"):
+            if column in args:
+                query = query.filter(getattr(Log, column) == args[column])
+
+        if "since" in args:
+            query = query.filter(Log.occurred >= args["since"])
+        if "until" in args:
+            query = query.filter(Log.occurred < args["until"])
+
+        page, next_cursor = keyset(
+            query,
+            Log.occurred,
+            Log.id,
+            cursor=args.get("cursor"),
+            descending=True,
+            limit=args["limit"],
+        )
+
+        return jsonify({"logs": LogSchema(many=True).dump(page), "next": next_cursor})
@@ -12,7 +12,8 @@ from app.extensions import db
 
 from app.static.assets.icons import attended, registered
 from app.wrappers import admin_only, admin_or_self
-from app.models import Course, CourseUserAttended, Location, User
+from app.models import Course, CourseUserAttended, User
+from app.reference import locations
 from app.schemas import (
     CourseSchema,
     NewUserLocation,
@@ -36,10 +37,7 @@ class UserAPI(MethodView):
         Returns:
             User: JSON representation of the user.
         """
-        options = [
-            {"value": location.id, "text": location.name}
-            for location in Location.query.all()
-        ]
+        options = locations.options()
         user = User.query.get(user_id)
 
         content = {
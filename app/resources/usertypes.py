@@ -5,6 +5,7 @@ from webargs import fields, validate
 from webargs.flaskparser import parser, use_args, use_kwargs
 
 from app.models import UserType
+from app.reference import user_types
 from app.schemas import UserRoleSchema
 from app.wrappers import admin_only
 
@@ -17,8 +18,7 @@ class UserTypesAPI(MethodView):
         Returns:
             List[UserType]: List of <UserType> as JSON
         """
-        uts = UserType.query.all()
-        return jsonify(UserRoleSchema(many=True).dump(uts))
+        return jsonify(UserRoleSchema(many=True).dump(user_types.all()))
 
     @admin_only
     def post(self: None) -> UserType:
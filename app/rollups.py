@@ -0,0 +1,105 @@
+# Reads and rebuilds of the registration_daily rollup.
+#
+# The rollup itself is written by session hooks in app.models whenever a
+# registration is added or removed. This module turns it into chart series and
+# rebuilds the registration counts from the raw rows for events registered
+# before the table existed.
+import datetime as dt
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models import Course, CourseUserAttended, RegistrationDaily
+
+
+def registration_trend(course_id, first, last):
+    """Registrations per day over a date range, with empty days as 0.
+
+    Args:
+        course_id (int): valid event ID
+        first (date): first day of the series
+        last (date): last day of the series
+
+    Returns:
+        list: [(date, registrations), ...] in date order
+    """
+    rows = (
+        db.session.query(RegistrationDaily.day, RegistrationDaily.registrations)
+        .filter(
+            RegistrationDaily.course_id == course_id,
+            RegistrationDaily.day.between(first, last),
+        )
+        .all()
+    )
+    counts = dict(rows)
+
+    days = (last - first).days + 1
+    return [
+        (day, counts.get(day, 0))
+        for day in (first + dt.timedelta(days=n) for n in range(max(days, 0)))
+    ]
+
+
+def _as_date(value):
+    # DATE() comes back as a 'YYYY-MM-DD' string on SQLite
+    if isinstance(value, str):
+        return dt.date.fromisoformat(value)
+    return value
+
+
+def backfill_registration_daily(batch_size=500):
+    """Recount `registrations` in the rollup from the registration rows.
+
+    Events are walked by id in batches, one commit per batch. Cancellations
+    can't be recovered from the registration rows, so they are kept as-is.
+
+    Returns:
+        int: number of events counted
+    """
+    last_id = 0
+    counted = 0
+
+    while True:
+        ids = [
+            row.id
+            for row in db.session.query(Course.id)
+            .filter(Course.id > last_id)
+            .order_by(Course.id)
+            .limit(batch_size)
+        ]
+        if not ids:
+            return counted
+
+        day = func.date(CourseUserAttended.created_at)
+        totals = {
+            (course_id, _as_date(date)): count
+            for course_id, date, count in db.session.query(
+                CourseUserAttended.course_id, day, func.count()
+            )
+            .filter(CourseUserAttended.course_id.in_(ids))
+            .group_by(CourseUserAttended.course_id, day)
+        }
+
+        existing = {
+            (row.course_id, row.day): row
+            for row in RegistrationDaily.query.filter(
+                RegistrationDaily.course_id.in_(ids)
+            )
+        }
+
+        for key, row in existing.items():
+            row.registrations = totals.pop(key, 0)
+
+        for (course_id, date), count in totals.items():
+            db.session.add(
+                RegistrationDaily(
+                    course_id=course_id,
+                    day=date,
+                    registrations=count,
+                    cancellations=0,
+                )
+            )
+        db.session.commit()
+
+        counted += len(ids)
+        last_id = ids[-1]
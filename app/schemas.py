@@ -183,11 +183,14 @@ class LocationSchema(Schema):
 
 
 class LogSchema(Schema):
+    id = fields.Int()
     occurred = DateTime("timestamp")
     user = fields.Nested("UserSchema", only=("id", "name", "role"))
     endpoint = fields.Str()
     method = fields.Str()
     json_data = fields.Str()
+    course_id = fields.Int()
+    target_user_id = fields.Int()
 
 
 # User Schemas
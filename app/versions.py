@@ -0,0 +1,132 @@
+# Version stamps that keep every worker's caches in step.
+#
+# Each kind of cached data has a named counter in the cache_version table:
+# "catalog" for the upcoming event list, "course:<id>" for one event and
+# "reference:<table>" for a lookup table. A commit that changes the data bumps
+# the counter in the same transaction. Workers read the counters they need
+# once per request, in one query, and throw away anything cached under an
+# older number.
+from flask import g, has_app_context
+from sqlalchemy import event, select
+
+from app.extensions import db
+from app.metrics import metrics
+from app.models import CacheVersion, upsert_counts
+
+table = CacheVersion.__table__
+
+
+class VersionStamps:
+    def __init__(self):
+        # Stamps most requests need, read together on first use
+        self.preloaded = set()
+
+    def init_app(self, app):
+        app.before_request(self.reset)
+
+    def reset(self):
+        # Start each request with no stamps read
+        if has_app_context():
+            g.pop("cache_versions", None)
+
+    def preload(self, *names):
+        self.preloaded.update(names)
+
+    def _known(self):
+        if not has_app_context():
+            return {}
+        if "cache_versions" not in g:
+            g.cache_versions = {}
+        return g.cache_versions
+
+    def get_many(self, names):
+        """Current stamps, reading any not yet seen in this request.
+
+        Args:
+            names (list): stamp names
+
+        Returns:
+            dict: {name: version}. Stamps never bumped are 0.
+        """
+        known = self._known()
+        missing = set(names) - known.keys()
+        if missing:
+            if not self.preloaded <= known.keys():
+                missing |= self.preloaded
+
+            known.update(self.read(missing))
+
+        return {name: known[name] for name in names}
+
+    def get(self, name):
+        return self.get_many([name])[name]
+
+    def read(self, names):
+        """Stamps straight from the table, ignoring this request's copies.
+
+        Returns:
+            dict: {name: version}. Stamps never bumped are 0.
+        """
+        metrics.counter("cache_version.reads").inc()
+        rows = db.session.execute(
+            select(table.c.name, table.c.version).where(table.c.name.in_(names))
+        ).all()
+        found = dict(rows)
+        return {name: found.get(name, 0) for name in names}
+
+    def remember(self, stamps):
+        # Stamps known from cached data, so this request needn't read them
+        known = self._known()
+        for name, version in stamps.items():
+            known.setdefault(name, version)
+
+    def bump(self, session, names):
+        """Add one to each stamp inside the session's transaction."""
+        rows = [{"name": name, "version": 1} for name in sorted(names)]
+        upsert_counts(session, table, ["name"], rows)
+
+    def forget(self, names):
+        # This request's own commit made these stale
+        known = self._known()
+        for name in names:
+            known.pop(name, None)
+
+
+versions = VersionStamps()
+
+
+def stale_names(session):
+    names = set()
+    courses = session.info.get("changed_courses")
+    if courses:
+        names.add("catalog")
+        names.update(f"course:{course_id}" for course_id in courses)
+
+    for model in session.info.get("changed_reference", ()):
+        names.add(f"reference:{model.__tablename__}")
+
+    return names
+
+
+@event.listens_for(db.session, "before_commit")
+def bump_stale_versions(session):
+    # Pending changes are only flushed after this hook, so flush them now to
+    # see everything the commit will write.
+    session.flush()
+
+    names = stale_names(session)
+    if names:
+        versions.bump(session, names)
+        session.info["bumped_versions"] = names
+
+
+@event.listens_for(db.session, "after_commit")
+def forget_bumped_versions(session):
+    names = session.info.pop("bumped_versions", None)
+    if names:
+        versions.forget(names)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_version_bumps(session, previous_transaction):
+    session.info.pop("bumped_versions", None)
@@ -0,0 +1,297 @@
+# Query plans and timings for the hot-path indexes.
+#
+# Builds a synthetic dataset (5k events, 500k registrations by default), runs
+# the queries behind the catalog, the extension feed, the admin lists and the
+# registration pages with the hot-path indexes dropped, then again with them
+# in place, and prints the plan and median time of each.
+#
+#   python -m benchmarks.hot_path_indexes --courses 5000 --registrations 500000
+#
+# Pass --database-uri to run against a MySQL copy instead of a temporary SQLite
+# file. The tables are dropped and recreated, so never point it at real data.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from app import create_app
+from app.extensions import db
+from app.models import Course, CourseUserAttended, Location, User, UserType
+from config import Config
+
+# Indexes added by the d7e3f1a2b9c8 migration
+HOT_PATH_INDEXES = {
+    "ix_course_active_starts",
+    "ix_course_active_ends",
+    "ix_course_student_allowed_active_ends",
+    "ix_course_starts",
+    "ix_course_user_attended_user_id_created_at",
+    "ix_course_user_attended_course_id_created_at",
+    "ix_user_usertype_id",
+}
+
+# On MySQL these back the foreign key on their first column, in place of the
+# plain index the key was created with
+FOREIGN_KEY_INDEXES = {
+    "ix_course_user_attended_user_id_created_at": "user_id",
+    "ix_user_usertype_id": "usertype_id",
+}
+
+
+def hot_path_indexes():
+    tables = [Course.__table__, CourseUserAttended.__table__, User.__table__]
+    return [
+        index
+        for table in tables
+        for index in table.indexes
+        if index.name in HOT_PATH_INDEXES
+    ]
+
+
+def foreign_key_indexes(indexes, action):
+    """Create or drop the plain indexes the foreign keys had before.
+
+    MySQL won't drop an index that backs a foreign key (error 1553), so these
+    stand in while the hot-path indexes are gone. SQLite doesn't index foreign
+    keys by itself, so there is nothing to stand in for.
+
+    Args:
+        indexes (list): hot-path indexes about to be dropped or just recreated
+        action (str): "create" or "drop"
+    """
+    if db.engine.dialect.name != "mysql":
+        return
+
+    for index in indexes:
+        column = FOREIGN_KEY_INDEXES.get(index.name)
+        if column is None:
+            continue
+        if action == "create":
+            statement = f"CREATE INDEX `{column}` ON `{index.table.name}` (`{column}`)"
+        else:
+            statement = f"DROP INDEX `{column}` ON `{index.table.name}`"
+        db.session.execute(text(statement))
+
+
+def seed(courses, registrations, users, rng):
+    now = datetime.now()
+
+    db.session.add_all(
+        [
+            UserType(name=name)
+            for name in ("SuperAdmin", "Presenter", "Observer", "User")
+        ]
+    )
+    db.session.add(Location(name="Benchmark"))
+    db.session.commit()
+
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "name": f"User {i}",
+                "email": f"user{i}@example.com",
+                "location_id": 1,
+                # A handful of admins and presenters among regular users
+                "usertype_id": 1 if i < 5 else 2 if i < 200 else 4,
+                "is_student": i % 10 == 0,
+            }
+            for i in range(users)
+        ],
+    )
+
+    # Two years of history and a semester of upcoming events
+    rows = []
+    for i in range(courses):
+        starts = now + timedelta(days=rng.uniform(-730, 120))
+        rows.append(
+            {
+                "title": f"Event {i}",
+                "course_size": 200,
+                "starts": starts,
+                "ends": starts + timedelta(hours=1),
+                "created_at": starts - timedelta(days=30),
+                "active": rng.random() > 0.05,
+                "student_allowed": rng.random() < 0.2,
+                "location_id": 1,
+            }
+        )
+    db.session.execute(insert(Course), rows)
+    db.session.commit()
+
+    pairs = set()
+    while len(pairs) < registrations:
+        pairs.add((rng.randint(1, courses), rng.randint(1, users)))
+
+    batch = []
+    for course_id, user_id in pairs:
+        batch.append(
+            {
+                "course_id": course_id,
+                "user_id": user_id,
+                "attended": rng.random() < 0.6,
+                "created_at": now - timedelta(days=rng.uniform(0, 730)),
+            }
+        )
+        if len(batch) == 50000:
+            db.session.execute(insert(CourseUserAttended), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(CourseUserAttended), batch)
+    db.session.commit()
+
+
+def hot_queries(busy_course, busy_user):
+    now = datetime.now()
+    today = now.date()
+
+    return {
+        "catalog (active, ends >= now)": select(Course.id).where(
+            Course.active == True, Course.ends >= now
+        ),
+        "student catalog": select(Course.id).where(
+            Course.student_allowed == True, Course.active == True, Course.ends >= now
+        ),
+        "extension feed (next 5)": select(Course.id)
+        .where(Course.active == True, Course.starts >= now)
+        .order_by(Course.starts)
+        .limit(5),
+        "admin upcoming": select(Course.id)
+        .where(Course.starts > today)
+        .order_by(Course.starts),
+        "user registrations": select(CourseUserAttended.course_id)
+        .where(CourseUserAttended.user_id == busy_user)
+        .order_by(CourseUserAttended.created_at.desc()),
+        "roster in signup order": select(CourseUserAttended.user_id)
+        .where(CourseUserAttended.course_id == busy_course)
+        .order_by(CourseUserAttended.created_at),
+        "registrations per day": select(
+            func.date(CourseUserAttended.created_at), func.count()
+        )
+        .where(CourseUserAttended.course_id == busy_course)
+        .group_by(func.date(CourseUserAttended.created_at)),
+        "presenters": select(User.id).where(User.usertype_id == 2),
+    }
+
+
+def explain(statement):
+    compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if db.engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.session.execute(text(prefix + str(compiled))).all()
+
+    if db.engine.dialect.name == "sqlite":
+        return "; ".join(row[-1] for row in rows)
+    return "; ".join(
+        f"{row._mapping.get('table')}:{row._mapping.get('type')}"
+        f"/{row._mapping.get('key')}"
+        for row in rows
+    )
+
+
+def measure(statement, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def analyze():
+    # Refresh planner statistics and start the timings on a fresh transaction
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(text("ANALYZE"))
+    else:
+        for table in ("course", "course_user_attended", "user"):
+            db.session.execute(text(f"ANALYZE TABLE `{table}`"))
+    db.session.commit()
+
+
+def run(queries, repeat):
+    return {name: (explain(q), measure(q, repeat)) for name, q in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare hot-path query plans with and without the new indexes."
+    )
+    parser.add_argument("--courses", type=int, default=5000)
+    parser.add_argument("--registrations", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-uri", help="defaults to a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.registrations > args.courses * args.users:
+        parser.error("more registrations than course/user pairs")
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = args.database_uri or "sqlite:///" + os.path.join(
+                tmp, "indexes.db"
+            )
+            SENTRY_DSN = None
+
+        app = create_app(BenchmarkConfig)
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+            started = time.perf_counter()
+            seed(args.courses, args.registrations, args.users, random.Random(args.seed))
+            print(
+                f"Seeded {args.courses} events and {args.registrations} registrations "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+            busy_course = db.session.execute(
+                select(CourseUserAttended.course_id)
+                .group_by(CourseUserAttended.course_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            ).scalar()
+            busy_user = db.session.execute(
+                select(CourseUserAttended.user_id)
+                .group_by(CourseUserAttended.user_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            ).scalar()
+            queries = hot_queries(busy_course, busy_user)
+
+            indexes = hot_path_indexes()
+            foreign_key_indexes(indexes, "create")
+            for index in indexes:
+                index.drop(db.session.connection())
+            analyze()
+            before = run(queries, args.repeat)
+
+            for index in indexes:
+                index.create(db.session.connection())
+            foreign_key_indexes(indexes, "drop")
+            analyze()
+            after = run(queries, args.repeat)
+
+            print(f"\n{'query':<32}{'before':>10}{'after':>10}  (median ms)")
+            for name in queries:
+                print(f"{name:<32}{before[name][1]:>10.2f}{after[name][1]:>10.2f}")
+
+            print("\nPlans")
+            for name in queries:
+                print(
+                    f"\n{name}\n  before: {before[name][0]}\n  after:  {after[name][0]}"
+                )
+
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
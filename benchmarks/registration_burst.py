@@ -0,0 +1,334 @@
+# Registration-opening burst against a local copy of the app.
+#
+# Seeds a throwaway database, starts the webhook stand-in and serves the app
+# with werkzeug, then lets a crowd of users do what they do when registration
+# opens: load the catalog, register for an event and check their
+# registrations. Afterwards the calendar outbox is drained against the
+# stand-in and the seat accounting is checked end to end.
+#
+#   python -m benchmarks.registration_burst --users 300 --courses 5 --seats 40 \
+#       --concurrency 50 --hook-latency 0.3 --hook-error-rate 0.05
+#
+# Pass --database-uri to run against MySQL instead of a temporary SQLite file.
+# The script exits non-zero if any seat was oversold or the calendar doesn't
+# match the database.
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Thread
+
+import requests
+from flask_login import login_user
+from sqlalchemy import func
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app
+from app.calendar import calendar_hook
+from app.extensions import db
+from app.models import (
+    Course,
+    CourseType,
+    CourseUserAttended,
+    Location,
+    User,
+    UserType,
+)
+from app.outbox import CalendarWorker, outbox_stats
+from benchmarks.webhook_server import FakeCalendar, WebhookServer
+from config import Config
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_config(database_uri, hook_url, token):
+    class BurstConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        CALENDAR_HOOK_URL = hook_url
+        CALENDAR_HOOK_TOKEN = token
+        GOOGLE_CALENDAR_ID = "burst-calendar"
+        CACHE_TYPE = "SimpleCache"
+        SENTRY_DSN = None
+        # Deliver everything in one go once the burst is over
+        CALENDAR_OUTBOX_BASE_DELAY = 0
+        CALENDAR_COALESCE_WINDOW = 0
+        CALENDAR_HOOK_RESET_TIMEOUT = 1
+
+    return BurstConfig
+
+
+def seed(app, users, courses, seats):
+    """Create the users and events, with real calendar events on the stand-in."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        location = Location(name="Burst Hall")
+        coursetype = CourseType(name="In Person")
+        usertype = UserType(name="User")
+        db.session.add_all([location, coursetype, usertype])
+        db.session.flush()
+
+        starts = datetime.now() + timedelta(days=7)
+        for i in range(courses):
+            event = calendar_hook.call(
+                "post", userId="presenter@example.com", body={"summary": f"Event {i}"}
+            )
+            db.session.add(
+                Course(
+                    title=f"Event {i}",
+                    description="Registration burst",
+                    course_size=seats,
+                    starts=starts + timedelta(hours=i),
+                    ends=starts + timedelta(hours=i + 1),
+                    location_id=location.id,
+                    coursetype_id=coursetype.id,
+                    ext_calendar=event["id"],
+                    active=True,
+                )
+            )
+
+        db.session.add_all(
+            [
+                User(
+                    name=f"Burst User {i}",
+                    email=f"burst{i}@example.com",
+                    location_id=location.id,
+                    usertype_id=usertype.id,
+                    is_student=False,
+                )
+                for i in range(users)
+            ]
+        )
+        db.session.commit()
+
+        return [course.id for course in Course.query.order_by(Course.id)], [
+            user.id for user in User.query.order_by(User.id)
+        ]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def add_login_route(app):
+    # The app only signs in through Google. Burst users log in by ID instead.
+    @app.route("/burst_login/<int:user_id>")
+    def burst_login(user_id):
+        login_user(User.query.get(user_id))
+        return "", 204
+
+
+def user_session(base_url, user_id, course_id, timings):
+    """One user's trip through the registration flow."""
+    session = requests.Session()
+    session.get(f"{base_url}/burst_login/{user_id}")
+
+    steps = [
+        ("GET /courses", "get", "/courses", None),
+        (
+            "POST /courses/<id>/register",
+            "post",
+            f"/courses/{course_id}/register",
+            {"acc_required": "false", "acc_details": ""},
+        ),
+        (
+            "GET /users/<id>/registrations",
+            "get",
+            f"/users/{user_id}/registrations",
+            None,
+        ),
+    ]
+
+    results = {}
+    for name, method, path, data in steps:
+        started = time.perf_counter()
+        response = session.request(method, base_url + path, data=data)
+        timings[name].append((time.perf_counter() - started) * 1000)
+        results[name] = response.status_code
+
+    return course_id, results["POST /courses/<id>/register"]
+
+
+def drain_outbox(app, timeout=60):
+    """Deliver queued calendar changes until the outbox is empty."""
+    worker = CalendarWorker.from_config(app.config)
+    deadline = time.monotonic() + timeout
+
+    with app.app_context():
+        while outbox_stats()["pending"] and time.monotonic() < deadline:
+            if not worker.drain():
+                time.sleep(0.2)
+        return outbox_stats()
+
+
+def check_seats(app, fake, registered):
+    """Compare the database against the responses and the calendar.
+
+    Returns:
+        list: problems found, empty when the books balance
+    """
+    problems = []
+
+    with app.app_context():
+        counts = Course.registration_counts(list(registered))
+        for course in Course.query.all():
+            count = counts.get(course.id, 0)
+            if count > course.course_size:
+                problems.append(
+                    f"Course {course.id} oversold: {count} of {course.course_size}"
+                )
+            if count != registered[course.id]:
+                problems.append(
+                    f"Course {course.id} has {count} registrations but "
+                    f"{registered[course.id]} requests succeeded"
+                )
+
+            emails = {
+                email
+                for (email,) in db.session.query(User.email)
+                .join(CourseUserAttended)
+                .filter(CourseUserAttended.course_id == course.id)
+            }
+            invited = fake.attendees(course.ext_calendar)
+            if len(invited) != len(set(invited)):
+                problems.append(f"Course {course.id} has duplicate calendar invites")
+            if set(invited) != emails:
+                problems.append(
+                    f"Course {course.id} calendar has {len(set(invited))} attendees, "
+                    f"database has {len(emails)}"
+                )
+
+        duplicates = (
+            db.session.query(CourseUserAttended.course_id)
+            .group_by(CourseUserAttended.course_id, CourseUserAttended.user_id)
+            .having(func.count() > 1)
+            .count()
+        )
+        if duplicates:
+            problems.append(f"{duplicates} duplicate registrations")
+
+    return problems
+
+
+def report(timings, elapsed, outcomes, stats, fake, problems):
+    total = sum(len(values) for values in timings.values())
+
+    print(f"\n{total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s)\n")
+    print(f"{'endpoint':<34}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for name, values in timings.items():
+        print(
+            f"{name:<34}{len(values):>7}"
+            f"{percentile(values, 50):>9.1f}"
+            f"{percentile(values, 95):>9.1f}"
+            f"{percentile(values, 99):>9.1f}"
+        )
+
+    print("\nRegistration responses:")
+    for status, count in sorted(outcomes.items()):
+        print(f"  {status}: {count}")
+
+    print(
+        f"\nCalendar: {sum(fake.calls.values())} webhook calls "
+        f"({dict(fake.calls)}), {sum(fake.errors.values())} injected errors"
+    )
+    print(
+        f"Outbox: {stats['delivered']} delivered in {stats['calls']} calls, "
+        f"{stats['pending']} pending, {stats['dead']} dead"
+    )
+
+    if problems:
+        print("\nSeat accounting FAILED:")
+        for problem in problems:
+            print(f"  - {problem}")
+    else:
+        print("\nSeat accounting OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate a registration-opening burst against a local app."
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--seats", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hook-latency", type=float, default=0.2)
+    parser.add_argument("--hook-jitter", type=float, default=0.1)
+    parser.add_argument("--hook-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-uri", help="defaults to a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    token = "burst-token"
+    fake = FakeCalendar(
+        token,
+        latency=args.hook_latency,
+        jitter=args.hook_jitter,
+        error_rate=args.hook_error_rate,
+        seed=args.seed,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp, WebhookServer(fake) as hook:
+        database_uri = args.database_uri or "sqlite:///" + os.path.join(tmp, "burst.db")
+        app = create_app(make_config(database_uri, hook.url, token))
+        add_login_route(app)
+
+        # Seeding creates the calendar events, so don't fail them on purpose.
+        error_rate, fake.error_rate = fake.error_rate, 0
+        course_ids, user_ids = seed(app, args.users, args.courses, args.seats)
+        fake.error_rate = error_rate
+
+        server = make_server(
+            "127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler
+        )
+        Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        timings = defaultdict(list)
+        outcomes = defaultdict(int)
+        registered = dict.fromkeys(course_ids, 0)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(
+                    user_session, base_url, user_id, rng.choice(course_ids), timings
+                )
+                for user_id in user_ids
+            ]
+            for future in futures:
+                course_id, status = future.result()
+                outcomes[status] += 1
+                if status == 200:
+                    registered[course_id] += 1
+        elapsed = time.perf_counter() - started
+
+        server.shutdown()
+
+        stats = drain_outbox(app)
+        problems = check_seats(app, fake, registered)
+        report(timings, elapsed, outcomes, stats, fake, problems)
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# Local stand-in for the Google Apps Script calendar webhook.
+#
+# Speaks the same JSON contract as webhook.js (`post`, `put`, `delete`, `patch`
+# and `pop`, with token checking) against an in-memory calendar, so the app can
+# be developed and load tested without touching Google. Latency and error rates
+# can be injected to see how the app behaves when Apps Script is slow or flaky.
+#
+#   python -m benchmarks.webhook_server --port 8089 --token secret --latency 0.4
+#
+# Then point CALENDAR_HOOK_URL at http://localhost:8089/ and CALENDAR_HOOK_TOKEN
+# at the same token.
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from uuid import uuid4
+
+
+class FakeCalendar:
+    """In-memory calendar implementing the webhook.js methods.
+
+    Args:
+        token (str): access key requests must send
+        latency (float): seconds added to every call
+        jitter (float): extra random delay of up to this many seconds
+        error_rate (float): fraction of calls that fail the way Apps Script
+            does, with a 200 response and `statusCode: 500` in the body
+        seed (int) optional: seed for repeatable jitter and failures
+    """
+
+    def __init__(self, token, latency=0, jitter=0, error_rate=0, seed=None):
+        self.token = token
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.events = {}
+        self.calls = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def attendees(self, event_id):
+        """Emails invited to an event."""
+        with self._lock:
+            event = self.events.get(event_id, {})
+            return [user["email"] for user in event.get("attendees", [])]
+
+    def handle(self, params):
+        """Run one webhook request.
+
+        Returns:
+            dict: the response body, or None when webhook.js returns nothing
+        """
+        method = params.get("method")
+
+        with self._lock:
+            self.calls[method] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+
+        if delay:
+            time.sleep(delay)
+
+        if params.get("token") != self.token:
+            return {
+                "status": "Forbidden",
+                "message": "You do not have access to this resource.",
+                "statusCode": 403,
+            }
+
+        if fail:
+            with self._lock:
+                self.errors[method] += 1
+            return {
+                "status": "Error",
+                "messages": "Injected failure",
+                "statusCode": 500,
+            }
+
+        handler = getattr(self, f"do_{method}", None)
+        if handler is None:
+            # doPost falls through and returns an undefined result
+            return None
+
+        with self._lock:
+            return handler(params)
+
+    def do_post(self, params):
+        body = dict(params.get("body") or {})
+        event_id = uuid4().hex
+        event = dict(body, id=event_id, attendees=list(body.get("attendees", [])))
+
+        if "conferenceData" in body:
+            code = uuid4().hex[:10]
+            event["conferenceData"] = {
+                "conferenceId": code,
+                "entryPoints": [
+                    {
+                        "entryPointType": "video",
+                        "uri": f"https://meet.google.com/{code}",
+                    }
+                ],
+            }
+
+        self.events[event_id] = event
+        return event
+
+    def do_put(self, params):
+        event = self._get(params)
+        if event is None:
+            return self._not_found()
+
+        event.update(params.get("body") or {})
+        return event
+
+    def do_delete(self, params):
+        self.events.pop(params.get("eventId"), None)
+        return None
+
+    def do_patch(self, params):
+        event = self._get(params)
+        if event is None:
+            return self._not_found()
+
+        # Like webhook.js, anyone already invited is skipped
+        invited = {user["email"] for user in event["attendees"]}
+        event["attendees"] = event["attendees"] + [
+            user for user in params.get("userIds") or [] if user["email"] not in invited
+        ]
+        return self._updated()
+
+    def do_pop(self, params):
+        event = self._get(params)
+        if event is None:
+            return self._not_found()
+
+        emails = [user["email"] for user in params.get("userIds") or []]
+        event["attendees"] = [
+            user for user in event["attendees"] if user["email"] not in emails
+        ]
+        return self._updated()
+
+    def _get(self, params):
+        return self.events.get(params.get("eventId"))
+
+    def _updated(self):
+        return {
+            "status": "OK",
+            "statusCode": 200,
+            "message": "The event was updated successfully.",
+        }
+
+    def _not_found(self):
+        return {"status": "Error", "messages": "Not Found", "statusCode": 404}
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Request body must be JSON")
+            return
+
+        result = self.server.calendar.handle(params)
+        # ContentService.createTextOutput(JSON.stringify(undefined)) is empty
+        data = b"" if result is None else json.dumps(result).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class WebhookServer:
+    """Run a FakeCalendar over HTTP in a background thread.
+
+    Args:
+        calendar (FakeCalendar): calendar to serve
+        host (str): interface to bind
+        port (int): port to bind. 0 picks a free one.
+        verbose (bool): log every request
+    """
+
+    def __init__(self, calendar, host="127.0.0.1", port=0, verbose=False):
+        self.calendar = calendar
+        self.httpd = ThreadingHTTPServer((host, port), WebhookHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.calendar = calendar
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a local stand-in for the calendar webhook."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--token", default="token")
+    parser.add_argument("--latency", type=float, default=0, help="seconds per call")
+    parser.add_argument("--jitter", type=float, default=0, help="extra random delay")
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of calls that fail"
+    )
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    calendar = FakeCalendar(
+        args.token,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server = WebhookServer(calendar, args.host, args.port, verbose=True)
+    print(f"Calendar webhook stand-in listening on {server.url}")
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
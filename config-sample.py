@@ -13,6 +13,62 @@ class Config(object):
     CALENDAR_HOOK_TOKEN = os.environ.get("CALENDAR_HOOK_TOKEN")
     CALENDAR_HOOK_URL = os.environ.get("CALENDAR_HOOK_URL")
 
+    # Shared webhook client. Connections are pooled per worker process and the
+    # circuit opens after this many consecutive failures.
+    CALENDAR_HOOK_POOL_SIZE = 10
+    CALENDAR_HOOK_FAILURE_THRESHOLD = 5
+    CALENDAR_HOOK_RESET_TIMEOUT = 30
+    # Override (connect, read) timeouts in seconds per webhook method
+    # CALENDAR_HOOK_TIMEOUTS = {"post": (3.05, 30)}
+
+    # Delivery settings for `flask calendar-worker`
+    CALENDAR_OUTBOX_BATCH_SIZE = 50
+    CALENDAR_OUTBOX_MAX_ATTEMPTS = 8
+    CALENDAR_OUTBOX_BASE_DELAY = 5
+    CALENDAR_OUTBOX_MAX_DELAY = 3600
+    # Hold changes for the same event this many seconds and merge them into one call
+    CALENDAR_COALESCE_WINDOW = 2
+    CALENDAR_COALESCE_MAX_USERS = 50
+
+    # Request logs are queued in memory and inserted in batches
+    AUDIT_LOG_QUEUE_SIZE = 10000
+    AUDIT_LOG_BATCH_SIZE = 200
+    AUDIT_LOG_FLUSH_INTERVAL = 500  # ms
+    # "drop" discards new rows when the queue is full, "block" waits up to
+    # AUDIT_LOG_BLOCK_TIMEOUT ms for room first
+    AUDIT_LOG_WHEN_FULL = "drop"
+    AUDIT_LOG_BLOCK_TIMEOUT = 50
+    # Where `flask archive-logs` writes old request logs
+    LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", "log-archive")
+
+    # Events per page of the catalog; the next page loads on scroll
+    CATALOG_PAGE_SIZE = 24
+    # Past events per page of the admin event list
+    ADMIN_PAGE_SIZE = 50
+    # Matches sent back by the user search in the admin sidebars
+    USER_SEARCH_LIMIT = 20
+    # Each worker keeps its own copy of the upcoming catalog. Workers learn
+    # about each other's changes through the cache, so run more than one
+    # worker with a shared backend like "RedisCache", not "SimpleCache".
+    CACHE_TYPE = "SimpleCache"
+    # Upcoming-event lists are cached until the next event starts or ends,
+    # but never longer than this many seconds
+    UPCOMING_CACHE_MAX_TIMEOUT = 86400
+    # Seconds before the extension's /resource-query feed is rebuilt in the
+    # background, and how long the last good one may be served if the blog
+    # or YouTube can't be reached
+    RESOURCE_FEED_TIMEOUT = 3600
+    RESOURCE_FEED_MAX_STALE = 86400
+    # (connect, read) timeouts in seconds for the blog and YouTube lookups
+    RESOURCE_FETCH_TIMEOUT = (3.05, 10)
+    # Rendered event cards are kept this many seconds in the CACHE_TYPE backend
+    EVENT_CARD_CACHE_TIMEOUT = 3600
+    # Registration totals on the admin event dashboard, in the same backend
+    EVENT_STATS_CACHE_TIMEOUT = 3600
+    # Serialized events for the admin views. Entries are keyed on the event's
+    # version stamp, so this only bounds ones nobody reads any more.
+    EVENT_CACHE_TIMEOUT = 86400
+
     OAUTH_CREDENTIALS = {
         'google': {
             'key': os.environ.get("GOOGLE_CLIENT_ID"),
@@ -1,7 +1,9 @@
+import datetime
+
 from app.extensions import db
 from app.models import Course, User
 from tests.loader import Loader
-from tests.utils import captured_templates, TestBase
+from tests.utils import captured_queries, captured_templates, TestBase
 
 
 class TestAdminBlueprint(TestBase):
@@ -165,15 +167,9 @@ class TestAdminBlueprint(TestBase):
             self.assertEqual(resp.status_code, 200)
             self.assertTrue("admin/forms/edit-presenters.html" in names)
 
-            # Make sure the select option is actually returned
-            self.assertTrue("shared/form-fields/select.html" in names)
-
-            # Get the context to make sure users are listed
-            for template in templates:
-                if template["template_name"] == "shared/form-fields/select.html":
-                    context = template["context"]
-
-            self.assertEqual(len(context["options"]), 1)
+            # Presenters are searched for rather than listed
+            self.assertTrue("shared/form-fields/search.html" in names)
+            self.assertIn(b'hx-get="/users/search?usertype_id=2"', resp.data)
 
     # Test that links are loaded in the sidebar context
     def test_edit_links(self):
@@ -197,6 +193,8 @@ class TestAdminBlueprint(TestBase):
 
             self.assertEqual(resp.status_code, 200)
             self.assertTrue("admin/forms/edit-users.html" in names)
+            self.assertIn(b'hx-get="/users/search?field=checkbox"', resp.data)
+            self.assertNotIn(b"user@example.com", resp.data)
 
     # Test that the confirmation dialog is returned before deleting
     def test_delete_event(self):
@@ -208,3 +206,88 @@ class TestAdminBlueprint(TestBase):
 
             self.assertEqual(resp.status_code, 200)
             self.assertTrue("admin/forms/delete-event.html" in names)
+
+
+class TestAdminEventList(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_registrations.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        # Course 2 is the most recent past event
+        now = datetime.datetime.now()
+        for course in Course.query.all():
+            course.starts = now - datetime.timedelta(days=10 - course.id)
+        db.session.commit()
+
+        self.app.config["ADMIN_PAGE_SIZE"] = 1
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def past_page(self, url):
+        with captured_templates(self.app) as templates:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return templates[0]["context"]
+
+    def test_index_defers_past_events(self):
+        self.login("Admin")
+        resp = self.client.get("/admin/events")
+
+        self.assertIn(b'hx-get="/admin/events/past"', resp.data)
+        self.assertNotIn(b"Course 1", resp.data)
+
+    def test_past_events_paged_newest_first(self):
+        self.login("Admin")
+
+        first = self.past_page("/admin/events/past")
+        self.assertEqual([event["id"] for event in first["past"]], [2])
+        self.assertEqual(first["past"][0]["reg_length"], 1)
+        self.assertTrue(first["first_page"])
+
+        url = "/admin/events/past?cursor={}".format(first["next_cursor"])
+        second = self.past_page(url)
+        self.assertEqual([event["id"] for event in second["past"]], [1])
+        self.assertEqual(second["past"][0]["reg_length"], 2)
+        self.assertFalse(second["first_page"])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_presenter_sees_own_events(self):
+        self.login("Presenter")
+        course = Course.query.get(1)
+        course.presenters.append(User.query.get(2))
+        db.session.commit()
+
+        page = self.past_page("/admin/events/past")
+        self.assertEqual([event["id"] for event in page["past"]], [1])
+        self.assertEqual(page["past"][0]["reg_length"], 2)
+
+    def test_bad_cursor(self):
+        self.login("Admin")
+        resp = self.client.get("/admin/events/past?cursor=nope")
+        self.assertEqual(resp.status_code, 422)
+
+    def test_one_query_per_page(self):
+        self.login("Admin")
+        self.client.get("/admin/events/past")
+
+        with captured_queries("FROM course") as statements:
+            self.client.get("/admin/events/past")
+
+        self.assertEqual(len(statements), 1)
+        self.assertIn("LEFT OUTER JOIN course_user_attended", statements[0])
@@ -0,0 +1,124 @@
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from app.archive import archive_logs, load_manifest, parse_age, read_archive
+from app.extensions import db
+from app.models import Log
+
+from tests.loader import Loader
+from tests.utils import TestBase
+
+
+class TestLogArchive(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+        loader = Loader(self.app, db, ["roles.json", "users.json"])
+        loader.load()
+
+        self.directory = tempfile.mkdtemp()
+
+        now = datetime.datetime.utcnow()
+        old = now - datetime.timedelta(days=120)
+        for i in range(25):
+            db.session.add(
+                Log(
+                    user_id=1 + i % 2,
+                    endpoint=f"/courses/{i}",
+                    method="POST" if i % 5 == 0 else "GET",
+                    occurred=old + datetime.timedelta(minutes=i),
+                    course_id=i,
+                )
+            )
+        for i in range(3):
+            db.session.add(Log(user_id=1, endpoint="/courses", method="GET"))
+        db.session.commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        db.drop_all()
+        db.session.close()
+
+    def test_parse_age(self):
+        self.assertEqual(parse_age("90d"), datetime.timedelta(days=90))
+        self.assertEqual(parse_age("2w"), datetime.timedelta(weeks=2))
+        with self.assertRaises(ValueError):
+            parse_age("90")
+
+    def test_archives_old_rows_in_chunks(self):
+        totals = archive_logs(
+            self.directory,
+            datetime.timedelta(days=90),
+            chunk_size=10,
+            delete_batch=3,
+        )
+
+        self.assertEqual(totals, {"rows": 25, "files": 3})
+        # Only the recent rows are left
+        self.assertEqual(Log.query.count(), 3)
+
+        manifest = load_manifest(self.directory)
+        self.assertEqual([entry["rows"] for entry in manifest["files"]], [10, 10, 5])
+        self.assertTrue(all(entry["deleted"] for entry in manifest["files"]))
+
+        first = manifest["files"][0]
+        with gzip.open(os.path.join(self.directory, first["file"]), "rt") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[0]["id"], first["first_id"])
+        self.assertEqual(records[0]["endpoint"], "/courses/0")
+
+    def test_keep_then_resume(self):
+        archive_logs(self.directory, datetime.timedelta(days=90), delete=False)
+        self.assertEqual(Log.query.count(), 28)
+
+        # A second run deletes what was archived without writing it again
+        totals = archive_logs(self.directory, datetime.timedelta(days=90))
+        self.assertEqual(totals["files"], 0)
+        self.assertEqual(Log.query.count(), 3)
+        self.assertEqual(len(load_manifest(self.directory)["files"]), 1)
+
+    def test_old_row_below_watermark_archived(self):
+        now = datetime.datetime.utcnow()
+        # Logged two months ago but flushed after a newer row
+        late = Log.query.order_by(Log.id).all()[-1]
+        late.occurred = now - datetime.timedelta(days=60)
+        db.session.add(
+            Log(
+                user_id=1,
+                endpoint="/courses/late",
+                method="GET",
+                occurred=now - datetime.timedelta(days=100),
+            )
+        )
+        db.session.commit()
+        late_id = late.id
+
+        totals = archive_logs(self.directory, datetime.timedelta(days=90))
+        self.assertEqual(totals["rows"], 26)
+
+        # The earlier row is older than the new cutoff even though its id is
+        # below the last archived one
+        totals = archive_logs(self.directory, datetime.timedelta(days=30))
+        self.assertEqual(totals["rows"], 1)
+        self.assertIsNone(db.session.get(Log, late_id))
+        self.assertEqual(Log.query.count(), 2)
+
+    def test_read_archive_filters(self):
+        archive_logs(self.directory, datetime.timedelta(days=90), chunk_size=7)
+
+        posts = list(read_archive(self.directory, method="POST"))
+        self.assertEqual(len(posts), 5)
+
+        self.assertEqual(len(list(read_archive(self.directory, user_id=2))), 12)
+
+        matches = list(read_archive(self.directory, pattern=r'"/courses/1\d"'))
+        self.assertEqual(len(matches), 10)
+
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        self.assertEqual(list(read_archive(self.directory, since=since)), [])
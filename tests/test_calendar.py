@@ -0,0 +1,199 @@
+import unittest
+
+from unittest.mock import Mock, patch
+
+import requests
+
+from app.calendar import (
+    CalendarHookClient,
+    CalendarHookError,
+    CalendarUnavailableError,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from app.metrics import Histogram, metrics
+from benchmarks.webhook_server import FakeCalendar, WebhookServer
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+        for _ in range(5):
+            breaker.record_failure()
+
+        # Pretend the timeout passed
+        breaker.opened_at -= 60
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+
+class TestCalendarHookClient(unittest.TestCase):
+    def setUp(self):
+        self.client = CalendarHookClient(
+            url="http://hook.test/exec",
+            token="token",
+            calendar_id="calendar",
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+
+    def response(self, body):
+        return Mock(status_code=200, text="{}", json=lambda: body)
+
+    def test_call_sends_payload_with_method_timeout(self):
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.return_value = self.response({"id": "abc"})
+            result = self.client.call("delete", eventId="abc")
+
+        self.assertEqual(result, {"id": "abc"})
+        kwargs = mock_post.call_args.kwargs
+        self.assertEqual(kwargs["json"]["token"], "token")
+        self.assertEqual(kwargs["json"]["calendarId"], "calendar")
+        self.assertEqual(kwargs["json"]["eventId"], "abc")
+        self.assertEqual(kwargs["timeout"], CalendarHookClient.TIMEOUTS["delete"])
+
+    def test_empty_response(self):
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.return_value = Mock(status_code=200, text="")
+            self.assertEqual(self.client.call("delete", eventId="abc"), {})
+
+    def test_error_in_body_raises(self):
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.return_value = self.response(
+                {"status": "Error", "statusCode": 500, "message": "Quota"}
+            )
+            with self.assertRaisesRegex(CalendarHookError, "Quota"):
+                self.client.call("put", eventId="abc")
+
+    def test_unreachable_hook_is_unavailable(self):
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.side_effect = requests.Timeout("read timed out")
+            with self.assertRaises(CalendarUnavailableError):
+                self.client.call("delete", eventId="abc")
+
+            # A broken or refused answer is an error, but not an outage
+            mock_post.side_effect = None
+            mock_post.return_value = self.response({"statusCode": 403})
+            with self.assertRaises(CalendarHookError) as raised:
+                self.client.call("delete", eventId="abc")
+            self.assertNotIsInstance(raised.exception, CalendarUnavailableError)
+
+    def test_open_circuit_rejects_without_sending(self):
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.side_effect = requests.ConnectionError("down")
+            for _ in range(2):
+                with self.assertRaises(CalendarHookError):
+                    self.client.call("patch", eventId="abc")
+
+            with self.assertRaises(CircuitOpenError):
+                self.client.call("patch", eventId="abc")
+
+        self.assertEqual(mock_post.call_count, 2)
+
+    def test_bad_status_code_settles_trial(self):
+        self.client.breaker.record_failure()
+        self.client.breaker.record_failure()
+        self.client.breaker.opened_at -= 60
+
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.return_value = self.response({"statusCode": "oops"})
+            with self.assertRaises(CalendarHookError):
+                self.client.call("patch", eventId="abc")
+
+            # The failed trial re-opened the breaker instead of wedging it
+            self.assertEqual(self.client.breaker.state, "open")
+            self.client.breaker.opened_at -= 60
+
+            mock_post.return_value = self.response({})
+            self.assertEqual(self.client.call("patch", eventId="abc"), {})
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    def test_latency_is_recorded(self):
+        before = metrics.histogram("calendar_hook.pop.latency_ms").snapshot()["count"]
+        with patch.object(self.client.session, "post") as mock_post:
+            mock_post.return_value = self.response({})
+            self.client.call("pop", eventId="abc")
+
+        after = metrics.histogram("calendar_hook.pop.latency_ms").snapshot()["count"]
+        self.assertEqual(after, before + 1)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        histogram = Histogram(buckets=(10, 100))
+        for value in (1, 10, 50, 1000):
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["buckets"], {"10": 2, "100": 1, "+Inf": 1})
+
+
+class TestWebhookStandIn(unittest.TestCase):
+    """The benchmark stand-in answers the way webhook.js does."""
+
+    def setUp(self):
+        self.fake = FakeCalendar("token")
+        self.server = WebhookServer(self.fake).start()
+        self.client = CalendarHookClient(
+            url=self.server.url, token="token", calendar_id="calendar"
+        )
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_event_lifecycle(self):
+        event = self.client.call(
+            "post", userId="a@example.com", body={"conferenceData": {}}
+        )
+        self.assertIn("uri", event["conferenceData"]["entryPoints"][0])
+
+        users = [{"email": "b@example.com", "responseStatus": "needsAction"}]
+        self.client.call("patch", eventId=event["id"], userIds=users)
+        self.assertEqual(self.fake.attendees(event["id"]), ["b@example.com"])
+
+        self.client.call("pop", eventId=event["id"], userIds=users)
+        self.assertEqual(self.fake.attendees(event["id"]), [])
+
+        self.assertEqual(self.client.call("delete", eventId=event["id"]), {})
+        self.assertNotIn(event["id"], self.fake.events)
+
+    def test_repeated_patch_invites_once(self):
+        event = self.client.call("post", body={})
+        users = [{"email": "b@example.com", "responseStatus": "needsAction"}]
+
+        self.client.call("patch", eventId=event["id"], userIds=users)
+        self.client.call("patch", eventId=event["id"], userIds=users)
+        self.assertEqual(self.fake.attendees(event["id"]), ["b@example.com"])
+
+    def test_bad_token(self):
+        self.client.token = "wrong"
+        with self.assertRaisesRegex(CalendarHookError, "access"):
+            self.client.call("post", body={})
+
+    def test_injected_errors(self):
+        self.fake.error_rate = 1
+        with self.assertRaises(CalendarHookError):
+            self.client.call("post", body={})
+        self.assertEqual(self.fake.errors["post"], 1)
@@ -0,0 +1,207 @@
+import datetime
+
+from unittest.mock import patch
+
+from sqlalchemy import insert
+
+from app.catalog import (
+    cached_upcoming,
+    catalog,
+    next_boundary,
+    with_user_state,
+)
+from app.extensions import cache, db
+from app.metrics import metrics
+from app.models import Course, CourseUserAttended
+from app.versions import versions
+from app.pagination import Cursor
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase, captured_templates
+
+
+class TestCatalogSnapshot(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        starts = datetime.datetime.now() + datetime.timedelta(days=1)
+        for course in Course.query.all():
+            course.starts = starts
+            course.ends = starts + datetime.timedelta(hours=1)
+        db.session.add(CourseUserAttended(course_id=1, user_id=3))
+        db.session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def builds(self):
+        return metrics.counter("catalog_snapshot.builds").value
+
+    def list_events(self):
+        with captured_templates(self.app) as templates:
+            resp = self.client.get("/courses")
+        self.assertEqual(resp.status_code, 200)
+        for template in templates:
+            if template["template_name"] == "events/index.html":
+                return {event["id"]: event for event in template["context"]["events"]}
+
+    def test_snapshot_shared_between_users(self):
+        self.login("User")
+        events = self.list_events()
+        self.assertEqual(events[1]["state"], "registered")
+        self.assertEqual(events[1]["available"], 9)
+        builds = self.builds()
+
+        self.login("User 2")
+        events = self.list_events()
+        self.assertEqual(events[1]["state"], "available")
+        self.assertEqual(self.builds(), builds)
+
+    def test_overlay_leaves_snapshot_alone(self):
+        events, _ = catalog.page()
+        overlaid = with_user_state(events, {events[0]["id"]: True})
+
+        self.assertEqual(overlaid[0]["state"], "attended")
+        self.assertNotIn("state", catalog.page()[0][0])
+
+    def test_registration_rebuilds_snapshot(self):
+        self.login("User 2")
+        self.list_events()
+        builds = self.builds()
+
+        db.session.add(CourseUserAttended(course_id=2, user_id=4))
+        db.session.commit()
+
+        events = self.list_events()
+        self.assertEqual(events[2]["state"], "registered")
+        self.assertEqual(events[2]["available"], 9)
+        self.assertEqual(self.builds(), builds + 1)
+
+    def test_other_worker_change_rebuilds_snapshot(self):
+        catalog.page()
+        builds = self.builds()
+
+        # Another worker committed a change
+        versions.bump(db.session, ["catalog"])
+        db.session.commit()
+        versions.reset()
+        catalog.page()
+        self.assertEqual(self.builds(), builds + 1)
+
+    def test_ended_events_drop_off(self):
+        events, _ = catalog.page()
+        self.assertEqual(len(events), 2)
+
+        snapshot = catalog.snapshot()
+        ended = snapshot.entries[0]._replace(
+            ends=datetime.datetime.now() - datetime.timedelta(minutes=1)
+        )
+        snapshot.entries[0] = ended
+
+        events, _ = catalog.page()
+        self.assertEqual([event["id"] for event in events], [2])
+
+    def test_page_cursor(self):
+        db.session.add_all(
+            [
+                Course(
+                    title=f"Extra {i}",
+                    course_size=5,
+                    starts=datetime.datetime.now()
+                    + datetime.timedelta(days=2, hours=i),
+                    ends=datetime.datetime.now() + datetime.timedelta(days=3),
+                    student_allowed=i % 2 == 0,
+                )
+                for i in range(5)
+            ]
+        )
+        db.session.commit()
+
+        events, cursor = catalog.page(limit=3)
+        seen = [event["id"] for event in events]
+        while cursor:
+            events, cursor = catalog.page(cursor=Cursor().deserialize(cursor), limit=3)
+            seen.extend(event["id"] for event in events)
+        self.assertEqual(seen, [1, 2, 3, 4, 5, 6, 7])
+
+        events, cursor = catalog.page(student=True)
+        self.assertEqual([event["id"] for event in events], [3, 5, 7])
+
+
+class TestUpcomingCache(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        loader = Loader(self.app, db, ["courses.json", "roles.json", "users.json"])
+        loader.load()
+
+        self.now = datetime.datetime.now()
+        for course in Course.query.all():
+            course.starts = self.now + datetime.timedelta(hours=course.id)
+            course.ends = course.starts + datetime.timedelta(minutes=30)
+        db.session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def test_next_boundary(self):
+        first = Course.query.get(1)
+        self.assertEqual(next_boundary(self.now), first.starts)
+        # Between the first event's start and end
+        self.assertEqual(
+            next_boundary(first.starts + datetime.timedelta(minutes=1)), first.ends
+        )
+        self.assertIsNone(next_boundary(self.now + datetime.timedelta(days=1)))
+
+    def test_expires_at_next_boundary(self):
+        with patch.object(cache, "set", wraps=cache.set) as cache_set:
+            cached_upcoming("test", lambda now: ["built"])
+
+        timeout = cache_set.call_args.kwargs["timeout"]
+        # The first event starts in an hour
+        self.assertLessEqual(timeout, 3600)
+        self.assertGreater(timeout, 3500)
+
+    def test_feed_cached_until_write(self):
+        first = self.client.get("/courses?format=json").json
+        self.assertEqual([event["id"] for event in first], [1, 2])
+
+        # Changes that skip the commit hooks aren't seen...
+        db.session.execute(
+            insert(Course),
+            [
+                {
+                    "title": "Quiet",
+                    "starts": self.now + datetime.timedelta(minutes=5),
+                    "ends": self.now + datetime.timedelta(minutes=35),
+                }
+            ],
+        )
+        db.session.commit()
+        self.assertEqual(self.client.get("/courses?format=json").json, first)
+
+        # ...until an event is written through the ORM
+        Course.query.get(2).title = "Renamed"
+        db.session.commit()
+        events = self.client.get("/courses?format=json").json
+        self.assertEqual([event["id"] for event in events], [3, 1, 2])
@@ -0,0 +1,47 @@
+import datetime
+import unittest
+
+from markupsafe import Markup
+
+from app.charts import Chart, pie_svg, sparkline_svg
+
+
+class TestCharts(unittest.TestCase):
+    def test_pie(self):
+        svg = Chart([3, 1], ["attended", "not attended"]).pie()
+
+        self.assertIsInstance(svg, Markup)
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertEqual(svg.count("<path"), 2)
+        self.assertIn("attended (3)", svg)
+        self.assertIn("not attended (1)", svg)
+
+    def test_pie_deterministic_and_memoized(self):
+        first = Chart([2, 5], ["a", "b"]).pie()
+        hits = pie_svg.cache_info().hits
+
+        self.assertEqual(Chart([2, 5], ["a", "b"]).pie(), first)
+        self.assertEqual(pie_svg.cache_info().hits, hits + 1)
+
+    def test_pie_single_slice(self):
+        svg = Chart([4, 0], ["attended", "not attended"]).pie()
+
+        self.assertIn("<circle", svg)
+        self.assertNotIn("<path", svg)
+
+    def test_labels_escaped(self):
+        svg = Chart([1, 1], ["<b>", "ok"]).pie()
+        self.assertIn("&lt;b&gt;", svg)
+
+    def test_sparkline(self):
+        day = datetime.datetime(2022, 10, 1)
+        series = [
+            (day + datetime.timedelta(days=n), y) for n, y in enumerate([0, 2, 1])
+        ]
+        svg = Chart(series).sparkline()
+
+        self.assertIn('points="0,23 60,1 120,12"', svg)
+        self.assertEqual(svg, sparkline_svg((0, 2, 1)))
+
+    def test_sparkline_flat(self):
+        self.assertIn('points="0,23"', sparkline_svg((0,)))
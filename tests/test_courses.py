@@ -2,6 +2,8 @@ import datetime
 import json
 import unittest
 
+import requests
+
 from unittest.mock import Mock, patch
 
 from app.extensions import db
@@ -16,7 +18,7 @@ from app.models import (
 from app.resources import courses
 
 from tests.loader import Loader
-from tests.utils import TestBase, captured_templates
+from tests.utils import TestBase, captured_queries, captured_templates
 
 
 class TestCourseList(TestBase):
@@ -51,7 +53,145 @@ class TestCourseList(TestBase):
         resp = self.client.get("/courses")
         self.assertEqual(resp.status_code, 200)
 
-    @patch("app.resources.courses.requests.post")
+    def test_course_list_query_count(self):
+        """
+        Listing events should cost a fixed number of queries regardless of
+        how many events are open.
+        """
+        self.login("User")
+        starts = datetime.datetime.now() + datetime.timedelta(days=1)
+        ends = starts + datetime.timedelta(hours=1)
+
+        def add_courses(count):
+            for i in range(count):
+                course = Course(
+                    title=f"Listed {i}",
+                    description="Listed event",
+                    course_size=10,
+                    starts=starts,
+                    ends=ends,
+                )
+                db.session.add(course)
+            db.session.commit()
+
+        def count_queries():
+            with captured_queries() as statements:
+                with captured_templates(self.app) as templates:
+                    resp = self.client.get("/courses")
+
+            self.assertEqual(resp.status_code, 200)
+            for template in templates:
+                if template["template_name"] == "events/index.html":
+                    return len(statements), template["context"]["events"]
+
+        add_courses(2)
+        db.session.add(CourseUserAttended(course_id=3, user_id=3, attended=True))
+        db.session.add(CourseUserAttended(course_id=4, user_id=4))
+        db.session.commit()
+
+        few, events = count_queries()
+        states = {item["id"]: item for item in events}
+        self.assertEqual(states[3]["state"], "attended")
+        self.assertEqual(states[4]["state"], "available")
+        self.assertEqual(states[4]["available"], 9)
+
+        add_courses(20)
+        many, events = count_queries()
+        self.assertEqual(len(events), 22)
+        self.assertEqual(few, many)
+
+    def add_upcoming(self, count, **kwargs):
+        # Several events share a start time so the id breaks ties in the order
+        now = datetime.datetime.now()
+        for i in range(count):
+            starts = now + datetime.timedelta(days=1 + i // 3)
+            db.session.add(
+                Course(
+                    title=f"Upcoming {i}",
+                    description="Upcoming event",
+                    course_size=10,
+                    starts=starts,
+                    ends=starts + datetime.timedelta(hours=1),
+                    **kwargs,
+                )
+            )
+        db.session.commit()
+
+    def get_page(self, url):
+        with captured_templates(self.app) as templates:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        for template in templates:
+            if template["template_name"] == "events/index.html":
+                return template["context"]
+
+    def test_course_list_pages(self):
+        self.login("User")
+        self.app.config["CATALOG_PAGE_SIZE"] = 4
+        self.add_upcoming(10)
+
+        seen = []
+        context = self.get_page("/courses")
+        while True:
+            seen.extend(event["id"] for event in context["events"])
+            if context["next_cursor"] is None:
+                break
+            context = self.get_page(f"/courses?cursor={context['next_cursor']}")
+
+        expected = [
+            course.id
+            for course in Course.query.filter(
+                Course.ends >= datetime.datetime.now()
+            ).order_by(Course.starts, Course.id)
+        ]
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(seen, expected)
+
+    def test_course_list_sentinel(self):
+        self.login("User")
+        self.app.config["CATALOG_PAGE_SIZE"] = 4
+        self.add_upcoming(5)
+
+        resp = self.client.get("/courses?all=true")
+        body = resp.get_data(as_text=True)
+        self.assertIn('hx-trigger="revealed"', body)
+        self.assertIn("&all=true", body)
+
+        self.app.config["CATALOG_PAGE_SIZE"] = 24
+        resp = self.client.get("/courses")
+        self.assertNotIn('hx-trigger="revealed"', resp.get_data(as_text=True))
+
+    def test_course_list_student_filter(self):
+        self.login("Student User")
+        self.app.config["CATALOG_PAGE_SIZE"] = 2
+        self.add_upcoming(3)
+        self.add_upcoming(3, student_allowed=True)
+
+        # Pages are filled with events students can join, not cut short by
+        # events they can't.
+        context = self.get_page("/courses")
+        self.assertEqual(len(context["events"]), 2)
+        self.assertIsNotNone(context["next_cursor"])
+        context = self.get_page(f"/courses?cursor={context['next_cursor']}")
+        self.assertEqual(len(context["events"]), 1)
+        self.assertIsNone(context["next_cursor"])
+
+    def test_course_list_student_nothing_allowed(self):
+        self.login("Student User")
+        self.add_upcoming(3)
+
+        with captured_templates(self.app) as templates:
+            self.client.get("/courses")
+        self.assertEqual(
+            templates[0]["template_name"], "shared/partials/no-upcoming.html"
+        )
+
+    def test_course_list_bad_cursor(self):
+        self.login("User")
+        resp = self.client.get("/courses?cursor=not-a-cursor")
+        self.assertEqual(resp.status_code, 422)
+
+    @patch("app.calendar.calendar_hook.session.post")
     def test_post_course(self, mock_post):
         self.login("Admin")
         headers = {"Content-Type": "application/json"}
@@ -162,7 +302,7 @@ class TestSingleCourse(TestBase):
             )
             self.assertEqual(resp.status_code, 200)
 
-    @patch("app.resources.courses.requests.put")
+    @patch("app.calendar.calendar_hook.session.post")
     def test_update_single_course_date(self, mock_put):
         self.login("Admin")
         now = datetime.datetime.now()
@@ -189,8 +329,10 @@ class TestSingleCourse(TestBase):
         self.assertEqual(resp.status_code, 422)
         self.assertIsInstance(resp.json["errors"]["json"], dict)
 
-    def test_delete_single_course(self):
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_delete_single_course(self, mock_post):
         self.login("Admin")
+        mock_post.return_value = Mock(status_code=200, text="")
         resp = self.client.delete("/courses/1")
         self.assertTrue(
             resp.headers.get("HX-Trigger"),
@@ -198,6 +340,58 @@ class TestSingleCourse(TestBase):
         )
         self.assertEqual(resp.status_code, 200)
 
+    def link_calendar(self, course_id):
+        Course.query.get(course_id).ext_calendar = f"event-{course_id}"
+        db.session.commit()
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_delete_single_course_calendar_down(self, mock_post):
+        # The event stays put so its calendar invitation isn't orphaned.
+        self.link_calendar(1)
+        self.login("Admin")
+        mock_post.side_effect = requests.ConnectionError("hook is down")
+        resp = self.client.delete("/courses/1")
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertIsNotNone(Course.query.get(1))
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_delete_single_course_calendar_event_gone(self, mock_post):
+        # Apps Script throws on a missing event and answers with an HTML page
+        self.link_calendar(1)
+        self.login("Admin")
+        mock_post.return_value = Mock(
+            status_code=200,
+            raise_for_status=lambda: None,
+            text="<!DOCTYPE html><html>Exception: Not Found</html>",
+            json=Mock(side_effect=ValueError("Expecting value")),
+        )
+        resp = self.client.delete("/courses/1")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(Course.query.get(1))
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_delete_single_course_calendar_refused(self, mock_post):
+        self.link_calendar(1)
+        self.login("Admin")
+        body = {"status": "Forbidden", "statusCode": 403}
+        mock_post.return_value = Mock(
+            status_code=200, raise_for_status=lambda: None, text="{}", json=lambda: body
+        )
+        resp = self.client.delete("/courses/1")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(Course.query.get(1))
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_delete_single_course_without_calendar(self, mock_post):
+        self.login("Admin")
+        resp = self.client.delete("/courses/1")
+
+        self.assertEqual(resp.status_code, 200)
+        mock_post.assert_not_called()
+
 
 class TestCoursePresenters(TestBase):
     def setUp(self):
@@ -229,7 +423,7 @@ class TestCoursePresenters(TestBase):
         self.assertEqual(len(resp.json), 1)
         self.assertEqual(resp.json[0]["name"], "Admin")
 
-    @patch("app.resources.courses.requests.post")
+    @patch("app.calendar.calendar_hook.session.post")
     def test_add_course_presenters(self, mock_put):
         self.login("Admin")
         payload = {"user_ids": [2]}
@@ -339,7 +533,7 @@ class TestCourseAttendees(TestBase):
             for reg in registrations:
                 self.assertEqual(reg.attended, True)
 
-    @patch("app.resources.courses.requests.post")
+    @patch("app.calendar.calendar_hook.session.post")
     def test_bulk_add_attendees_to_course(self, mock_post):
         """
         Calls app.resources.courses.CourseAttendeesAPI.post
@@ -398,7 +592,7 @@ class TestCourseAttendeeAPI(TestBase):
         db.drop_all()
         db.session.close()
 
-    @patch("app.resources.courses.requests.post")
+    @patch("app.calendar.calendar_hook.session.post")
     def test_post_single_user_to_course(self, mock_post):
         """
         A user self-registers for a course.
@@ -445,7 +639,7 @@ class TestCourseAttendeeAPI(TestBase):
             '{"showToast": "No user with id <3> registered for this course."}',
         )
 
-    @patch("app.resources.courses.requests.post")
+    @patch("app.calendar.calendar_hook.session.post")
     def test_delete_user_from_course(self, mock_post):
         """
         A user cancells their registration.
@@ -467,3 +661,113 @@ class TestCourseAttendeeAPI(TestBase):
             resp.headers.get("HX-Trigger"),
             '{"showToast": "Successfully cancelled registration for Course 1"}',
         )
+
+
+class TestConcurrentRegistration(TestBase):
+    """
+    Registration bursts run against a file-backed database so each request
+    thread gets its own connection, like separate gunicorn workers would.
+    """
+
+    def setUp(self):
+        import os
+        import tempfile
+
+        from config import TestConfig
+
+        self.tmpdir = tempfile.mkdtemp()
+
+        class FileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.tmpdir, "burst.db"
+            )
+
+        self.app = self.create(FileConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        fixtures = ["courses.json", "users.json"]
+
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        self.names = [f"Burst {i}" for i in range(25)]
+        for name in self.names:
+            db.session.add(
+                User(name=name, email=f"{name.replace(' ', '')}@example.com")
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        import shutil
+
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_registration_burst_does_not_oversell(self, mock_post):
+        """
+        Fire more registrations than there are seats at the same time.
+        Calls `app.resources.courses.CourseAttendeeAPI.post`
+        """
+        import threading
+
+        mock_post.return_value = Mock(status_code=200, json=lambda: {})
+
+        course_size = Course.query.get(1).course_size
+        barrier = threading.Barrier(len(self.names))
+        statuses = []
+
+        def register(name):
+            client = self.app.test_client()
+            client.get(f"/auto_login/{name}")
+            barrier.wait()
+            resp = client.post(
+                "/courses/1/register", data={"acc_required": False, "acc_details": ""}
+            )
+            statuses.append(resp.status_code)
+
+        threads = [
+            threading.Thread(target=register, args=(name,)) for name in self.names
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(200), course_size)
+        self.assertEqual(statuses.count(409), len(self.names) - course_size)
+        self.assertEqual(
+            CourseUserAttended.query.filter_by(course_id=1).count(), course_size
+        )
+
+    @patch("app.models.time.sleep")
+    def test_reserve_locks_event_and_backs_off(self, mock_sleep):
+        from sqlalchemy.dialects import mysql
+        from sqlalchemy.exc import OperationalError
+
+        execute = db.session.execute
+        statements = []
+
+        def deadlock_twice(statement, *args, **kwargs):
+            statements.append(statement)
+            if len(statements) in (2, 4):
+                raise OperationalError("INSERT", {}, Exception("Deadlock found"))
+            return execute(statement, *args, **kwargs)
+
+        user = User.query.filter_by(name="Burst 0").one()
+        with patch.object(db.session, "execute", side_effect=deadlock_twice):
+            self.assertTrue(CourseUserAttended.reserve(1, user.id, backoff=0.1))
+
+        # Each attempt locks the event row before the guarded insert
+        lock = str(statements[0].compile(dialect=mysql.dialect()))
+        self.assertTrue(lock.endswith("FOR UPDATE"))
+        self.assertEqual(len(statements), 6)
+
+        # Random waits under a limit that doubles per retry
+        waits = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(len(waits), 2)
+        self.assertLessEqual(waits[0], 0.1)
+        self.assertLessEqual(waits[1], 0.2)
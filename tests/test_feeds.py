@@ -0,0 +1,204 @@
+import datetime
+import gzip
+import json
+import threading
+
+from unittest.mock import patch
+
+import requests
+
+from app.blueprints.home_blueprint import resource_feed
+from app.extensions import cache, db
+from app.models import Course
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase
+
+
+class FeedConfig(CachedConfig):
+    BLOG_AUTH_TOKEN = "blog"
+    YOUTUBE_AUTH_TOKEN = "youtube"
+
+
+class TestExtensionFeeds(TestBase):
+    def setUp(self):
+        self.app = self.create(FeedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        loader = Loader(self.app, db, ["courses.json", "roles.json", "users.json"])
+        loader.load()
+
+        now = datetime.datetime.now()
+        for course in Course.query.all():
+            course.starts = now + datetime.timedelta(hours=course.id)
+            course.ends = course.starts + datetime.timedelta(minutes=30)
+        db.session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def test_course_feed_not_modified(self):
+        resp = self.client.get("/courses?format=json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([event["id"] for event in resp.json], [1, 2])
+        etag = resp.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        resp = self.client.get("/courses?format=json", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b"")
+        self.assertEqual(resp.headers["ETag"], etag)
+
+    def test_course_feed_changes_with_events(self):
+        etag = self.client.get("/courses?format=json").headers["ETag"]
+
+        Course.query.get(1).title = "Renamed"
+        db.session.commit()
+
+        resp = self.client.get("/courses?format=json", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertEqual(resp.json[0]["title"], "Renamed")
+
+    def test_course_feed_gzipped(self):
+        plain = self.client.get("/courses?format=json")
+        resp = self.client.get(
+            "/courses?format=json", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertNotEqual(resp.headers["ETag"], plain.headers["ETag"])
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+
+        resp = self.client.get(
+            "/courses?format=json",
+            headers={
+                "Accept-Encoding": "gzip",
+                "If-None-Match": resp.headers["ETag"],
+            },
+        )
+        self.assertEqual(resp.status_code, 304)
+
+    @patch("app.blueprints.home_blueprint.get_youtube_video")
+    @patch("app.blueprints.home_blueprint.get_blog_post")
+    def test_resource_feed(self, blog_post, youtube_video):
+        blog_post.return_value = {
+            "published_at": datetime.datetime(2022, 10, 3),
+            "link": "https://blog.example.com/post",
+            "title": "Blog post",
+        }
+        youtube_video.side_effect = requests.HTTPError("quota")
+
+        resp = self.client.get("/resource-query")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data)["title"], "Blog post")
+
+        resp = self.client.get(
+            "/resource-query", headers={"If-None-Match": resp.headers["ETag"]}
+        )
+        self.assertEqual(resp.status_code, 304)
+        # Served from the stored feed without asking the sources again
+        self.assertEqual(blog_post.call_count, 1)
+
+
+BLOG_POST = {
+    "published_at": datetime.datetime(2022, 10, 3),
+    "link": "https://blog.example.com/post",
+    "title": "Blog post",
+}
+VIDEO = {
+    "published_at": datetime.datetime(2022, 10, 5),
+    "link": "https://youtube.com/watch?v=1",
+    "title": "Video",
+}
+
+
+@patch("app.blueprints.home_blueprint.get_youtube_video")
+@patch("app.blueprints.home_blueprint.get_blog_post")
+class TestResourceFeedRefresh(TestBase):
+    def setUp(self):
+        self.app = self.create(FeedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def title(self):
+        return json.loads(self.client.get("/resource-query").data).get("title")
+
+    def test_newest_resource_wins(self, blog_post, youtube_video):
+        blog_post.return_value = BLOG_POST
+        youtube_video.return_value = VIDEO
+
+        self.assertEqual(self.title(), "Video")
+
+    def test_failures_not_cached(self, blog_post, youtube_video):
+        blog_post.side_effect = requests.ConnectionError()
+        youtube_video.side_effect = requests.Timeout()
+
+        resp = self.client.get("/resource-query")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp.headers)
+
+        blog_post.side_effect = None
+        blog_post.return_value = BLOG_POST
+        self.assertEqual(self.title(), "Blog post")
+
+    def test_stale_feed_served_while_refreshing(self, blog_post, youtube_video):
+        self.app.config["RESOURCE_FEED_TIMEOUT"] = 0
+        blog_post.return_value = BLOG_POST
+        youtube_video.side_effect = requests.Timeout()
+        self.assertEqual(self.title(), "Blog post")
+
+        youtube_video.side_effect = None
+        youtube_video.return_value = VIDEO
+
+        # The old feed comes back at once and a refresh starts behind it
+        self.assertEqual(self.title(), "Blog post")
+        resource_feed.refresh().result(timeout=5)
+        self.assertEqual(self.title(), "Video")
+
+    def test_source_falls_back_to_last_good(self, blog_post, youtube_video):
+        self.app.config["RESOURCE_FEED_TIMEOUT"] = 0
+        blog_post.return_value = BLOG_POST
+        youtube_video.return_value = VIDEO
+        self.title()
+
+        youtube_video.side_effect = requests.Timeout()
+        resource_feed.refresh().result(timeout=5)
+        self.assertEqual(self.title(), "Video")
+
+    def test_single_flight(self, blog_post, youtube_video):
+        blog_post.return_value = BLOG_POST
+        youtube_video.return_value = VIDEO
+
+        # Another worker holds the refresh lock
+        cache.add(resource_feed.lock_key, 1)
+        self.assertIsNone(resource_feed.refresh())
+        self.assertIsNone(self.title())
+        blog_post.assert_not_called()
+
+        cache.delete(resource_feed.lock_key)
+        release = threading.Event()
+
+        def slow_blog_post(*args):
+            release.wait(5)
+            return BLOG_POST
+
+        blog_post.side_effect = slow_blog_post
+
+        # Threads in this worker join the running refresh
+        first = resource_feed.refresh()
+        self.assertIs(resource_feed.refresh(), first)
+        release.set()
+        first.result(timeout=5)
+        self.assertEqual(blog_post.call_count, 1)
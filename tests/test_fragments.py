@@ -0,0 +1,119 @@
+import datetime
+
+from app.extensions import db
+from app.fragments import event_cards
+from app.metrics import metrics
+from app.models import Course, CourseUserAttended
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase, captured_templates
+
+
+class TestEventCardCache(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        # Keep the fixture events in the upcoming list
+        starts = datetime.datetime.now() + datetime.timedelta(days=1)
+        for course in Course.query.all():
+            course.starts = starts
+            course.ends = starts + datetime.timedelta(hours=1)
+        db.session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def counts(self):
+        return (
+            metrics.counter("event_card_cache.hits").value,
+            metrics.counter("event_card_cache.misses").value,
+        )
+
+    def rendered_cards(self):
+        with captured_templates(self.app) as templates:
+            resp = self.client.get("/courses")
+        self.assertEqual(resp.status_code, 200)
+        return [
+            template["context"]["event"]["id"]
+            for template in templates
+            if template["template_name"] == "events/partials/event-card.html"
+        ]
+
+    def test_cards_are_reused(self):
+        self.login("User")
+
+        self.assertEqual(self.rendered_cards(), [1, 2])
+        hits, misses = self.counts()
+
+        self.assertEqual(self.rendered_cards(), [])
+        self.assertEqual(self.counts(), (hits + 2, misses))
+
+    def test_edit_renders_card_again(self):
+        self.login("User")
+        self.rendered_cards()
+
+        course = Course.query.get(1)
+        course.title = "Renamed"
+        db.session.commit()
+
+        self.assertEqual(self.rendered_cards(), [1])
+        self.assertIn("Renamed", self.client.get("/courses").get_data(as_text=True))
+
+    def test_registration_renders_card_again(self):
+        self.login("User")
+        self.rendered_cards()
+
+        db.session.add(CourseUserAttended(course_id=2, user_id=3))
+        db.session.commit()
+
+        self.assertEqual(self.rendered_cards(), [2])
+
+    def test_reserve_renders_card_again(self):
+        self.login("User")
+        self.rendered_cards()
+
+        self.assertTrue(CourseUserAttended.reserve(1, 4))
+        db.session.commit()
+
+        self.assertEqual(self.rendered_cards(), [1])
+
+    def test_rollback_keeps_cards(self):
+        self.login("User")
+        self.rendered_cards()
+        versions = event_cards.versions([1, 2])
+
+        course = Course.query.get(1)
+        course.title = "Not saved"
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertEqual(event_cards.versions([1, 2]), versions)
+        self.assertEqual(self.rendered_cards(), [])
+
+    def test_cards_keyed_by_user_state(self):
+        db.session.add(CourseUserAttended(course_id=1, user_id=3))
+        db.session.commit()
+
+        # "User" is registered for event 1, "User 2" is not
+        self.login("User")
+        self.rendered_cards()
+        self.login("User 2")
+        self.assertEqual(self.rendered_cards(), [1])
+
+        body = self.client.get("/courses").get_data(as_text=True)
+        self.assertNotIn("Registered", body)
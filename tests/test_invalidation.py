@@ -0,0 +1,94 @@
+from app.blueprints.admin_blueprint import get_event
+from app.extensions import cache, db
+from app.models import Course, CourseLink, CourseUserAttended, User
+from app.versions import versions
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase
+
+
+class TestCachedEvents(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        fixtures = [
+            "courses.json",
+            "course_types.json",
+            "course_link_type.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        get_event(1)
+        get_event(2)
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def cached(self, event_id):
+        version = versions.get(f"course:{event_id}")
+        return cache.get(f"event/{event_id}/{version}") is not None
+
+    def assertEvicted(self, event_id):
+        self.assertFalse(self.cached(event_id))
+        self.assertTrue(self.cached(2))
+
+    def test_cached(self):
+        self.assertTrue(self.cached(1))
+        self.assertTrue(self.cached(2))
+
+    def test_edit_evicts(self):
+        Course.query.get(1).title = "Renamed"
+        db.session.commit()
+
+        self.assertEvicted(1)
+        self.assertEqual(get_event(1)["title"], "Renamed")
+
+    def test_other_worker_edit_seen(self):
+        # Another worker committed a change to event 1
+        versions.bump(db.session, ["course:1"])
+        db.session.commit()
+
+        versions.reset()
+        self.assertEvicted(1)
+
+    def test_presenter_evicts(self):
+        course = Course.query.get(1)
+        course.presenters.append(User.query.get(2))
+        db.session.commit()
+
+        self.assertEvicted(1)
+        self.assertEqual(len(get_event(1)["presenters"]), 1)
+
+    def test_link_evicts(self):
+        link = CourseLink(courselinktype_id=1, name="Slides", uri="https://x.test")
+        course = Course.query.get(1)
+        course.links.append(link)
+        db.session.commit()
+        self.assertEvicted(1)
+
+        get_event(1)
+        link.name = "Handout"
+        db.session.commit()
+        self.assertEvicted(1)
+
+    def test_registration_evicts(self):
+        available = get_event(1)["available"]
+        CourseUserAttended.reserve(1, 3)
+        db.session.commit()
+
+        self.assertEvicted(1)
+        self.assertEqual(get_event(1)["available"], available - 1)
+
+    def test_rollback_keeps_entry(self):
+        Course.query.get(1).title = "Not saved"
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertTrue(self.cached(1))
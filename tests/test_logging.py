@@ -1,6 +1,11 @@
+import datetime
 import json
 
+from unittest.mock import patch
+
 from app.extensions import db
+from app.logging import AuditLogBuffer, backfill_log_targets
+from app.metrics import metrics
 from app.models import Log
 
 from tests.loader import Loader
@@ -60,3 +65,171 @@ class TestLogging(TestBase):
         log_json = json.loads(log.json_data)
         self.assertTrue(log.method == "POST")
         self.assertEqual(log_json["name"], "User 5")
+
+    def test_long_post_truncated(self):
+        self.login("Admin")
+        payload = {"name": "x" * 3000, "location_id": 1, "email": "u@example.com"}
+        self.client.post("/users", data=payload)
+
+        log = Log.query.get(1)
+        self.assertEqual(len(log.json_data), Log.json_data.type.length)
+
+
+class TestAuditLogBuffer(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+        loader = Loader(self.app, db, ["roles.json", "users.json"])
+        loader.load()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def row(self, endpoint="/courses"):
+        return {
+            "user_id": 1,
+            "source_uri": "127.0.0.1",
+            "endpoint": endpoint,
+            "method": "GET",
+            "json_data": None,
+            "occurred": datetime.datetime.utcnow(),
+        }
+
+    def test_drops_when_full(self):
+        buffer = AuditLogBuffer(queue_size=2, threaded=True)
+        buffer.app = self.app
+        dropped = metrics.counter("audit_log.dropped").value
+
+        # Keep the flusher from emptying the queue under the test
+        with patch.object(buffer, "_ensure_started"):
+            results = [buffer.record(self.row()) for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(metrics.counter("audit_log.dropped").value, dropped + 1)
+
+        buffer.flush()
+        self.assertEqual(Log.query.count(), 2)
+
+    def test_bad_row_only_loses_itself(self):
+        buffer = AuditLogBuffer(threaded=False)
+        buffer.app = self.app
+        buffer.write([dict(self.row(), id=1)])
+        failed = metrics.counter("audit_log.failed").value
+
+        # The duplicate id fails the batch, then only itself on retry
+        rows = [dict(self.row(), id=1), self.row(), self.row()]
+        with patch.object(self.app.logger, "exception"):
+            buffer.write(rows)
+
+        self.assertEqual(Log.query.count(), 3)
+        self.assertEqual(metrics.counter("audit_log.failed").value, failed + 1)
+
+    def test_flusher_writes_batches_and_drains_on_stop(self):
+        buffer = AuditLogBuffer(batch_size=5, flush_interval=0.01, threaded=True)
+        buffer.app = self.app
+
+        for i in range(12):
+            buffer.record(self.row(f"/courses/{i}"))
+        buffer.stop()
+
+        self.assertFalse(buffer._thread.is_alive())
+        self.assertEqual(Log.query.count(), 12)
+        self.assertIsNotNone(Log.query.first().occurred)
+
+
+class TestLogQuery(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def test_targets_are_taken_from_the_url(self):
+        self.login("Admin")
+        self.client.get("/courses/1")
+        self.client.get("/users/3")
+        self.client.get("/admin/events/2/edit")
+
+        logs = Log.query.order_by(Log.id).all()
+        self.assertEqual(logs[0].course_id, 1)
+        self.assertIsNone(logs[0].target_user_id)
+        self.assertEqual(logs[1].target_user_id, 3)
+        self.assertEqual(logs[2].course_id, 2)
+
+    def test_filter_by_event(self):
+        self.login("Admin")
+        self.client.get("/courses/1")
+        self.client.get("/courses/2")
+        self.client.get("/courses/1/registrations")
+
+        resp = self.client.get("/logs?course_id=1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [log["endpoint"] for log in resp.json["logs"]],
+            ["/courses/1/registrations", "/courses/1"],
+        )
+        self.assertIsNone(resp.json["next"])
+
+    def test_keyset_pages(self):
+        self.login("Admin")
+        for i in range(5):
+            self.client.get(f"/courses/{i % 2 + 1}")
+
+        seen = []
+        url = "/logs?method=GET&limit=2"
+        while url:
+            resp = self.client.get(url)
+            seen += [log["id"] for log in resp.json["logs"]]
+            cursor = resp.json["next"]
+            url = f"/logs?method=GET&limit=2&cursor={cursor}" if cursor else None
+
+        # Every request so far, newest first, with no repeats.
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertGreaterEqual(len(seen), 6)
+
+    def test_bad_cursor(self):
+        self.login("Admin")
+        resp = self.client.get("/logs?cursor=nope")
+        self.assertEqual(resp.status_code, 422)
+
+    def test_logs_as_user(self):
+        self.login("User")
+        resp = self.client.get("/logs")
+        self.assertEqual(resp.status_code, 403)
+
+    def test_backfill_targets(self):
+        db.session.add_all(
+            [
+                Log(user_id=1, endpoint="/courses/2/registrations", method="GET"),
+                Log(user_id=1, endpoint="/users/4/presenting", method="GET"),
+                Log(user_id=1, endpoint="/gone", method="GET"),
+            ]
+        )
+        db.session.commit()
+
+        updated = backfill_log_targets(self.app.url_map, batch_size=2)
+
+        self.assertEqual(updated, 2)
+        logs = Log.query.order_by(Log.id).all()
+        self.assertEqual(logs[0].course_id, 2)
+        self.assertEqual(logs[1].target_user_id, 4)
+        self.assertIsNone(logs[2].course_id)
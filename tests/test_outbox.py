@@ -0,0 +1,349 @@
+import datetime
+import json
+
+from unittest.mock import Mock, patch
+
+from app.calendar import CircuitBreaker, calendar_hook
+from benchmarks.webhook_server import FakeCalendar
+from app.extensions import db
+from app.models import CalendarOutbox, Course
+from app.outbox import (
+    DEAD,
+    PENDING,
+    SENT,
+    CalendarWorker,
+    Coalescer,
+    enqueue,
+    outbox_stats,
+)
+
+from tests.loader import Loader
+from tests.utils import TestBase
+
+
+class TestCalendarOutbox(TestBase):
+    def setUp(self):
+        self.app = self.create()
+
+        # Set up the application context manually to build the database
+        # and test client for requests.
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_registrations.json",
+            "roles.json",
+            "users.json",
+        ]
+
+        # Now that we're in context, we can load the database.
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def test_registration_queues_calendar_patch(self):
+        """
+        Registering writes the webhook call to the outbox instead of sending it.
+        """
+        self.login("User 2")
+        resp = self.client.post(
+            "/courses/2/register", data={"acc_required": False, "acc_details": ""}
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        item = CalendarOutbox.query.one()
+        self.assertEqual(item.method, "patch")
+        self.assertEqual(item.status, PENDING)
+        self.assertEqual(
+            json.loads(item.payload)["userIds"][0]["email"], "user2@example.com"
+        )
+
+    def test_cancellation_queues_calendar_pop(self):
+        self.login("Admin")
+        resp = self.client.delete("/courses/1/register")
+        self.assertEqual(resp.status_code, 200)
+
+        item = CalendarOutbox.query.one()
+        self.assertEqual(item.method, "pop")
+
+    def test_full_event_does_not_queue(self):
+        self.login("User 2")
+        course = Course.query.get(2)
+        course.course_size = 1
+        db.session.commit()
+
+        resp = self.client.post(
+            "/courses/2/register", data={"acc_required": False, "acc_details": ""}
+        )
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(CalendarOutbox.query.count(), 0)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_worker_delivers_pending_calls(self, mock_post):
+        mock_post.return_value = Mock(
+            status_code=200,
+            raise_for_status=lambda: None,
+            json=lambda: {"status": "OK", "statusCode": 200},
+        )
+        self.login("User 2")
+        self.client.post(
+            "/courses/2/register", data={"acc_required": False, "acc_details": ""}
+        )
+
+        processed = CalendarWorker().drain()
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(CalendarOutbox.query.one().status, SENT)
+
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["method"], "patch")
+        self.assertEqual(payload["token"], self.app.config["CALENDAR_HOOK_TOKEN"])
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_worker_retries_with_backoff(self, mock_post):
+        # Apps Script reports errors in the body of a 200 response
+        mock_post.return_value = Mock(
+            status_code=200,
+            raise_for_status=lambda: None,
+            json=lambda: {"status": "Error", "statusCode": 500},
+        )
+        self.login("Admin")
+        self.client.delete("/courses/1/register")
+
+        worker = CalendarWorker(base_delay=10)
+        worker.drain()
+
+        item = CalendarOutbox.query.one()
+        self.assertEqual(item.status, PENDING)
+        self.assertEqual(item.attempts, 1)
+        self.assertGreater(item.next_attempt_at, datetime.datetime.utcnow())
+
+        # Not due yet, so nothing is claimed.
+        self.assertEqual(worker.drain(), 0)
+        self.assertEqual(outbox_stats()["failing"], 1)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_worker_dead_letters(self, mock_post):
+        mock_post.side_effect = ConnectionError("hook is down")
+        self.login("Admin")
+        self.client.delete("/courses/1/register")
+
+        worker = CalendarWorker(max_attempts=2, base_delay=0)
+        worker.drain()
+        worker.drain()
+
+        item = CalendarOutbox.query.one()
+        self.assertEqual(item.status, DEAD)
+        self.assertEqual(item.last_error, "hook is down")
+
+        stats = outbox_stats()
+        self.assertEqual(stats["dead"], 1)
+        self.assertEqual(stats["pending"], 0)
+
+    def test_backoff_is_exponential_and_capped(self):
+        worker = CalendarWorker(base_delay=5, max_delay=30)
+        delays = [worker.backoff(n).total_seconds() for n in range(1, 6)]
+        self.assertEqual(delays, [5, 10, 20, 30, 30])
+
+    def test_calendar_status_as_admin(self):
+        self.login("Admin")
+        resp = self.client.get("/admin/calendar/status")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["pending"], 0)
+        self.assertIn("lag_seconds", resp.json)
+
+    def test_metrics_as_admin(self):
+        self.login("Admin")
+        resp = self.client.get("/admin/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["calendar_hook"]["circuit"], "closed")
+
+    def test_calendar_status_as_user(self):
+        self.login("User")
+        resp = self.client.get("/admin/calendar/status")
+        self.assertEqual(resp.status_code, 403)
+
+
+class TestCalendarCoalescing(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def ok(self):
+        return Mock(
+            status_code=200,
+            raise_for_status=lambda: None,
+            json=lambda: {"status": "OK", "statusCode": 200},
+        )
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_registrations_merge_into_one_call(self, mock_post):
+        mock_post.return_value = self.ok()
+        for i in range(5):
+            enqueue("patch", "event-1", [f"user{i}@example.com"])
+        enqueue("patch", "event-2", ["user9@example.com"])
+        db.session.commit()
+
+        processed = CalendarWorker().drain()
+
+        self.assertEqual(processed, 6)
+        self.assertEqual(mock_post.call_count, 2)
+
+        payload = mock_post.call_args_list[0].kwargs["json"]
+        self.assertEqual(payload["eventId"], "event-1")
+        self.assertEqual(len(payload["userIds"]), 5)
+
+        stats = outbox_stats()
+        self.assertEqual(stats["delivered"], 6)
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["calls_saved"], 4)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_add_and_remove_cancel_out(self, mock_post):
+        mock_post.return_value = self.ok()
+        enqueue("patch", "event-1", ["a@example.com"])
+        enqueue("patch", "event-1", ["b@example.com"])
+        enqueue("pop", "event-1", ["a@example.com"])
+        db.session.commit()
+
+        CalendarWorker().drain()
+
+        # Only b is added. a never reaches the calendar and no pop is sent.
+        self.assertEqual(mock_post.call_count, 1)
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["method"], "patch")
+        self.assertEqual(payload["userIds"][0]["email"], "b@example.com")
+        self.assertEqual(CalendarOutbox.query.filter_by(status=SENT).count(), 3)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_window_holds_changes(self, mock_post):
+        mock_post.return_value = self.ok()
+        enqueue("patch", "event-1", ["a@example.com"])
+        db.session.commit()
+
+        worker = CalendarWorker(coalescer=Coalescer(window=60, max_users=3))
+        self.assertEqual(worker.drain(), 0)
+        self.assertEqual(mock_post.call_count, 0)
+
+        # Reaching max_users flushes before the window closes.
+        enqueue("patch", "event-1", ["b@example.com", "c@example.com"])
+        db.session.commit()
+
+        self.assertEqual(worker.drain(), 2)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_failed_call_keeps_group_pending(self, mock_post):
+        def hook(url, json, timeout):
+            if json["method"] == "pop":
+                raise ConnectionError("hook is down")
+            return self.ok()
+
+        mock_post.side_effect = hook
+        enqueue("patch", "event-1", ["a@example.com"])
+        enqueue("pop", "event-1", ["b@example.com"])
+        db.session.commit()
+
+        worker = CalendarWorker(base_delay=60)
+        worker.drain()
+
+        # The whole group is retried together, even the call that went through
+        patch_row, pop_row = CalendarOutbox.query.order_by(CalendarOutbox.id).all()
+        self.assertEqual(patch_row.status, PENDING)
+        self.assertEqual(pop_row.status, PENDING)
+
+        # Newer changes for the event wait behind the retry so they stay in order.
+        enqueue("patch", "event-1", ["b@example.com"])
+        db.session.commit()
+        self.assertEqual(worker.drain(), 0)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_cancelled_rows_retried_with_group(self, mock_post):
+        mock_post.side_effect = ConnectionError("hook is down")
+        enqueue("patch", "event-1", ["a@example.com"])
+        enqueue("patch", "event-1", ["b@example.com"])
+        enqueue("pop", "event-1", ["a@example.com"])
+        db.session.commit()
+
+        worker = CalendarWorker(base_delay=60)
+        worker.drain()
+
+        rows = CalendarOutbox.query.order_by(CalendarOutbox.id).all()
+        self.assertEqual([row.status for row in rows], [PENDING] * 3)
+
+        # The retry nets the same rows again, so the cancelled user stays out
+        for row in rows:
+            row.next_attempt_at = datetime.datetime.utcnow()
+        db.session.commit()
+        mock_post.side_effect = None
+        mock_post.return_value = self.ok()
+        mock_post.reset_mock()
+
+        self.assertEqual(worker.drain(), 3)
+        self.assertEqual(mock_post.call_count, 1)
+        payload = mock_post.call_args.kwargs["json"]
+        self.assertEqual(payload["method"], "patch")
+        self.assertEqual(payload["userIds"][0]["email"], "b@example.com")
+        self.assertEqual(len(payload["userIds"]), 1)
+        self.assertEqual([row.status for row in CalendarOutbox.query.all()], [SENT] * 3)
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_retried_group_invites_once(self, mock_post):
+        fake = FakeCalendar(calendar_hook.token)
+        fake.events["event-1"] = {"id": "event-1", "attendees": []}
+        failures = ["pop"]
+
+        def hook(url, json, timeout):
+            if json["method"] in failures:
+                failures.remove(json["method"])
+                raise ConnectionError("hook is down")
+            body = fake.handle(json)
+            return Mock(
+                status_code=200, raise_for_status=lambda: None, json=lambda: body
+            )
+
+        mock_post.side_effect = hook
+        enqueue("patch", "event-1", ["a@example.com"])
+        enqueue("pop", "event-1", ["b@example.com"])
+        db.session.commit()
+
+        worker = CalendarWorker(base_delay=60)
+        worker.drain()
+        self.assertEqual(fake.attendees("event-1"), ["a@example.com"])
+
+        # The retry sends the patch that already went through again
+        for row in CalendarOutbox.query.all():
+            row.next_attempt_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+        self.assertEqual(worker.drain(), 2)
+        self.assertEqual(fake.calls["patch"], 2)
+        self.assertEqual(fake.attendees("event-1"), ["a@example.com"])
+
+    @patch("app.calendar.calendar_hook.session.post")
+    def test_open_circuit_stops_pass(self, mock_post):
+        mock_post.side_effect = ConnectionError("hook is down")
+        calendar_hook.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        enqueue("patch", "event-1", ["a@example.com"])
+        enqueue("patch", "event-2", ["b@example.com"])
+        enqueue("patch", "event-3", ["c@example.com"])
+        db.session.commit()
+
+        self.assertEqual(CalendarWorker().drain(), 1)
+
+        # Only the call that actually failed used up an attempt
+        rows = CalendarOutbox.query.order_by(CalendarOutbox.id).all()
+        self.assertEqual([row.attempts for row in rows], [1, 0, 0])
+        self.assertEqual([row.status for row in rows], [PENDING] * 3)
+        self.assertEqual(mock_post.call_count, 1)
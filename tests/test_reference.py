@@ -0,0 +1,79 @@
+from app.extensions import db
+from app.models import Location
+from app.reference import locations, user_types
+from app.versions import versions
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase, captured_queries, captured_templates
+
+
+class TestReferenceData(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        loader = Loader(self.app, db, ["locations.json", "roles.json", "users.json"])
+        loader.load()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def count_queries(self, fn):
+        with captured_queries() as statements:
+            fn()
+        return len(statements)
+
+    def test_rows_and_options(self):
+        rows = locations.all()
+        self.assertIsInstance(rows, tuple)
+        self.assertEqual([row.name for row in rows], ["Location 1", "Location 2"])
+        self.assertEqual(locations.get(2).name, "Location 2")
+        self.assertEqual(locations.options()[0], {"value": 1, "text": "Location 1"})
+        self.assertEqual(user_types.by_name("Presenter").id, 2)
+
+        with self.assertRaises(AttributeError):
+            rows[0].name = "Changed"
+
+    def test_loaded_once(self):
+        locations.all()
+        self.assertEqual(self.count_queries(locations.options), 0)
+
+    def test_manager_update_reloads(self):
+        locations.all()
+
+        Location.query.get(1).update({"name": "Main Office"})
+        self.assertEqual(locations.get(1).name, "Main Office")
+
+    def test_post_reloads(self):
+        self.login("Admin")
+        locations.all()
+
+        payload = {"name": "Location 3", "description": "", "address": "1 Oak St."}
+        with captured_templates(self.app) as templates:
+            self.client.post("/locations", data=payload)
+
+        options = templates[0]["context"]["options"]
+        self.assertEqual(options[-1]["text"], "Location 3")
+        self.assertEqual(len(locations.all()), 3)
+
+    def test_rollback_keeps_rows(self):
+        rows = locations.all()
+
+        Location.query.get(1).name = "Not saved"
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertIs(locations.all(), rows)
+
+    def test_other_worker_change_reloads(self):
+        rows = locations.all()
+
+        # Another worker committed a change
+        versions.bump(db.session, [locations.stamp])
+        db.session.commit()
+        versions.reset()
+        self.assertIsNot(locations.all(), rows)
@@ -0,0 +1,123 @@
+import datetime
+
+
+from app.extensions import db
+from app.models import Course, CourseUserAttended, RegistrationDaily
+from app.rollups import backfill_registration_daily, registration_trend
+from config import TestConfig
+
+from tests.loader import Loader
+from tests.utils import TestBase
+
+
+class TestRegistrationDaily(TestBase):
+    def setUp(self):
+        self.app = self.create(TestConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        fixtures = [
+            "courses.json",
+            "course_registrations.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        self.client = self.app.test_client()
+        self.today = datetime.datetime.utcnow().date()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def rollup(self):
+        return {
+            (row.course_id, row.day): (row.registrations, row.cancellations)
+            for row in RegistrationDaily.query.all()
+        }
+
+    def test_reserve_counts(self):
+        CourseUserAttended.reserve(1, 3)
+        CourseUserAttended.reserve(1, 4)
+        db.session.commit()
+
+        self.assertEqual(self.rollup(), {(1, self.today): (2, 0)})
+
+    def test_orm_add_and_remove_count(self):
+        course = Course.query.get(2)
+        course.registrations.append(CourseUserAttended(user_id=3))
+        db.session.commit()
+
+        registration = course.registrations.filter_by(user_id=2).first()
+        course.registrations.remove(registration)
+        db.session.commit()
+
+        self.assertEqual(self.rollup(), {(2, self.today): (1, 1)})
+
+    def test_rollback_not_counted(self):
+        CourseUserAttended.reserve(1, 3)
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(self.rollup(), {})
+
+    def test_deleted_event(self):
+        CourseUserAttended.reserve(1, 3)
+        db.session.commit()
+
+        db.session.delete(Course.query.get(2))
+        db.session.commit()
+
+        self.assertEqual(self.rollup(), {(1, self.today): (1, 0)})
+
+    def test_trend_fills_empty_days(self):
+        CourseUserAttended.reserve(1, 3)
+        db.session.commit()
+
+        first = self.today - datetime.timedelta(days=2)
+        self.assertEqual(
+            registration_trend(1, first, self.today),
+            [
+                (first, 0),
+                (first + datetime.timedelta(days=1), 0),
+                (self.today, 1),
+            ],
+        )
+
+    def test_backfill(self):
+        # Rows counted live are recounted without losing cancellations
+        db.session.add(
+            RegistrationDaily(
+                course_id=1, day=self.today, registrations=9, cancellations=1
+            )
+        )
+        db.session.commit()
+
+        self.assertEqual(backfill_registration_daily(batch_size=1), 2)
+        self.assertEqual(
+            self.rollup(), {(1, self.today): (2, 1), (2, self.today): (1, 0)}
+        )
+
+        # Running it again changes nothing
+        backfill_registration_daily()
+        self.assertEqual(
+            self.rollup(), {(1, self.today): (2, 1), (2, self.today): (1, 0)}
+        )
+
+    def test_backfill_command(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["backfill-registration-daily"])
+
+        self.assertIn("Counted registrations for 2 events.", result.output)
+        self.assertEqual(self.rollup()[(1, self.today)], (2, 0))
+
+    def test_detail_view_sparkline(self):
+        self.login("Admin")
+        resp = self.client.get("/admin/events?event_id=1")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"chart--sparkline", resp.data)
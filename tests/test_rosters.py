@@ -0,0 +1,102 @@
+import csv
+import datetime
+import io
+import zipfile
+
+from unittest.mock import patch
+
+
+from app.extensions import db
+from app.models import Course, User
+from config import TestConfig
+
+from tests.loader import Loader
+from tests.utils import TestBase, captured_queries
+
+
+class TestRosterExports(TestBase):
+    def setUp(self):
+        self.app = self.create(TestConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_registrations.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+        for course in Course.query.all():
+            course.starts = datetime.datetime(2022, 10, course.id, 9)
+        db.session.commit()
+
+        self.login("Admin")
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def test_roster_csv(self):
+        User.query.get(2).location_id = None
+        db.session.commit()
+
+        resp = self.client.get("/admin/events/1/registrations/save")
+        self.assertEqual(resp.status_code, 200)
+
+        rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+        self.assertEqual(
+            rows[0], ["Name", "Email", "Location", "Attended", "Created At"]
+        )
+        self.assertEqual([row[0] for row in rows[1:]], ["Admin", "Presenter"])
+        self.assertEqual(rows[2][2], "Not specified")
+
+    def test_roster_one_query(self):
+        with captured_queries("course_user_attended") as statements:
+            self.client.get("/admin/events/1/registrations/save").get_data()
+
+        self.assertEqual(len(statements), 1)
+
+    def test_roster_chunked(self):
+        with patch("app.rosters.CHUNK_SIZE", 1):
+            resp = self.client.get("/admin/events/1/registrations/save")
+            chunks = list(resp.response)
+
+        # A write after each row once the buffer is full, then the tail
+        self.assertEqual(len(chunks), 3)
+
+    def test_missing_event(self):
+        resp = self.client.get("/admin/events/9/registrations/save")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_rosters_zip(self):
+        resp = self.client.get(
+            "/admin/events/registrations/save?start=2022-10-01&end=2022-10-02"
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "application/zip")
+
+        archive = zipfile.ZipFile(io.BytesIO(resp.data))
+        self.assertEqual(
+            archive.namelist(),
+            ["2022-10-01-1-Course_1.csv", "2022-10-02-2-Course_2.csv"],
+        )
+        roster = archive.read("2022-10-02-2-Course_2.csv").decode()
+        self.assertEqual(len(roster.splitlines()), 2)
+
+    def test_rosters_zip_range(self):
+        resp = self.client.get(
+            "/admin/events/registrations/save?start=2022-10-02&end=2022-10-31"
+        )
+        archive = zipfile.ZipFile(io.BytesIO(resp.data))
+        self.assertEqual(archive.namelist(), ["2022-10-02-2-Course_2.csv"])
+
+    def test_rosters_zip_needs_range(self):
+        resp = self.client.get("/admin/events/registrations/save?start=2022-10-01")
+        self.assertEqual(resp.status_code, 422)
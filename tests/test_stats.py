@@ -0,0 +1,95 @@
+import datetime
+
+from app.extensions import db
+from app.metrics import metrics
+from app.models import CourseUserAttended
+from app.stats import EventStats, event_stats
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase, captured_templates
+
+
+class TestEventStats(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        fixtures = [
+            "courses.json",
+            "course_registrations.json",
+            "course_types.json",
+            "locations.json",
+            "roles.json",
+            "users.json",
+        ]
+        loader = Loader(self.app, db, fixtures)
+        loader.load()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def queries(self):
+        return metrics.counter("event_stats.queries").value
+
+    def test_one_aggregate(self):
+        last = CourseUserAttended.query.filter_by(course_id=2).one().created_at
+        self.assertEqual(event_stats(2), EventStats(1, 1, last))
+        self.assertEqual(event_stats(1).not_attended, 2)
+
+    def test_no_registrations(self):
+        stats = event_stats(3)
+        self.assertEqual(stats, EventStats(0, 0, None))
+        self.assertEqual(stats.summary()[1]["value"], "-")
+
+    def test_cached_until_registration_changes(self):
+        event_stats(1)
+        queries = self.queries()
+        event_stats(1)
+        self.assertEqual(self.queries(), queries)
+
+        CourseUserAttended.reserve(1, 3)
+        db.session.commit()
+        self.assertEqual(event_stats(1).registrations, 3)
+        self.assertEqual(self.queries(), queries + 1)
+
+    def test_summary(self):
+        stats = EventStats(4, 1, datetime.datetime(2022, 10, 3, 14, 30))
+        self.assertEqual(
+            stats.summary(),
+            [
+                {"label": "Registrations", "value": 4},
+                {"label": "Last Registration", "value": "10/03/22, 02:30 PM"},
+            ],
+        )
+
+    def test_detail_view(self):
+        self.login("Admin")
+
+        with captured_templates(self.app) as templates:
+            resp = self.client.get("/admin/events?event_id=1")
+        self.assertEqual(resp.status_code, 200)
+
+        context = next(
+            template["context"]
+            for template in templates
+            if template["template_name"] == "admin/event-detail.html"
+        )
+        self.assertEqual(context["data"][0]["value"], 2)
+        self.assertEqual(context["event"]["available"], 8)
+
+    def test_add_attendees_view(self):
+        self.login("Admin")
+
+        with captured_templates(self.app) as templates:
+            resp = self.client.post("/courses/1/registrations", data={"user_ids": [3]})
+        self.assertEqual(resp.status_code, 200)
+        context = next(
+            template["context"]
+            for template in templates
+            if template["template_name"] == "admin/partials/event-detail.html"
+        )
+        self.assertEqual(context["data"][0]["value"], 3)
@@ -1,6 +1,12 @@
 from app.extensions import db
 from tests.loader import Loader
-from app.models import Course, CourseUserAttended, User
+from app.models import (
+    Course,
+    CourseUserAttended,
+    User,
+    UserNameToken,
+    backfill_name_tokens,
+)
 from tests.utils import TestBase, captured_templates
 
 
@@ -252,3 +258,92 @@ class TestUsers(TestBase):
         self.assertIsInstance(resp.json, list)
         self.assertEqual(len(resp.json), 1)
         self.assertEqual(resp.json[0]["title"], "Course 1")
+
+
+class TestUserSearch(TestBase):
+    def setUp(self):
+        self.app = self.create()
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        loader = Loader(self.app, db, ["locations.json", "roles.json", "users.json"])
+        loader.load()
+        # The fixtures are loaded without the ORM hooks that index names
+        backfill_name_tokens()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def ids(self, text, **filters):
+        return [user.id for user in User.search(text, **filters)]
+
+    def test_name_prefix(self):
+        self.assertEqual(self.ids("user"), [6, 3, 4, 5])
+        self.assertEqual(self.ids("pres"), [2])
+
+    def test_later_word_and_email(self):
+        self.assertEqual(self.ids("2"), [4])
+        self.assertEqual(self.ids("astudent"), [6])
+
+    def test_every_word_matches(self):
+        self.assertEqual(self.ids("student us"), [6])
+        self.assertEqual(self.ids("user 3"), [5])
+
+    def test_filters_and_limit(self):
+        self.assertEqual(self.ids("user", usertype_id=2), [])
+        self.assertEqual(self.ids("p", location_id=2), [2])
+        self.assertEqual(len(User.search("user", limit=2)), 2)
+
+    def test_tokens_follow_renames(self):
+        user = User.query.get(5)
+        user.name = "User Three Jones"
+        db.session.add(User(name="Ann Jonas", email="ann@example.com"))
+        db.session.commit()
+
+        self.assertEqual(self.ids("jon"), [7, 5])
+        self.assertEqual(self.ids("3"), [])
+
+        db.session.delete(user)
+        db.session.commit()
+        self.assertEqual(UserNameToken.query.filter_by(user_id=5).count(), 0)
+
+    def test_wildcards_are_literal(self):
+        self.assertEqual(self.ids("%"), [])
+        self.assertEqual(self.ids("u_er"), [])
+        self.assertEqual(self.ids(""), [])
+
+    def test_options(self):
+        self.login("Admin")
+        resp = self.client.get("/users/search?q=pres&usertype_id=2")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.get_data(as_text=True).strip(),
+            '<option value="2">Presenter (presenter@example.com)</option>',
+        )
+
+    def test_checkboxes(self):
+        self.login("Admin")
+        resp = self.client.get("/users/search?q=user&field=checkbox")
+
+        self.assertEqual(resp.data.count(b'name="user_ids"'), 4)
+
+    def test_limit_setting(self):
+        self.login("Admin")
+        self.app.config["USER_SEARCH_LIMIT"] = 1
+        resp = self.client.get("/users/search?q=user")
+
+        self.assertEqual(resp.data.count(b"<option"), 1)
+
+    def test_restricted(self):
+        self.login("User")
+        resp = self.client.get("/users/search?q=user")
+        self.assertEqual(resp.status_code, 403)
+
+    def test_bad_field(self):
+        self.login("Admin")
+        resp = self.client.get("/users/search?q=user&field=table")
+        self.assertEqual(resp.status_code, 422)
@@ -0,0 +1,97 @@
+import datetime
+
+
+from app.extensions import db
+from app.models import CacheVersion, Course, Location
+from app.versions import versions
+
+from tests.loader import Loader
+from tests.utils import CachedConfig, TestBase, captured_queries
+
+
+class TestVersionStamps(TestBase):
+    def setUp(self):
+        self.app = self.create(CachedConfig)
+        ctx = self.app.app_context()
+        ctx.push()
+
+        self.client = self.app.test_client()
+
+        loader = Loader(
+            self.app, db, ["courses.json", "locations.json", "roles.json", "users.json"]
+        )
+        loader.load()
+        versions.reset()
+
+    def tearDown(self):
+        db.drop_all()
+        db.session.close()
+
+    def stored(self):
+        return {row.name: row.version for row in CacheVersion.query.all()}
+
+    def test_commit_bumps_stamps(self):
+        before = versions.get_many(["catalog", "course:1"])
+
+        Course.query.get(1).title = "Renamed"
+        db.session.commit()
+
+        after = versions.get_many(["catalog", "course:1", "course:2"])
+        self.assertEqual(after["catalog"], before["catalog"] + 1)
+        self.assertEqual(after["course:1"], before["course:1"] + 1)
+        self.assertEqual(after["course:2"], 0)
+
+    def test_reference_commit_bumps_table_stamp(self):
+        before = versions.get("reference:location")
+
+        Location.query.get(1).name = "Main Office"
+        db.session.commit()
+
+        self.assertEqual(versions.get("reference:location"), before + 1)
+
+    def test_rollback_leaves_stamps(self):
+        before = self.stored()
+
+        Course.query.get(1).title = "Not saved"
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(self.stored(), before)
+
+    def test_read_once_per_request(self):
+        with captured_queries("cache_version") as statements:
+            versions.get("catalog")
+            versions.get_many(["catalog", "reference:location"])
+            self.assertEqual(len(statements), 1)
+
+            versions.reset()
+            versions.get("catalog")
+            self.assertEqual(len(statements), 2)
+
+    def test_course_list_reads_stamps_once(self):
+        # Keep the fixture events in the upcoming list
+        starts = datetime.datetime.now() + datetime.timedelta(days=1)
+        for course in Course.query.all():
+            course.starts = starts
+            course.ends = starts + datetime.timedelta(hours=1)
+        db.session.commit()
+
+        self.login("User")
+        self.client.get("/courses")
+
+        with captured_queries("cache_version") as statements:
+            resp = self.client.get("/courses")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(statements), 1)
+
+    def test_other_worker_bump_seen_next_request(self):
+        version = versions.get("catalog")
+
+        # Another worker committed a change
+        versions.bump(db.session, ["catalog"])
+        db.session.commit()
+        self.assertEqual(versions.get("catalog"), version)
+
+        versions.reset()
+        self.assertEqual(versions.get("catalog"), version + 1)
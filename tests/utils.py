@@ -3,6 +3,7 @@ import unittest
 from contextlib import contextmanager
 from flask import template_rendered
 from flask_login.utils import login_user
+from sqlalchemy import event
 
 from app import create_app
 from app.extensions import db
@@ -11,9 +12,14 @@ from app.schemas import UserSchema
 from config import TestConfig
 
 
+class CachedConfig(TestConfig):
+    # For tests of code that reads and writes the shared cache
+    CACHE_TYPE = "SimpleCache"
+
+
 class TestBase(unittest.TestCase):
-    def create(self):
-        self.app = create_app(TestConfig)
+    def create(self, config=TestConfig):
+        self.app = create_app(config)
 
         # Build the database structure in the application context
         with self.app.app_context():
@@ -45,3 +51,20 @@ def captured_templates(app):
         yield recorded
     finally:
         template_rendered.disconnect(record, app)
+
+
+@contextmanager
+def captured_queries(match=None):
+    # Capture the SQL sent to the database, optionally only statements
+    # containing `match`
+    recorded = []
+
+    def record(conn, cursor, statement, *args):
+        if match is None or match in statement:
+            recorded.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield recorded
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
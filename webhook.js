@@ -14,7 +14,7 @@ const setup = () => { return true }
  *
  * @param String method - the action to perform
  * @param String token - access token from the request
- * @param String userId - Valid user email address
+ * @param Array userIds - Attendee objects ({email, responseStatus}) to add or remove
  * @param String calendarId - Valid Google Calendar ID
  * @param STring eventID - Valid Google Calendar event ID
  */
@@ -89,17 +89,16 @@ function userRegistration(userIds, calendarId, eventId, method) {
 
   // Add an attendee to the event
   if(method === 'patch') {
-    if(attendees) {
-      attendees = event.attendees.concat(userIds)
-      resource = { "attendees": attendees}
-    } else {
-      resource = {
-        attendees: userIds
-      }
+    // Skip anyone already invited so a retried call doesn't add them twice
+    let invited = (attendees || []).map(user => user.email);
+    let added = userIds.filter(user => invited.indexOf(user.email) === -1);
+    resource = {
+      "attendees": (attendees || []).concat(added)
     }
   } else if(method === 'pop') {
-    // Remove a user from the invitation to the event
-    let filtered = event.attendees.filter(user => user.email !== userId);
+    // Remove users from the invitation to the event
+    let emails = userIds.map(user => user.email);
+    let filtered = (attendees || []).filter(user => emails.indexOf(user.email) === -1);
     resource = {
       "attendees": filtered
     }